@@ -1,4 +1,5 @@
 from src.contextual_retrieval import create_and_save_db
+import argparse
 import os
 from dotenv import load_dotenv
 load_dotenv()
@@ -9,9 +10,71 @@ save_dir = os.path.join(BASE_PATH, os.getenv("SAVE_DIR", ""))
 collection_name = os.getenv("COLLECTION_NAME")
 db_name = "cook_book_db"
 
+parser = argparse.ArgumentParser(description="Build the vector and BM25 databases.")
+parser.add_argument(
+    "--sync",
+    action="store_true",
+    help="only re-index files added, changed or removed since the last run",
+)
+parser.add_argument(
+    "--clear-extraction-cache",
+    action="store_true",
+    help="discard cached document extractions before ingesting",
+)
+parser.add_argument(
+    "--batch",
+    action="store_true",
+    help="generate contexts and embeddings through the OpenAI Batch API; "
+    "rerun with --batch to resume an interrupted run",
+)
+parser.add_argument(
+    "--resume",
+    action="store_true",
+    help="continue an interrupted run, skipping files that were already indexed",
+)
+args = parser.parse_args()
+
+# Optional throttling of the contextualization LLM calls
+max_concurrency = int(os.getenv("CONTEXT_MAX_CONCURRENCY", "8"))
+requests_per_minute = int(os.getenv("OPENAI_RPM_LIMIT", "0")) or None
+tokens_per_minute = int(os.getenv("OPENAI_TPM_LIMIT", "0")) or None
+chunks_per_request = int(os.getenv("CONTEXT_CHUNKS_PER_REQUEST", "1"))
+# "document" situates every chunk in its document; "summary" builds contexts
+# from per-section and per-document summaries
+context_mode = os.getenv("CONTEXT_MODE", "document")
+# Drop chunks at least this similar to an earlier one (0 disables)
+dedup_threshold = float(os.getenv("DEDUP_THRESHOLD", "0")) or None
+# Chunk types given a rule-based context instead of an LLM call
+heuristic_chunk_types = [
+    t.strip() for t in os.getenv("HEURISTIC_CONTEXT_TYPES", "").split(",") if t.strip()
+]
+
+# Parallel document extraction
+extract_workers = int(os.getenv("EXTRACT_WORKERS", "1"))
+extract_timeout = float(os.getenv("EXTRACT_TIMEOUT", "0")) or None
+
+# Overlapped pipeline stages
+contextualize_workers = int(os.getenv("CONTEXT_BATCH_WORKERS", "2"))
+embed_workers = int(os.getenv("EMBED_WORKERS", "2"))
+
 create_and_save_db(
     data_dir=data_dir, 
     save_dir=save_dir,
     collection_name=collection_name,
-    db_name=db_name
-    )
\ No newline at end of file
+    db_name=db_name,
+    max_concurrency=max_concurrency,
+    requests_per_minute=requests_per_minute,
+    tokens_per_minute=tokens_per_minute,
+    sync=args.sync,
+    extract_workers=extract_workers,
+    extract_timeout=extract_timeout,
+    clear_extraction_cache=args.clear_extraction_cache,
+    contextualize_workers=contextualize_workers,
+    embed_workers=embed_workers,
+    chunks_per_request=chunks_per_request,
+    heuristic_chunk_types=heuristic_chunk_types,
+    context_mode=context_mode,
+    dedup_threshold=dedup_threshold,
+    batch_api=args.batch,
+    resume=args.resume,
+    )
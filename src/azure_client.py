@@ -1,23 +1,67 @@
 import os
-from typing import List
-from openai import AzureOpenAI
+from typing import List, Optional
+from openai import AsyncAzureOpenAI, AzureOpenAI
+
+from src.client_pool import AdaptiveConcurrency, RetryPolicy, shared_async_client, shared_client
+from src.embedding_cache import (
+    EmbeddingCache,
+    acached_embeddings,
+    cached_embeddings,
+    shared_embedding_cache,
+)
+from src.openai_client import (
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_MAX_BATCH_ITEMS,
+    EMBEDDING_MAX_BATCH_TOKENS,
+    EMBEDDING_MAX_CONCURRENCY,
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_RETRIES,
+    aembed_texts,
+    embed_texts,
+)
 
 AZURE_API_KEY = os.getenv("AZURE_API_KEY")
 AZURE_ENDPOINT = os.getenv("AZURE_ENDPOINT")
 AZURE_DEPLOYMENT_NAME = os.getenv("AZURE_DEPLOYMENT_NAME")
 AZURE_API_VERSION = os.getenv("AZURE_API_VERSION", "2023-05-15")
 
+# The Azure deployment has its own quota, separate from OpenAI's
+chat_policy = RetryPolicy(
+    LLM_MAX_RETRIES, concurrency=AdaptiveConcurrency(LLM_MAX_CONCURRENCY)
+)
+embedding_policy = RetryPolicy(
+    LLM_MAX_RETRIES, concurrency=AdaptiveConcurrency(LLM_MAX_CONCURRENCY)
+)
+
 def _get_client() -> AzureOpenAI:
-    return AzureOpenAI(
-        api_key=AZURE_API_KEY,
-        azure_endpoint=AZURE_ENDPOINT,
-        api_version=AZURE_API_VERSION,
+    return shared_client(
+        ("azure", AZURE_ENDPOINT, AZURE_API_KEY, AZURE_API_VERSION),
+        lambda: AzureOpenAI(
+            api_key=AZURE_API_KEY,
+            azure_endpoint=AZURE_ENDPOINT,
+            api_version=AZURE_API_VERSION,
+            max_retries=0,
+        ),
+    )
+
+
+def _get_async_client() -> AsyncAzureOpenAI:
+    """Async client shared by every call on the running event loop."""
+    return shared_async_client(
+        ("azure", AZURE_ENDPOINT, AZURE_API_KEY, AZURE_API_VERSION),
+        lambda: AsyncAzureOpenAI(
+            api_key=AZURE_API_KEY,
+            azure_endpoint=AZURE_ENDPOINT,
+            api_version=AZURE_API_VERSION,
+            max_retries=0,
+        ),
     )
 
 
 def chat_completion(prompt: str) -> str:
     client = _get_client()
-    response = client.chat.completions.create(
+    response = chat_policy.call(
+        client.chat.completions.create,
         model=AZURE_DEPLOYMENT_NAME,
         messages=[{"role": "user", "content": prompt}],
     )
@@ -26,17 +70,72 @@ def chat_completion(prompt: str) -> str:
 
 def get_embeddings(texts: List[str]) -> List[List[float]]:
     client = _get_client()
-    response = client.embeddings.create(model=AZURE_DEPLOYMENT_NAME, input=texts)
+    response = embedding_policy.call(
+        client.embeddings.create, model=AZURE_DEPLOYMENT_NAME, input=texts
+    )
+    return [d.embedding for d in response.data]
+
+
+async def get_embeddings_async(texts: List[str]) -> List[List[float]]:
+    client = _get_async_client()
+    response = await embedding_policy.acall(
+        client.embeddings.create, model=AZURE_DEPLOYMENT_NAME, input=texts
+    )
     return [d.embedding for d in response.data]
 
 from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from pydantic import Field
 
 class AzureEmbedding(BaseEmbedding):
+    # Same token-packed, concurrent batching as ``OpenAIEmbedding``
+    embed_batch_size: int = Field(default=EMBEDDING_MAX_BATCH_ITEMS, gt=0, le=2048)
+    max_concurrency: int = Field(default=EMBEDDING_MAX_CONCURRENCY, gt=0)
+    max_batch_tokens: int = Field(default=EMBEDDING_MAX_BATCH_TOKENS, gt=0)
+    # Vectors are looked up by deployment and text hash before any request is made
+    cache: Optional[EmbeddingCache] = Field(
+        default_factory=lambda: shared_embedding_cache(EMBEDDING_CACHE_DIR), exclude=True
+    )
+
+    def _embed(self, texts: List[str]) -> List[Embedding]:
+        return cached_embeddings(
+            self.cache,
+            f"azure/{AZURE_DEPLOYMENT_NAME}",
+            texts,
+            lambda missing: embed_texts(
+                missing,
+                max_concurrency=self.max_concurrency,
+                max_tokens=self.max_batch_tokens,
+                embed=get_embeddings,
+            ),
+        )
+
+    async def _aembed(self, texts: List[str]) -> List[Embedding]:
+        return await acached_embeddings(
+            self.cache,
+            f"azure/{AZURE_DEPLOYMENT_NAME}",
+            texts,
+            lambda missing: aembed_texts(
+                missing,
+                max_concurrency=self.max_concurrency,
+                max_tokens=self.max_batch_tokens,
+                embed=get_embeddings_async,
+            ),
+        )
+
     def _get_text_embedding(self, text: str) -> Embedding:
-        return get_embeddings([text])[0]
+        return self._embed([text])[0]
 
     def _get_query_embedding(self, query: str) -> Embedding:
-        return get_embeddings([query])[0]
+        return self._embed([query])[0]
 
     def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
-        return get_embeddings(texts)
+        return self._embed(texts)
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aembed([text]))[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return (await self._aembed([query]))[0]
+
+    async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
+        return await self._aembed(texts)
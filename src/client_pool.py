@@ -0,0 +1,319 @@
+"""Shared API clients with retries, backoff and adaptive concurrency.
+
+Building an ``OpenAI`` / ``AzureOpenAI`` client opens a new HTTP connection
+pool, so clients are created once per process (async clients once per event
+loop, since their connections are bound to it) and reused with keep-alive.
+Synchronous code runs coroutines through :func:`run_async`, which uses one
+background event loop, so its async clients are created only once as well.
+
+Calls go through a :class:`RetryPolicy`: rate-limit, timeout, connection and
+5xx errors are retried with exponential backoff and full jitter (or the
+provider's ``Retry-After``), and an optional :class:`AdaptiveConcurrency` gate
+caps the requests in flight. The gate halves its limit on rate-limit responses
+and grows it again by one per limit's worth of successes (AIMD), so a process
+settles just under the provider's quota instead of failing on it.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+import openai
+
+__all__ = [
+    "AdaptiveConcurrency",
+    "RetryPolicy",
+    "run_async",
+    "shared_async_client",
+    "shared_client",
+]
+
+T = TypeVar("T")
+
+_lock = threading.Lock()
+_clients: Dict[Hashable, Any] = {}
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[Hashable, Any]]" = (
+    weakref.WeakKeyDictionary()
+)
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_pid: Optional[int] = None
+
+
+def shared_client(key: Hashable, factory: Callable[[], T]) -> T:
+    """Return the process-wide client registered under ``key``, creating it once."""
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            client = _clients[key] = factory()
+        return client
+
+
+def shared_async_client(key: Hashable, factory: Callable[[], T]) -> T:
+    """Return the async client for ``key`` on the running event loop.
+
+    Outside a running loop a fresh, unshared client is returned.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return factory()
+    with _lock:
+        clients = _async_clients.setdefault(loop, {})
+        client = clients.get(key)
+        if client is None:
+            client = clients[key] = factory()
+        return client
+
+
+def _background_loop() -> asyncio.AbstractEventLoop:
+    global _loop, _loop_pid
+    with _lock:
+        # A forked child does not inherit the thread running the loop
+        if _loop is None or _loop_pid != os.getpid():
+            _loop, _loop_pid = asyncio.new_event_loop(), os.getpid()
+            threading.Thread(
+                target=_loop.run_forever, name="client-pool-loop", daemon=True
+            ).start()
+        return _loop
+
+
+def run_async(coro: Awaitable[T]) -> T:
+    """Run ``coro`` on the process-wide background event loop and return its result.
+
+    Unlike ``asyncio.run``, which starts a new loop per call, every call from
+    any thread uses the same loop, so the clients returned by
+    :func:`shared_async_client` keep their connection pool across calls.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, _background_loop())
+    try:
+        return future.result()
+    except BaseException:
+        future.cancel()
+        raise
+
+
+class AdaptiveConcurrency:
+    """AIMD limit on the number of requests in flight.
+
+    The limit starts at ``maximum``, is multiplied by ``decrease`` on a
+    rate-limit response (at most once per ``cooldown`` seconds, so one burst
+    of 429s counts once) and grows by ``1 / limit`` per success, i.e. by one
+    per round of requests, back up to ``maximum``. Usable from threads and
+    from any event loop.
+    """
+
+    def __init__(
+        self,
+        maximum: int = 64,
+        minimum: int = 1,
+        decrease: float = 0.5,
+        cooldown: float = 1.0,
+    ) -> None:
+        self.maximum = max(1, maximum)
+        self.minimum = max(1, min(minimum, self.maximum))
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.limit = float(self.maximum)
+        self.in_flight = 0
+        self._decreased = 0.0
+        self._condition = threading.Condition()
+        # Futures of coroutines waiting for a slot, woken on their own loop
+        self._waiters: List[Tuple[asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def acquire(self) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def aacquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self.in_flight < int(self.limit):
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._waiters.append((loop, waiter))
+            try:
+                await waiter
+            finally:
+                with self._condition:
+                    if (loop, waiter) in self._waiters:
+                        self._waiters.remove((loop, waiter))
+
+    def release(self, rate_limited: bool = False) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if rate_limited:
+                if now - self._decreased >= self.cooldown:
+                    self.limit = max(float(self.minimum), self.limit * self.decrease)
+                    self._decreased = now
+            else:
+                self.limit = min(float(self.maximum), self.limit + 1.0 / self.limit)
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter: asyncio.Future) -> None:
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def _retryable(error: BaseException) -> bool:
+    if isinstance(error, openai.APIConnectionError):  # includes timeouts
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code in (408, 409, 429) or error.status_code >= 500
+    return False
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the provider asked to wait before retrying, if any."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    for name, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = headers.get(name)
+        if value is None:
+            continue
+        try:
+            return float(value) / scale
+        except ValueError:
+            continue
+    return None
+
+
+class RetryPolicy:
+    """Retry transient API errors with exponential backoff and full jitter.
+
+    Attempt ``n`` waits a random time up to ``base_delay * 2 ** n`` (capped
+    at ``max_delay``), or at least the provider's ``Retry-After``. With a
+    ``concurrency`` gate every attempt holds one of its slots and reports
+    whether it was rate limited. ``retries`` and ``rate_limited`` count the
+    retried attempts and the 429 responses seen.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 6,
+        base_delay: float = 0.5,
+        max_delay: float = 30.0,
+        concurrency: Optional[AdaptiveConcurrency] = None,
+    ) -> None:
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.concurrency = concurrency
+        self.retries = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def delay(self, attempt: int, error: BaseException) -> float:
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            backoff = max(backoff, min(retry_after, self.max_delay))
+        return backoff
+
+    def _failed(self, attempt: int, error: BaseException) -> Optional[float]:
+        """Return the delay before retrying ``error``, or ``None`` to give up."""
+        if not _retryable(error) or attempt >= self.max_retries:
+            return None
+        with self._lock:
+            self.retries += 1
+            if isinstance(error, openai.RateLimitError):
+                self.rate_limited += 1
+        return self.delay(attempt, error)
+
+    def call(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        attempt = 0
+        while True:
+            if self.concurrency is not None:
+                self.concurrency.acquire()
+            rate_limited = False
+            try:
+                return fn(*args, **kwargs)
+            except Exception as error:
+                rate_limited = isinstance(error, openai.RateLimitError)
+                wait = self._failed(attempt, error)
+                if wait is None:
+                    raise
+            finally:
+                if self.concurrency is not None:
+                    self.concurrency.release(rate_limited)
+            time.sleep(wait)
+            attempt += 1
+
+    async def acall(self, fn: Callable[..., Awaitable[T]], *args: Any, **kwargs: Any) -> T:
+        attempt = 0
+        while True:
+            if self.concurrency is not None:
+                await self.concurrency.aacquire()
+            rate_limited = False
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as error:
+                rate_limited = isinstance(error, openai.RateLimitError)
+                wait = self._failed(attempt, error)
+                if wait is None:
+                    raise
+            finally:
+                if self.concurrency is not None:
+                    self.concurrency.release(rate_limited)
+            await asyncio.sleep(wait)
+            attempt += 1
+
+    async def astream(
+        self, fn: Callable[..., Awaitable[Any]], *args: Any, **kwargs: Any
+    ) -> AsyncIterator[Any]:
+        """Like :meth:`acall` for a call returning an async stream; yield its items.
+
+        Opening the stream is retried; the concurrency slot is held until the
+        stream is exhausted or the generator is closed.
+        """
+        attempt = 0
+        while True:
+            if self.concurrency is not None:
+                await self.concurrency.aacquire()
+            rate_limited = False
+            try:
+                try:
+                    stream = await fn(*args, **kwargs)
+                except Exception as error:
+                    rate_limited = isinstance(error, openai.RateLimitError)
+                    wait = self._failed(attempt, error)
+                    if wait is None:
+                        raise
+                else:
+                    try:
+                        async for item in stream:
+                            yield item
+                    finally:
+                        close = getattr(stream, "close", None)
+                        if close is not None:
+                            await close()
+                    return
+            finally:
+                if self.concurrency is not None:
+                    self.concurrency.release(rate_limited)
+            await asyncio.sleep(wait)
+            attempt += 1
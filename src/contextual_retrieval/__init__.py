@@ -1,3 +1,3 @@
-from .save_bm25 import save_BM25
+from .save_bm25 import BM25Writer, save_BM25
 from .save_contextual_retrieval import create_and_save_db
-from .save_vectordb import save_chromadb
\ No newline at end of file
+from .save_vectordb import ChromaWriter, save_chromadb, delete_chromadb_files
\ No newline at end of file
@@ -0,0 +1,190 @@
+from __future__ import annotations
+
+"""Offline processing of requests through the OpenAI Batch API.
+
+:class:`BatchRunner` writes requests to JSONL files, uploads and submits them
+as batches, polls until they finish and downloads the results. Progress is
+recorded in a state file inside ``work_dir`` so an interrupted run resumes
+where it stopped instead of submitting (and paying for) the requests again.
+"""
+
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from openai import OpenAI
+
+from src.client_pool import RetryPolicy
+from src.openai_client import LLM_MAX_RETRIES, _get_client
+
+Request = Tuple[str, Dict[str, Any]]
+Result = Tuple[str, Optional[Dict[str, Any]]]
+
+_FAILED = {"failed", "expired", "cancelled"}
+
+
+class BatchError(RuntimeError):
+    """Raised when a submitted batch ends in a failed state."""
+
+
+class BatchRunner:
+    """Submit request files to the Batch API and collect their results.
+
+    Parameters
+    ----------
+    work_dir:
+        Directory holding the request/result files and ``state.json``.
+    client:
+        OpenAI client used for the files and batches endpoints. Defaults to
+        :func:`src.openai_client._get_client`.
+    poll_interval:
+        Seconds between status checks of running batches.
+    max_requests_per_file:
+        Requests per uploaded file; larger jobs are split into several batches.
+    """
+
+    def __init__(
+        self,
+        work_dir: str,
+        client: OpenAI | None = None,
+        poll_interval: float = 60.0,
+        max_requests_per_file: int = 10_000,
+        completion_window: str = "24h",
+    ) -> None:
+        self.work_dir = work_dir
+        self.client = client or _get_client()
+        # Transient errors of the files/batches endpoints are retried with backoff
+        self.retry = RetryPolicy(LLM_MAX_RETRIES)
+        self.poll_interval = poll_interval
+        self.max_requests_per_file = max_requests_per_file
+        self.completion_window = completion_window
+        os.makedirs(work_dir, exist_ok=True)
+        self._state_path = os.path.join(work_dir, "state.json")
+        self.state: Dict[str, Any] = {}
+        if os.path.isfile(self._state_path):
+            with open(self._state_path, encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def save(self) -> None:
+        tmp = self._state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self._state_path)
+
+    def _write(self, name: str, endpoint: str, requests: Iterable[Request]) -> None:
+        shards: List[Dict[str, Any]] = []
+        out = None
+        try:
+            for custom_id, body in requests:
+                if out is None or shards[-1]["requests"] >= self.max_requests_per_file:
+                    if out is not None:
+                        out.close()
+                    path = os.path.join(self.work_dir, f"{name}-{len(shards)}.jsonl")
+                    shards.append({"path": path, "requests": 0})
+                    out = open(path, "w", encoding="utf-8")
+                line = {"custom_id": custom_id, "method": "POST", "url": endpoint, "body": body}
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+                shards[-1]["requests"] += 1
+        finally:
+            if out is not None:
+                out.close()
+        self.state[name] = {"endpoint": endpoint, "shards": shards}
+        self.save()
+
+    def _submit(self, endpoint: str, shard: Dict[str, Any]) -> None:
+        if "file_id" not in shard:
+            shard["file_id"] = self.retry.call(self._upload, shard["path"])
+            self.save()
+        batch = self.retry.call(
+            self.client.batches.create,
+            input_file_id=shard["file_id"],
+            endpoint=endpoint,
+            completion_window=self.completion_window,
+        )
+        shard["batch_id"] = batch.id
+        shard["status"] = batch.status
+        self.save()
+
+    def _upload(self, path: str) -> str:
+        with open(path, "rb") as f:
+            return self.client.files.create(file=f, purpose="batch").id
+
+    def _download(self, file_id: str, path: str) -> None:
+        content = self.retry.call(self.client.files.content, file_id).content
+        tmp = path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(content)
+        os.replace(tmp, path)
+
+    def _wait(self, shards: List[Dict[str, Any]]) -> None:
+        while True:
+            running = 0
+            for shard in shards:
+                if "result_path" in shard:
+                    continue
+                batch = self.retry.call(self.client.batches.retrieve, shard["batch_id"])
+                shard["status"] = batch.status
+                if batch.status in _FAILED and not (batch.status == "expired" and batch.output_file_id):
+                    # Forget the dead batch so the next run submits the shard again
+                    del shard["batch_id"], shard["status"]
+                    self.save()
+                    raise BatchError(f"Batch {batch.id} ended with status {batch.status!r}")
+                if batch.status not in ("completed", "expired"):
+                    running += 1
+                    continue
+                result_path = shard["path"][: -len(".jsonl")] + ".results.jsonl"
+                if batch.output_file_id:
+                    self._download(batch.output_file_id, result_path)
+                else:
+                    open(result_path, "w").close()
+                if batch.error_file_id:
+                    self._download(batch.error_file_id, result_path + ".errors")
+                shard["result_path"] = result_path
+                self.save()
+            if not running:
+                return
+            print(f"-:-:-:- Waiting for {running} batches -:-:-:-")
+            time.sleep(self.poll_interval)
+
+    def run(
+        self,
+        name: str,
+        endpoint: str,
+        make_requests: Callable[[], Iterable[Request]],
+    ) -> None:
+        """Write, submit and wait for the ``name`` job.
+
+        ``make_requests`` is only called when the job's request files have not
+        been written yet; steps already recorded in the state are skipped.
+        A batch that fails or is cancelled raises :class:`BatchError` and is
+        submitted again on the next run. An expired batch keeps the results
+        it produced; its other requests read as missing (see
+        :meth:`read_results`).
+        """
+        if name not in self.state:
+            self._write(name, endpoint, make_requests())
+        job = self.state[name]
+        for shard in job["shards"]:
+            if "batch_id" not in shard:
+                self._submit(job["endpoint"], shard)
+        self._wait(job["shards"])
+
+    def shards(self, name: str) -> List[Dict[str, Any]]:
+        return self.state[name]["shards"]
+
+    @staticmethod
+    def read_results(shard: Dict[str, Any]) -> Iterator[Result]:
+        """Yield ``(custom_id, response_body)``; the body is ``None`` for failed requests."""
+        paths = [shard["result_path"], shard["result_path"] + ".errors"]
+        for path in paths:
+            if not os.path.isfile(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    response = record.get("response") or {}
+                    ok = not record.get("error") and response.get("status_code") == 200
+                    yield record["custom_id"], response.get("body") if ok else None
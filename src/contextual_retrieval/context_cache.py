@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+"""Disk-backed cache of generated chunk contexts."""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+def context_cache_key(document: str, chunk: str, model: str, template: str) -> str:
+    """Return the content address of one contextualization request."""
+    digest = hashlib.sha256()
+    for part in (model, template, document, chunk):
+        data = part.encode("utf-8")
+        # Length-prefix each part so different splits cannot collide
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class ContextCache:
+    """SQLite store mapping :func:`context_cache_key` keys to generated contexts.
+
+    Entries are evicted least-recently-used first once the stored contexts
+    exceed ``max_bytes``. ``hits`` and ``misses`` count lookups made through
+    :meth:`get` since the cache was opened. The last-use times of hits are
+    buffered and written in one transaction with the next :meth:`put`, on
+    :meth:`flush` or on :meth:`close`, so a lookup does not commit.
+    """
+
+    # Buffered last-use times written even without a ``put`` (bounds memory)
+    _MAX_TOUCHED = 4096
+
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._touched: dict[str, float] = {}
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS contexts ("
+            "key TEXT PRIMARY KEY, context TEXT NOT NULL, "
+            "size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS contexts_last_used ON contexts (last_used)"
+        )
+        self._conn.commit()
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM contexts").fetchone()
+        self._size = int(row[0])
+
+    @property
+    def size(self) -> int:
+        """Total size in bytes of the cached contexts."""
+        return self._size
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM contexts").fetchone()[0]
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached context for ``key`` or ``None``."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT context FROM contexts WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._touched[key] = time.time()
+            if len(self._touched) >= self._MAX_TOUCHED:
+                self._write_touched()
+                self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, context: str) -> None:
+        """Store ``context`` under ``key`` and evict old entries if needed."""
+        size = len(context.encode("utf-8"))
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM contexts WHERE key = ?", (key,)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO contexts (key, context, size, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (key, context, size, time.time()),
+            )
+            self._size += size - (old[0] if old else 0)
+            # Eviction goes by last use, so record the buffered hits first
+            self._write_touched()
+            self._evict()
+            self._conn.commit()
+
+    def flush(self) -> None:
+        """Write the buffered last-use times of cache hits."""
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+
+    def _write_touched(self) -> None:
+        if self._touched:
+            self._conn.executemany(
+                "UPDATE contexts SET last_used = ? WHERE key = ?",
+                [(used, key) for key, used in self._touched.items()],
+            )
+            self._touched.clear()
+
+    def _evict(self) -> None:
+        while self._size > self.max_bytes:
+            rows = self._conn.execute(
+                "SELECT key, size FROM contexts ORDER BY last_used LIMIT 64"
+            ).fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for key, size in rows:
+                self._conn.execute("DELETE FROM contexts WHERE key = ?", (key,))
+                self._size -= size
+                if self._size <= self.max_bytes:
+                    return
+
+    def clear(self) -> None:
+        """Remove every cached context."""
+        with self._lock:
+            self._touched.clear()
+            self._conn.execute("DELETE FROM contexts")
+            self._conn.commit()
+            self._size = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._write_touched()
+            self._conn.commit()
+            self._conn.close()
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+"""Concurrent, rate-limited generation of chunk contexts."""
+
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Sequence
+
+from src.client_pool import run_async
+from src.openai_client import _get_async_client, achat_completion
+
+from .context_cache import ContextCache
+
+CompleteFn = Callable[[str], Awaitable[str]]
+
+
+class RateLimiter:
+    """Token buckets enforcing a requests-per-minute and tokens-per-minute budget.
+
+    Each bucket starts full and refills continuously at ``limit / 60`` units per
+    second. A budget of ``None`` disables that bucket. The buckets are guarded
+    by a thread lock, so one limiter can be shared by calls running on
+    different event loops (e.g. concurrent pipeline workers).
+    """
+
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+    ) -> None:
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute or 0)
+        self._tokens = float(tokens_per_minute or 0)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.requests_per_minute:
+            self._requests = min(
+                float(self.requests_per_minute),
+                self._requests + elapsed * self.requests_per_minute / 60.0,
+            )
+        if self.tokens_per_minute:
+            self._tokens = min(
+                float(self.tokens_per_minute),
+                self._tokens + elapsed * self.tokens_per_minute / 60.0,
+            )
+
+    def _reserve(self, tokens: int) -> float:
+        """Take one request from the buckets, or return the seconds to wait."""
+        with self._lock:
+            self._refill()
+            wait = 0.0
+            if self.requests_per_minute and self._requests < 1:
+                wait = max(wait, (1 - self._requests) * 60.0 / self.requests_per_minute)
+            if self.tokens_per_minute and self._tokens < tokens:
+                wait = max(wait, (tokens - self._tokens) * 60.0 / self.tokens_per_minute)
+            if wait > 0:
+                return wait
+            if self.requests_per_minute:
+                self._requests -= 1
+            if self.tokens_per_minute:
+                self._tokens -= tokens
+            return 0.0
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Wait until one request costing ``tokens`` fits in the budget."""
+        if self.tokens_per_minute:
+            # A single oversized request may use the whole bucket but no more.
+            tokens = min(tokens, self.tokens_per_minute)
+        while (wait := self._reserve(tokens)) > 0:
+            await asyncio.sleep(wait)
+
+
+@dataclass
+class TokenUsage:
+    """Running totals of the token usage reported by the chat completions API.
+
+    ``cached_tokens`` counts prompt tokens served from the provider's prompt
+    cache; it only grows when requests share a long, byte-identical prefix.
+    """
+
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    completion_tokens: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    def record(self, usage: Any) -> None:
+        """Add the ``usage`` of one chat completion response (object or dict)."""
+
+        def _get(obj: Any, name: str) -> Any:
+            return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+        details = _get(usage, "prompt_tokens_details")
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += _get(usage, "prompt_tokens") or 0
+            self.completion_tokens += _get(usage, "completion_tokens") or 0
+            self.cached_tokens += (_get(details, "cached_tokens") if details else 0) or 0
+
+    @property
+    def cached_ratio(self) -> float:
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+    def __str__(self) -> str:
+        return (
+            f"{self.requests} requests, {self.prompt_tokens} prompt tokens "
+            f"({self.cached_tokens} cached, {self.cached_ratio:.0%}), "
+            f"{self.completion_tokens} completion tokens"
+        )
+
+
+async def acontextualize(
+    prompts: Sequence[str],
+    *,
+    complete: CompleteFn | None = None,
+    max_concurrency: int = 8,
+    requests_per_minute: Optional[int] = None,
+    tokens_per_minute: Optional[int] = None,
+    token_counts: Optional[Sequence[int]] = None,
+    cache: Optional[ContextCache] = None,
+    cache_keys: Optional[Sequence[str]] = None,
+    limiter: Optional[RateLimiter] = None,
+    groups: Optional[Sequence[Hashable]] = None,
+    usage: Optional[TokenUsage] = None,
+    on_latency: Optional[Callable[[float], None]] = None,
+) -> List[str]:
+    """Run ``complete`` over ``prompts`` concurrently and return results in order.
+
+    Parameters
+    ----------
+    prompts:
+        Fully formatted contextualization prompts.
+    complete:
+        Coroutine function returning the completion for one prompt. Defaults to
+        :func:`src.openai_client.achat_completion` sharing a single client.
+    max_concurrency:
+        Maximum number of requests in flight.
+    requests_per_minute, tokens_per_minute:
+        Optional provider budgets; ``None`` disables the limit.
+    token_counts:
+        Prompt size in tokens used against ``tokens_per_minute``. When omitted
+        a rough estimate of four characters per token is used.
+    cache, cache_keys:
+        Optional :class:`ContextCache` and one key per prompt. Cached prompts
+        are answered without a request and new results are stored.
+    limiter:
+        Shared :class:`RateLimiter`; pass one to keep a single budget across
+        calls. Otherwise a fresh limiter is built from the budgets above.
+    groups:
+        Optional key per prompt (e.g. the document id) marking prompts that
+        share a prefix. The first pending prompt of each group is sent alone
+        and the rest of the group only once it completed, so the provider's
+        prompt cache is warm for them.
+    usage:
+        Optional :class:`TokenUsage` receiving the token usage (including
+        cached prompt tokens) of every request made with the default client.
+    on_latency:
+        Optional callback receiving the duration in seconds of every request,
+        measured after the rate limiter let it through.
+    """
+    if limiter is None:
+        limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+    results: List[str] = [""] * len(prompts)
+
+    # The cache is SQLite: its calls run in threads so they do not stall the
+    # other requests on this loop (shared by every ``contextualize`` call)
+    cached_contexts: List[Optional[str]] = [None] * len(prompts)
+    if cache is not None:
+        cached_contexts = await asyncio.to_thread(lambda: [cache.get(key) for key in cache_keys])
+    pending: List[int] = []
+    for i, cached in enumerate(cached_contexts):
+        if cached is None:
+            pending.append(i)
+        else:
+            results[i] = cached
+    if not pending:
+        return results
+
+    if complete is None:
+        client = _get_async_client()
+
+        async def complete(prompt: str) -> str:
+            return await achat_completion(
+                prompt, client=client, on_usage=usage.record if usage else None
+            )
+
+    # The first pending prompt of every group warms the prefix cache
+    leaders: Dict[Hashable, int] = {}
+    warmed: Dict[Hashable, asyncio.Event] = {}
+    if groups is not None:
+        for i in pending:
+            if groups[i] not in leaders:
+                leaders[groups[i]] = i
+                warmed[groups[i]] = asyncio.Event()
+
+    async def _run(i: int) -> None:
+        prompt = prompts[i]
+        cost = token_counts[i] if token_counts is not None else len(prompt) // 4
+        group = groups[i] if groups is not None else None
+        leader = group is not None and leaders[group] == i
+        if group is not None and not leader:
+            await warmed[group].wait()
+        try:
+            async with semaphore:
+                await limiter.acquire(cost)
+                start = time.monotonic()
+                results[i] = await complete(prompt)
+                if on_latency is not None:
+                    on_latency(time.monotonic() - start)
+        finally:
+            if leader:
+                warmed[group].set()
+        if cache is not None:
+            await asyncio.to_thread(cache.put, cache_keys[i], results[i])
+
+    await asyncio.gather(*(_run(i) for i in pending))
+    return results
+
+
+def contextualize(prompts: Sequence[str], **kwargs) -> List[str]:
+    """Synchronous wrapper around :func:`acontextualize`.
+
+    Calls share one event loop (:func:`src.client_pool.run_async`) and thus
+    one client, instead of opening a new connection pool per call.
+    """
+    return run_async(acontextualize(prompts, **kwargs))
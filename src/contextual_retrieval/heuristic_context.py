@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+"""Rule-based contexts for structured chunks.
+
+Table row groups, spreadsheet sheets and slide notes are situated well enough
+by where they come from (file, sheet, slide, section and column header), so
+their context can be built from metadata instead of an LLM call.
+"""
+
+import os
+from typing import Any, Mapping
+
+# Chunk types (see ``src.ingest.chunking.chunk_elements``) supported here
+HEURISTIC_CHUNK_TYPES = ("table", "slide", "slide_note")
+
+_MAX_HEADER_CHARS = 200
+
+
+def _file_name(metadata: Mapping[str, Any]) -> str:
+    name = metadata.get("file_name") or metadata.get("filename")
+    if not name and metadata.get("file_path"):
+        name = os.path.basename(str(metadata["file_path"]))
+    return str(name or "the document")
+
+
+def heuristic_context(chunk_type: str, text: str, metadata: Mapping[str, Any]) -> str | None:
+    """Return a context for a chunk of ``chunk_type``, or ``None`` if unsupported.
+
+    The context ends with a newline so it reads as a separate line before the
+    chunk text.
+    """
+    file_name = _file_name(metadata)
+    section = metadata.get("section_title")
+
+    if chunk_type == "table":
+        sheet = metadata.get("sheet")
+        where = f"sheet '{sheet}' of {file_name}" if sheet else file_name
+        context = f"Table rows from {where}"
+        if section:
+            context += f", under '{section}'"
+        header = text.splitlines()[0].strip() if text.strip() else ""
+        if header:
+            if len(header) > _MAX_HEADER_CHARS:
+                header = header[:_MAX_HEADER_CHARS].rstrip() + "..."
+            context += f". Columns: {header}"
+        return context + ".\n"
+
+    if chunk_type in ("slide", "slide_note"):
+        slide = metadata.get("slide_id")
+        what = "Speaker notes of slide" if chunk_type == "slide_note" else "Content of slide"
+        return f"{what} {slide} of {file_name}.\n"
+
+    return None
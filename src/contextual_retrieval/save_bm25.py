@@ -1,25 +1,134 @@
 from llama_index.retrievers.bm25 import BM25Retriever
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
 import Stemmer
+import json
 import os
+import shutil
 
-def save_BM25(nodes: list, 
-              save_dir: str = "./", 
-              db_name: str = "none") -> None:
-    
-    print("-:-:-:- BM25 [TF_IDF Database] creating ... -:-:-:-")
-
-    # Initializing BM25
-    bm25_retriever = BM25Retriever.from_defaults(
-        nodes=nodes,
-        similarity_top_k=12,
-        stemmer=Stemmer.Stemmer("english"),
-        language="english",
-    )
 
-    # Path to save BM25
-    save_pth = os.path.join(save_dir, db_name)
+class BM25Writer:
+    """Collects nodes for the BM25 index in batches and builds it on :meth:`close`.
+
+    Added nodes are spilled to a JSON-lines file next to the index instead of
+    being held in memory. BM25 statistics span the whole corpus, so the index
+    itself is built once, from the spill file, when the writer is closed.
+    With ``resume_file_paths`` the spill file of an interrupted run is reused,
+    keeping only the nodes of those (completely written) files.
+    """
+
+    def __init__(self,
+                 save_dir: str = "./",
+                 db_name: str = "none",
+                 update: bool = False,
+                 removed_file_paths: list | None = None,
+                 resume_file_paths: set | None = None) -> None:
+        self.save_pth = os.path.join(save_dir, db_name)
+        self.update = update
+        self.removed_file_paths = set(removed_file_paths or [])
+        os.makedirs(save_dir or ".", exist_ok=True)
+        self._spill_pth = self.save_pth + ".pending.jsonl"
+        self._metadata_updates: dict = {}
+        self.count = 0
+        if resume_file_paths is not None and os.path.isfile(self._spill_pth):
+            self._resume(resume_file_paths)
+            self._spill = open(self._spill_pth, "a", encoding="utf-8")
+        else:
+            self._spill = open(self._spill_pth, "w", encoding="utf-8")
+
+    def _resume(self, file_paths: set) -> None:
+        """Keep the spilled nodes of ``file_paths`` from an interrupted run."""
+        tmp = self._spill_pth + ".tmp"
+        with open(self._spill_pth, encoding="utf-8") as src, open(tmp, "w", encoding="utf-8") as dst:
+            for line in src:
+                try:
+                    node = json.loads(line)
+                except ValueError:
+                    continue
+                if node.get("file_path") in file_paths:
+                    dst.write(line)
+                    self.count += 1
+        os.replace(tmp, self._spill_pth)
+
+    def add(self, nodes: list) -> None:
+        for node in nodes:
+            self._spill.write(json.dumps(node_to_metadata_dict(node), ensure_ascii=False) + "\n")
+        self._spill.flush()
+        self.count += len(nodes)
+
+    def update_metadata(self, updates: dict) -> None:
+        """Merge ``updates`` (node id -> metadata) into added nodes on :meth:`close`."""
+        for node_id, metadata in updates.items():
+            self._metadata_updates.setdefault(node_id, {}).update(metadata)
+
+    def _pending_nodes(self):
+        with open(self._spill_pth, encoding="utf-8") as f:
+            for line in f:
+                node = metadata_dict_to_node(json.loads(line))
+                if node.node_id in self._metadata_updates:
+                    node.metadata.update(self._metadata_updates[node.node_id])
+                yield node
+
+    def close(self) -> None:
+        """Build and persist the index from the existing and added nodes.
+
+        With ``update=True`` the nodes of an existing index are kept, except
+        those whose ``file_path`` is in ``removed_file_paths`` or that are
+        added again under the same id.
+        """
+        self._spill.close()
 
-    # Saving BM25
-    bm25_retriever.persist(save_pth)
+        print("-:-:-:- BM25 [TF_IDF Database] creating ... -:-:-:-")
 
-    print("-:-:-:- BM25 [TF_IDF Database] saved -:-:-:-")
\ No newline at end of file
+        # Nodes are merged by id: a node added again replaces the earlier copy
+        by_id = {}
+        if self.update and os.path.isfile(os.path.join(self.save_pth, "params.index.json")):
+            existing = BM25Retriever.from_persist_dir(self.save_pth)
+            for node in (metadata_dict_to_node(d) for d in existing.corpus):
+                if node.metadata.get("file_path") not in self.removed_file_paths:
+                    by_id[node.node_id] = node
+            del existing
+        for node in self._pending_nodes():
+            by_id[node.node_id] = node
+        nodes = list(by_id.values())
+        del by_id
+        os.remove(self._spill_pth)
+
+        if not nodes:
+            # Every indexed file was removed; drop the stale index
+            if os.path.isdir(self.save_pth):
+                shutil.rmtree(self.save_pth)
+            print("-:-:-:- BM25 [TF_IDF Database] no nodes to index -:-:-:-")
+            return
+
+        # Initializing BM25
+        bm25_retriever = BM25Retriever.from_defaults(
+            nodes=nodes,
+            similarity_top_k=12,
+            stemmer=Stemmer.Stemmer("english"),
+            language="english",
+        )
+
+        # Saving BM25
+        bm25_retriever.persist(self.save_pth)
+
+        print("-:-:-:- BM25 [TF_IDF Database] saved -:-:-:-")
+
+
+def save_BM25(nodes: list, 
+              save_dir: str = "./", 
+              db_name: str = "none",
+              update: bool = False,
+              removed_file_paths: list | None = None) -> None:
+    """Build and persist the BM25 index.
+
+    With ``update=True`` the nodes of an existing index are kept, except those
+    whose ``file_path`` is in ``removed_file_paths``, and ``nodes`` are added.
+    """
+    writer = BM25Writer(
+        save_dir=save_dir,
+        db_name=db_name,
+        update=update,
+        removed_file_paths=removed_file_paths,
+    )
+    writer.add(nodes)
+    writer.close()
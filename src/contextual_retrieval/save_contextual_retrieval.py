@@ -1,18 +1,594 @@
 import os
+import json
+import hashlib
+import shutil
+import time
+import uuid
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any, Iterable, Iterator
 from dotenv import load_dotenv
 import tiktoken
 
-from llama_index.core.schema import TextNode
+from llama_index.core.schema import MetadataMode, TextNode
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
 
-from src.openai_client import chat_completion
+from src.openai_client import OPENAI_EMBEDDING_MODEL, OPENAI_MODEL, chat_policy, embedding_policy
 from src.ingest.chunking import chunk_elements
-from src.extractors import load_documents
+from src.extractors import extraction_cache, iter_documents
+from src.ingest.manifest import Manifest
+from src.ingest.checkpoint import IngestCheckpoint
+from src.ingest.dedup import ChunkDeduplicator
+from src.ingest.metrics import IngestMetrics
+from src.ingest.pipeline import Stage, StagedPipeline
 
-from .save_vectordb import save_chromadb
-from .save_bm25 import save_BM25
+from .save_vectordb import ChromaWriter
+from .save_bm25 import BM25Writer
+from .contextualize import RateLimiter, TokenUsage, contextualize
+from .context_cache import ContextCache, context_cache_key
+from .batch_api import BatchRunner
+from .heuristic_context import HEURISTIC_CHUNK_TYPES, heuristic_context
+from .summaries import summary_contexts
 
 load_dotenv()
 
+# ---------------------------
+# Contextualization prompt (collapsed to a single string)
+# The document comes first so every chunk of a document shares one
+# byte-identical prefix that the provider's prompt cache can reuse.
+# ---------------------------
+template = (
+    "<document>{WHOLE_DOCUMENT}</document> "
+    "Here is the chunk we want to situate within the whole document "
+    "<chunk>{CHUNK_CONTENT}</chunk> "
+    "Please give a short succinct context to situate this chunk within the overall "
+    "document for the purposes of improving search retrieval of the chunk. "
+    "Answer only with the succinct context and nothing else."
+)
+
+# Several chunks of one document situated in a single request
+multi_template = (
+    "<document>{WHOLE_DOCUMENT}</document> "
+    "Here are the chunks we want to situate within the whole document, "
+    "each with its id {CHUNKS}"
+    "For each chunk, please give a short succinct context to situate it within the "
+    "overall document for the purposes of improving search retrieval of the chunk. "
+    "Answer only with a JSON object mapping every chunk id to its context and nothing else."
+)
+
+
+# ---------------------------
+# Helpers
+# ---------------------------
+def _flat(md):
+    """Flatten metadata so all values are (str|int|float|None)."""
+    out = {}
+    for k, v in (md or {}).items():
+        if isinstance(v, (str, int, float)) or v is None:
+            out[k] = v
+        elif isinstance(v, bool):
+            out[k] = int(v)  # or str(v)
+        elif isinstance(v, (list, tuple, set)):
+            out[k] = ",".join(map(str, v))
+        else:
+            out[k] = json.dumps(v, ensure_ascii=False)
+    return out
+
+
+def _parse_contexts(response: str, count: int) -> list[str] | None:
+    """Parse a multi-chunk response into ``count`` contexts, or ``None`` if invalid."""
+    text = response.strip()
+    if text.startswith("```"):
+        text = text.strip("`").strip()
+        if text.startswith("json"):
+            text = text[len("json"):]
+    try:
+        parsed = json.loads(text)
+    except ValueError:
+        return None
+    if isinstance(parsed, dict):
+        parsed = [parsed.get(str(n)) for n in range(1, count + 1)]
+    if not isinstance(parsed, list) or len(parsed) != count:
+        return None
+    if not all(isinstance(c, str) and c.strip() for c in parsed):
+        return None
+    return parsed
+
+
+def _node_id(file_path: str, text: str, occurrence: int) -> str:
+    """Content-addressed node id: a chunk of a file always gets the same id.
+
+    ``occurrence`` tells apart identical chunks within one file.
+    """
+    digest = hashlib.sha256(f"{file_path}\0{occurrence}\0{text}".encode("utf-8")).digest()
+    return str(uuid.UUID(bytes=digest[:16]))
+
+
+def _batched(items: Iterable[Any], size: int) -> Iterator[list]:
+    batch: list = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _document_batches(documents: Iterable[list], size: int) -> Iterator[list]:
+    """Like :func:`_batched`, but never splits one of ``documents`` across batches."""
+    batch: list = []
+    for document in documents:
+        batch.extend(document)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _split_documents(batch: list) -> Iterator[list]:
+    """Split a batch of pending chunks into runs of the same ``doc_id``."""
+    start = 0
+    for i in range(1, len(batch) + 1):
+        if i == len(batch) or (
+            batch[i].node.metadata.get("doc_id") != batch[start].node.metadata.get("doc_id")
+        ):
+            yield batch[start:i]
+            start = i
+
+
+@dataclass
+class _PendingChunk:
+    """A chunk node waiting for its context, with the prompt that produces it."""
+
+    node: TextNode
+    prompt: str
+    prompt_tokens: int
+    cache_key: str
+    document: str
+    document_tokens: int
+    context: str | None = None  # set when no LLM call is needed
+
+
+class _DocumentContext:
+    """A document's text tokenized once; prompts slice its cached token array."""
+
+    def __init__(self, text: str, encoding, max_tokens: int) -> None:
+        encode = getattr(encoding, "encode_ordinary", encoding.encode)
+        tokens = encode(text)
+        self._text = text
+        self._total = len(tokens)
+        self._encoding = encoding
+        self.tokens = tokens[:max_tokens]
+        self._prefixes: dict[int, str] = {}
+
+    def prefix(self, max_tokens: int) -> tuple[str, int]:
+        """Return the first ``max_tokens`` tokens of the document and their count."""
+        n = min(max_tokens, len(self.tokens))
+        if n >= self._total:
+            return self._text, n
+        # Chunks of one document mostly share the same budget, so decode once
+        if n not in self._prefixes:
+            self._prefixes[n] = self._encoding.decode(self.tokens[:n])
+        return self._prefixes[n], n
+
+
+def _prepare_document(
+        elements: list,
+        doc_id: int,
+        encoding,
+        chunk_size: int,
+        max_document_tokens: int,
+        context_window: int,
+        heuristic_types: frozenset = frozenset(),
+        build_prompts: bool = True,
+    ) -> list[_PendingChunk]:
+    """Chunk one document and build the contextualization prompt of each chunk.
+
+    Chunks whose ``chunk_type`` is in ``heuristic_types`` get a rule-based
+    context right away and are not sent to the LLM. With ``build_prompts=False``
+    (contexts come from section summaries) the document is neither tokenized
+    nor put into prompts; ``prompt`` and ``cache_key`` stay empty.
+    """
+
+    # Assign the document ID and normalize metadata
+    for el in elements:
+        md = el.metadata
+        md_dict = md.to_dict() if hasattr(md, "to_dict") else dict(md or {})
+        md_dict["file_name"] = md_dict.get("filename") or md_dict.get("file_name") or ""
+        md_dict["doc_id"] = doc_id
+        # store back as a plain dict; later we also flatten when constructing nodes
+        el.metadata = md_dict
+
+    # Chunk the document into nodes
+    chunks = chunk_elements(
+        elements,
+        target_tokens=chunk_size,
+        max_tokens=max(1200, chunk_size * 2),
+        encoding=encoding,
+    )
+
+    truncated_document, document_tokens = "", 0
+    if build_prompts:
+        # Tokenize the document context once; every chunk slices these tokens
+        document = _DocumentContext(
+            "".join(getattr(el, "text", "") for el in elements),
+            encoding,
+            max_document_tokens,
+        )
+        # One document budget for all chunks (sized for the largest one) keeps
+        # the prompt prefix identical across the document's chunks
+        largest_chunk = max((c["token_count"] for c in chunks), default=0)
+        allowed_doc_tokens = max(
+            0, min(max_document_tokens, context_window - largest_chunk)
+        )
+        truncated_document, document_tokens = document.prefix(allowed_doc_tokens)
+
+    pending: list[_PendingChunk] = []
+    occurrences: Counter = Counter()
+    for c in chunks:
+        # Create nodes with FLATTENED metadata to satisfy vector store constraints
+        metadata = _flat(c.get("metadata", {}))
+        source = str(metadata.get("file_path") or metadata.get("file_name") or "")
+        occurrences[c["text"]] += 1
+        node = TextNode(
+            id_=_node_id(source, c["text"], occurrences[c["text"]]),
+            text=c["text"],
+            metadata=metadata,
+        )
+        content_body = node.text
+
+        # The chunker already counted the chunk's tokens
+        chunk_tokens = c["token_count"]
+
+        pending.append(
+            _PendingChunk(
+                node=node,
+                prompt=template.format(
+                    WHOLE_DOCUMENT=truncated_document,
+                    CHUNK_CONTENT=content_body,
+                ) if build_prompts else "",
+                prompt_tokens=chunk_tokens + document_tokens,
+                cache_key=context_cache_key(
+                    truncated_document, content_body, OPENAI_MODEL, template
+                ) if build_prompts else "",
+                document=truncated_document,
+                document_tokens=document_tokens,
+                context=(
+                    heuristic_context(c.get("chunk_type", ""), content_body, node.metadata)
+                    if c.get("chunk_type") in heuristic_types
+                    else None
+                ),
+            )
+        )
+    return pending
+
+
+def _contextualize_grouped(
+        batch: list[_PendingChunk],
+        chunks_per_request: int,
+        context_cache: ContextCache | None,
+        metrics: IngestMetrics | None = None,
+        **engine_kwargs,
+    ) -> list[str]:
+    """Request contexts for up to ``chunks_per_request`` chunks of a document at once.
+
+    The document is sent once per request and the JSON answer is split back
+    into one context per chunk. Chunks whose response cannot be parsed are
+    retried with the single-chunk prompt.
+    """
+    keys = [
+        context_cache_key(p.document, p.node.text, OPENAI_MODEL, multi_template)
+        for p in batch
+    ]
+    contexts: list[str | None] = [
+        context_cache.get(key) if context_cache is not None else None for key in keys
+    ]
+
+    # Consecutive uncached chunks of the same document form one request
+    groups: list[list[int]] = []
+    for i, context in enumerate(contexts):
+        if context is not None:
+            continue
+        doc_id = batch[i].node.metadata.get("doc_id")
+        last = groups[-1] if groups else None
+        if (
+            last
+            and len(last) < chunks_per_request
+            and batch[last[-1]].node.metadata.get("doc_id") == doc_id
+        ):
+            last.append(i)
+        else:
+            groups.append([i])
+
+    prompts = []
+    for group in groups:
+        chunks = "".join(
+            f'<chunk id="{n}">{batch[i].node.text}</chunk> '
+            for n, i in enumerate(group, start=1)
+        )
+        prompts.append(
+            multi_template.format(WHOLE_DOCUMENT=batch[group[0]].document, CHUNKS=chunks)
+        )
+    responses = contextualize(
+        prompts,
+        groups=[batch[g[0]].node.metadata.get("doc_id") for g in groups],
+        token_counts=[
+            batch[g[0]].document_tokens
+            + sum(batch[i].prompt_tokens - batch[i].document_tokens for i in g)
+            for g in groups
+        ],
+        **engine_kwargs,
+    )
+
+    fallback: list[int] = []
+    for group, response in zip(groups, responses):
+        parsed = _parse_contexts(response, len(group))
+        if parsed is None:
+            fallback.extend(group)
+            continue
+        for i, context in zip(group, parsed):
+            contexts[i] = context
+            if context_cache is not None:
+                context_cache.put(keys[i], context)
+
+    if fallback:
+        print(f"-:-:-:- Falling back to single-chunk prompts for {len(fallback)} chunks -:-:-:-")
+        if metrics is not None:
+            metrics.incr("retries", len(fallback))
+        singles = contextualize(
+            [batch[i].prompt for i in fallback],
+            groups=[batch[i].node.metadata.get("doc_id") for i in fallback],
+            token_counts=[batch[i].prompt_tokens for i in fallback],
+            cache=context_cache,
+            cache_keys=[batch[i].cache_key for i in fallback],
+            **engine_kwargs,
+        )
+        for i, context in zip(fallback, singles):
+            contexts[i] = context
+    return contexts
+
+
+def _contextualize_batch(
+        batch: list[_PendingChunk],
+        first_section: int,
+        context_cache: ContextCache | None,
+        chunks_per_request: int = 1,
+        metrics: IngestMetrics | None = None,
+        **engine_kwargs,
+    ) -> list[TextNode]:
+    """Request the contexts of ``batch`` and add each one before its chunk."""
+
+    # Chunks with a rule-based context skip the LLM
+    responses = [p.context for p in batch]
+    todo = [i for i, context in enumerate(responses) if context is None]
+    llm_batch = [batch[i] for i in todo]
+
+    if not llm_batch:
+        generated: list[str] = []
+    elif chunks_per_request > 1:
+        generated = _contextualize_grouped(
+            llm_batch, chunks_per_request, context_cache, metrics, **engine_kwargs
+        )
+    else:
+        # Request the contexts concurrently (results keep node order), warming the
+        # prompt cache with one request per document before sending the rest ...
+        generated = contextualize(
+            [p.prompt for p in llm_batch],
+            groups=[p.node.metadata.get("doc_id") for p in llm_batch],
+            token_counts=[p.prompt_tokens for p in llm_batch],
+            cache=context_cache,
+            cache_keys=[p.cache_key for p in llm_batch],
+            **engine_kwargs,
+        )
+    for i, context in zip(todo, generated):
+        responses[i] = context
+
+    # ... and add the succinct context before each chunk
+    return [
+        _apply_context(pending.node, response_text, section)
+        for section, (pending, response_text) in enumerate(
+            zip(batch, responses), start=first_section
+        )
+    ]
+
+
+def _apply_context(node: TextNode, response_text: str, section: int) -> TextNode:
+    """Put the generated context before the chunk text and finalize the metadata."""
+    content_body = node.text
+
+    metadata = dict(node.metadata or {})
+    metadata["raw_chunk"] = content_body
+
+    contextual_text = response_text + content_body
+    node.text = contextual_text
+
+    # Keep these keys flat/primitive
+    metadata["file_name"] = metadata.get("file_name") or ""
+    metadata["section"] = section
+    metadata["doc_id"] = metadata.get("doc_id")
+
+    anchor = (
+        metadata.get("page_number")
+        or metadata.get("slide_number")
+        or metadata.get("slide_id")
+    )
+    if anchor is not None:
+        metadata["anchor"] = anchor
+
+    # Re-flatten in case anything non-scalar snuck in
+    node.metadata = _flat(metadata)
+
+    print(f'Context response from LLM => {response_text}\n For given text chunk => {content_body}')
+    return node
+
+
+def _read_jsonl(path: str) -> Iterator[dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+def _batch_ingest(
+        pending_chunks,
+        runner: BatchRunner,
+        chroma_writer: ChromaWriter,
+        bm25_writer: BM25Writer,
+        context_cache: ContextCache | None,
+        batch_size: int,
+        metrics: IngestMetrics | None = None,
+        **engine_kwargs,
+    ) -> None:
+    """Contextualize and embed every chunk through the Batch API, then write them.
+
+    Chunks are spilled to ``nodes.jsonl`` in the runner's work directory while
+    the chat requests are written; contextualized nodes go to ``final.jsonl``
+    while the embedding requests are written. Both jobs are recorded in the
+    runner's state, so a rerun after an interruption resumes at the first
+    unfinished step. Results are read back one result file at a time, so
+    memory does not grow with the corpus; requests that fail inside a batch
+    are retried online, ``batch_size`` at a time. Time spent per step and the online retries are recorded in ``metrics``.
+    """
+    metrics = metrics or IngestMetrics()
+    usage = engine_kwargs.get("usage")
+    nodes_path = os.path.join(runner.work_dir, "nodes.jsonl")
+    final_path = os.path.join(runner.work_dir, "final.jsonl")
+
+    def _chat_requests():
+        with open(nodes_path, "w", encoding="utf-8") as out:
+            for n, p in enumerate(pending_chunks()):
+                custom_id = f"chunk-{n}"
+                context = p.context
+                if context is None and context_cache is not None:
+                    context = context_cache.get(p.cache_key)
+                record = {
+                    "id": custom_id,
+                    "node": node_to_metadata_dict(p.node),
+                    "cache_key": p.cache_key,
+                    "context": context,
+                    "prompt": p.prompt if context is None else None,
+                    "prompt_tokens": p.prompt_tokens,
+                }
+                out.write(json.dumps(record, ensure_ascii=False) + "\n")
+                if context is None:
+                    yield custom_id, {
+                        "model": OPENAI_MODEL,
+                        "messages": [{"role": "user", "content": p.prompt}],
+                    }
+
+    print("-:-:-:- Batch API: contextualizing chunks -:-:-:-")
+    with metrics.time("batch_contextualize", 0):
+        runner.run("contexts", "/v1/chat/completions", _chat_requests)
+
+    def _final_record(out, section: int, record: dict, context: str):
+        node = _apply_context(metadata_dict_to_node(record["node"]), context, section)
+        out.write(json.dumps(
+            {"id": record["id"], "node": node_to_metadata_dict(node)},
+            ensure_ascii=False,
+        ) + "\n")
+        return record["id"], {
+            "model": OPENAI_EMBEDDING_MODEL,
+            "input": node.get_content(metadata_mode=MetadataMode.EMBED),
+        }
+
+    def _embedding_requests():
+        # Chat requests follow nodes.jsonl line by line (skipping chunks that
+        # already have a context), so each result file covers the next run of
+        # them; only one file of contexts is held at a time
+        shards = iter(runner.shards("contexts"))
+        contexts: dict[str, str] = {}
+        left = 0
+        failed: list[tuple[int, dict]] = []
+
+        def _retry_online(out):
+            # Requests that failed inside the batch are answered online
+            print(f"-:-:-:- Batch API: {len(failed)} failed requests retried online -:-:-:-")
+            metrics.incr("retries", len(failed))
+            responses = contextualize(
+                [r["prompt"] for _, r in failed],
+                token_counts=[r["prompt_tokens"] for _, r in failed],
+                **engine_kwargs,
+            )
+            requests = []
+            for (section, record), context in zip(failed, responses):
+                if context_cache is not None:
+                    context_cache.put(record["cache_key"], context)
+                requests.append(_final_record(out, section, record, context))
+            failed.clear()
+            return requests
+
+        with open(final_path, "w", encoding="utf-8") as out:
+            for section, record in enumerate(_read_jsonl(nodes_path)):
+                context = record["context"]
+                if context is None:
+                    if left == 0:
+                        shard = next(shards)
+                        left = shard["requests"]
+                        contexts = {}
+                        for custom_id, body in runner.read_results(shard):
+                            if body is not None:
+                                contexts[custom_id] = body["choices"][0]["message"]["content"]
+                                if usage is not None and body.get("usage"):
+                                    usage.record(body["usage"])
+                    left -= 1
+                    context = contexts.pop(record["id"], None)
+                    if context is None:
+                        failed.append((section, record))
+                        if len(failed) >= batch_size:
+                            yield from _retry_online(out)
+                        continue
+                    if context_cache is not None:
+                        context_cache.put(record["cache_key"], context)
+                yield _final_record(out, section, record, context)
+            if failed:
+                yield from _retry_online(out)
+
+    print("-:-:-:- Batch API: embedding chunks -:-:-:-")
+    with metrics.time("batch_embed", 0):
+        runner.run("embeddings", "/v1/embeddings", _embedding_requests)
+
+    # Embedding requests follow final.jsonl line by line, so each result file
+    # covers the next run of nodes; only one file of vectors is held at a time.
+    shards = iter(runner.shards("embeddings"))
+    embeddings: dict[str, array] = {}
+    left = 0
+    nodes: list[TextNode] = []
+    for record in _read_jsonl(final_path):
+        if left == 0:
+            shard = next(shards)
+            left = shard["requests"]
+            embeddings = {
+                custom_id: array("f", body["data"][0]["embedding"])
+                for custom_id, body in runner.read_results(shard)
+                if body is not None
+            }
+        left -= 1
+        node = metadata_dict_to_node(record["node"])
+        # Failed embedding requests are left to the writer's embedding model
+        vector = embeddings.pop(record["id"], None)
+        node.embedding = vector.tolist() if vector is not None else None
+        nodes.append(node)
+        if len(nodes) >= batch_size:
+            _write_nodes(nodes, chroma_writer, bm25_writer, metrics)
+            nodes = []
+    if nodes:
+        _write_nodes(nodes, chroma_writer, bm25_writer, metrics)
+
+
+def _write_nodes(
+        nodes: list[TextNode],
+        chroma_writer: ChromaWriter,
+        bm25_writer: BM25Writer,
+        metrics: IngestMetrics,
+    ) -> None:
+    with metrics.time("chroma_write", len(nodes)):
+        chroma_writer.add(nodes)
+    with metrics.time("bm25_write", len(nodes)):
+        bm25_writer.add(nodes)
+
+
 def create_and_save_db(
         data_dir: str,
         collection_name: str,
@@ -22,6 +598,30 @@ def create_and_save_db(
         chunk_overlap: int = 50,
         max_document_tokens: int = 2048,
         context_window: int = 8192,
+        max_concurrency: int = 8,
+        requests_per_minute: int | None = None,
+        tokens_per_minute: int | None = None,
+        use_context_cache: bool = True,
+        context_cache_max_bytes: int = 512 * 1024 * 1024,
+        sync: bool = False,
+        extract_workers: int = 1,
+        extract_timeout: float | None = None,
+        use_extraction_cache: bool = True,
+        extraction_cache_max_bytes: int = 2 * 1024 * 1024 * 1024,
+        clear_extraction_cache: bool = False,
+        batch_size: int = 64,
+        contextualize_workers: int = 2,
+        embed_workers: int = 2,
+        queue_size: int = 4,
+        report_interval: float | None = 30.0,
+        chunks_per_request: int = 1,
+        batch_api: bool = False,
+        batch_poll_interval: float = 60.0,
+        resume: bool = False,
+        heuristic_chunk_types: Iterable[str] = (),
+        context_mode: str = "document",
+        dedup_threshold: float | None = None,
+        report_path: str | None = None,
     ) -> None:
     """
     Ingests documents, chunks them, generates contextualized chunks, and saves both
@@ -30,29 +630,87 @@ def create_and_save_db(
     Notes:
     - Metadata is flattened to scalars/strings to satisfy vector store constraints.
     - The contextual prompt is a collapsed single-line string to avoid indentation issues.
+    - Documents stream through extract -> chunk -> contextualize -> embed -> write;
+      only ``batch_size`` chunks are in flight at a time, plus the document being
+      chunked (``context_mode="summary"`` keeps each document whole in one
+      batch). Memory is thus bounded by the largest document, not the corpus,
+      except for the ids of written chunks kept for the whole run (and, with
+      ``dedup_threshold``, about 1 KB of hashes and signature per chunk).
+      Each chunk is situated within its own document.
+    - The stages overlap: extraction, contextualization (``contextualize_workers``
+      batches at once), embedding (``embed_workers``) and index writes run in
+      separate threads joined by queues of at most ``queue_size`` batches.
+      Per-stage throughput and queue depth are printed every ``report_interval``
+      seconds and once at the end.
+    - Contexts are generated concurrently (``max_concurrency`` requests in flight),
+      throttled to the optional ``requests_per_minute`` / ``tokens_per_minute`` budget.
+      Chunks are sent grouped by document with one shared document prefix, and
+      the prompt tokens served from the provider's prompt cache are reported.
+    - With ``chunks_per_request > 1`` up to that many chunks of one document are
+      situated in a single request returning JSON, so the document is sent once
+      per group instead of once per chunk. Unparseable answers fall back to one
+      request per chunk.
+    - With ``batch_api=True`` contexts and embeddings are produced through the
+      OpenAI Batch API instead (lower cost, no load on the realtime rate limits).
+      Request files and job state live in ``SAVE_DIR/<db_name>_batch``; rerunning
+      after an interruption resumes the pending jobs, which are polled every
+      ``batch_poll_interval`` seconds. ``chunks_per_request`` is ignored here.
+    - Chunks whose type (see ``chunk_elements``) is in ``heuristic_chunk_types``,
+      e.g. ``("table", "slide_note")``, get a context built from their file name,
+      sheet, slide, ``section_title`` and header row instead of an LLM call.
+    - ``context_mode="summary"`` replaces the per-chunk document prompts: every
+      section of a document (by ``section_title``, at most ``max_document_tokens``)
+      is summarized once, a document summary is built from the section summaries,
+      and each chunk's context is assembled from both without further LLM calls.
+    - With ``dedup_threshold`` set, chunks repeating an earlier chunk of the run
+      (exactly, or with an estimated shingle Jaccard similarity of at least the
+      threshold) are dropped before contextualization and embedding. The kept
+      chunk lists every file it occurs in under ``source_files`` metadata; when
+      a sync or resumed run drops the file holding it, the chunk moves to one
+      of the other files instead of disappearing from the indices.
+    - Node ids are derived from the source file and chunk text and both indices
+      upsert by id, so ingesting the same files again replaces their nodes
+      instead of adding duplicates.
+    - Files whose chunks are all written to both indices are checkpointed in
+      ``SAVE_DIR/<db_name>_checkpoint.jsonl``. With ``resume=True`` an interrupted
+      run continues: checkpointed files (unless changed since) are skipped, nodes
+      of partly written files are dropped and those files are processed again.
+    - Generated contexts are cached on disk next to the indices, keyed by document
+      context, chunk text, model and prompt template, so unchanged chunks are never
+      sent to the LLM twice (``use_context_cache=False`` disables this).
+    - A manifest of (path, size, mtime, sha256) is saved with the indices. With
+      ``sync=True`` only new or changed files are processed; nodes of changed and
+      removed files are deleted from both indices and everything else is kept.
+      Files whose extraction yields nothing are left out of the manifest, so
+      the next sync tries them again.
+    - With ``extract_workers > 1`` documents are parsed in a crash-isolated process
+      pool; ``extract_timeout`` bounds the seconds spent on any single file.
+    - Extracted elements are cached on disk by file hash and extractor setup so
+      unchanged files are not parsed again; ``clear_extraction_cache`` empties it.
+    - At the end of the run a JSON report is written to ``report_path``
+      (default ``SAVE_DIR/<db_name>_ingest_report.json``): time and items/s per
+      stage (extract, chunk, contextualize, embed, Chroma and BM25 writes), LLM
+      request and embedding batch latency histograms, token usage, retries
+      (including rate-limited API requests retried with backoff), cache hits
+      and dedup counts.
     """
 
-    # ---------------------------
-    # Helpers
-    # ---------------------------
-    def _flat(md):
-        """Flatten metadata so all values are (str|int|float|None)."""
-        import json
-        out = {}
-        for k, v in (md or {}).items():
-            if isinstance(v, (str, int, float)) or v is None:
-                out[k] = v
-            elif isinstance(v, bool):
-                out[k] = int(v)  # or str(v)
-            elif isinstance(v, (list, tuple, set)):
-                out[k] = ",".join(map(str, v))
-            else:
-                out[k] = json.dumps(v, ensure_ascii=False)
-        return out
-
     # ---------------------------
     # Paths (kept as in your script; no change to item 4)
     # ---------------------------
+    if context_mode not in ("document", "summary"):
+        raise ValueError(f"Unknown context_mode {context_mode!r}")
+    heuristic_types = frozenset(heuristic_chunk_types)
+    unknown_types = heuristic_types.difference(HEURISTIC_CHUNK_TYPES)
+    if unknown_types:
+        raise ValueError(
+            f"Unknown heuristic_chunk_types {sorted(unknown_types)!r}, "
+            f"expected any of {HEURISTIC_CHUNK_TYPES!r}"
+        )
+    metrics = IngestMetrics()
+    policies = {"chat": chat_policy, "embeddings": embedding_policy}
+    retries_before = {name: (p.retries, p.rate_limited) for name, p in policies.items()}
+
     BASE_PATH = os.getenv("BASE_PATH", "")
     DATA_DIR =  os.getenv("DATA_DIR", "")
     SAVE_DIR =  os.getenv("SAVE_DIR", "")
@@ -60,148 +718,347 @@ def create_and_save_db(
     # SAVE_DIR = os.path.join(BASE_PATH, save_dir)
 
     # ---------------------------
-    # Collect file paths and load structured elements
+    # Collect file paths
     # ---------------------------
     paths: list[str] = []
     for root, _, files in os.walk(DATA_DIR):
         for file in files:
             paths.append(os.path.join(root, file))
 
-    elements = load_documents(paths)
+    vectordb_name = db_name + "_vectordb"
+    bm25db_name = db_name + "_bm25"
 
-    # ---------------------------
-    # Assign document IDs and normalize metadata
-    # ---------------------------
-    doc_ids: dict[str, int] = {}
-    for el in elements:
-        md = el.metadata
-        md_dict = md.to_dict() if hasattr(md, "to_dict") else dict(md or {})
-        file_name = md_dict.get("filename") or md_dict.get("file_name") or ""
-        if file_name not in doc_ids:
-            doc_ids[file_name] = len(doc_ids)
-        md_dict["file_name"] = file_name
-        md_dict["doc_id"] = doc_ids[file_name]
-        # store back as a plain dict; later we also flatten when constructing nodes
-        el.metadata = md_dict
+    manifest = Manifest(os.path.join(SAVE_DIR, db_name + "_manifest.json"))
+    diff = manifest.scan(paths)
 
-    original_document_content = "".join(getattr(el, "text", "") for el in elements)
+    # Files completely written by an interrupted run (the batch mode resumes
+    # through its own job state instead)
+    checkpoint = IngestCheckpoint(os.path.join(SAVE_DIR, db_name + "_checkpoint.jsonl"))
+    done: set[str] = set()
+    if resume and not batch_api:
+        done = checkpoint.completed(diff.records)
+        print(f"-:-:-:- Resuming: {len(done)} files already indexed -:-:-:-")
+    else:
+        checkpoint.clear()
 
-    # ---------------------------
-    # Tokenizer and truncation
-    # ---------------------------
-    encoding = tiktoken.get_encoding("cl100k_base")
+    if sync:
+        if not diff.has_changes:
+            print("-:-:-:- Index is up to date, nothing to sync -:-:-:-")
+            return
+        print(
+            f"-:-:-:- Sync: {len(diff.added)} added, {len(diff.changed)} changed, "
+            f"{len(diff.removed)} removed, {len(diff.unchanged)} unchanged -:-:-:-"
+        )
+        paths = diff.added + diff.changed
 
-    def _truncate_tokens(text: str, max_tokens: int) -> str:
-        tokens = encoding.encode(text)
-        if len(tokens) <= max_tokens:
-            return text
-        return encoding.decode(tokens[:max_tokens])
+    # Nodes of changed and removed files are stale in every mode
+    stale_paths = diff.changed + diff.removed
+    released = [p for p in stale_paths if p not in done]
+    if resume and not batch_api:
+        paths = [p for p in paths if p not in done]
+        # Drop whatever a partly written file left behind before redoing it
+        released += paths
 
-    # Limit size of the document context
-    original_document_content = _truncate_tokens(
-        original_document_content,
-        max_document_tokens,
+    # Vector DB (Chroma via LlamaIndex) and BM25
+    chroma_writer = ChromaWriter(
+        db_name=vectordb_name,
+        collection_name=collection_name,
+        save_dir=SAVE_DIR,
     )
+    bm25_writer = BM25Writer(
+        save_dir=SAVE_DIR,
+        db_name=bm25db_name,
+        update=sync,
+        removed_file_paths=stale_paths,
+        resume_file_paths=done if resume and not batch_api else None,
+    )
+
+    # Runs that keep the nodes of other files hand deduplicated chunks of the
+    # released files over to the other files they occur in (see ``source_files``);
+    # BM25 drops the released files' nodes on close and gets the moved copies
+    incremental = sync or (resume and not batch_api)
+    moved = chroma_writer.release_files(released, move_duplicates=incremental)
+    bm25_writer.add(moved)
 
     # ---------------------------
-    # Chunk documents into nodes
+    # Caches
     # ---------------------------
-    CHUNK_SIZE = chunk_size
-    chunks = chunk_elements(
-        elements,
-        target_tokens=CHUNK_SIZE,
-        max_tokens=max(1200, CHUNK_SIZE * 2),
-    )
+    element_cache = None
+    if use_extraction_cache:
+        element_cache = extraction_cache(
+            os.path.join(SAVE_DIR, db_name + "_extraction_cache"),
+            max_bytes=extraction_cache_max_bytes,
+        )
+        if clear_extraction_cache:
+            element_cache.clear()
 
-    # Create nodes with FLATTENED metadata to satisfy vector store constraints
-    nodes = [
-        TextNode(
-            text=c["text"],
-            metadata=_flat(c.get("metadata", {}))
+    context_cache = None
+    if use_context_cache:
+        context_cache = ContextCache(
+            os.path.join(SAVE_DIR, db_name + "_context_cache.sqlite"),
+            max_bytes=context_cache_max_bytes,
         )
-        for c in chunks
-    ]
 
     # ---------------------------
-    # Contextualization prompt (collapsed to a single string)
+    # Stream: extract -> chunk -> build prompts (one document at a time)
     # ---------------------------
-    template = (
-        "<document>{WHOLE_DOCUMENT}</document> "
-        "Here is the chunk we want to situate within the whole document "
-        "<chunk>{CHUNK_CONTENT}</chunk> "
-        "Please give a short succinct context to situate this chunk within the overall "
-        "document for the purposes of improving search retrieval of the chunk. "
-        "Answer only with the succinct context and nothing else."
-    )
+    encoding = tiktoken.get_encoding("cl100k_base")
+
+    deduplicator = ChunkDeduplicator(dedup_threshold) if dedup_threshold else None
+
+    def _add_summary_contexts(pending: list[_PendingChunk]) -> None:
+        """Set the contexts of one document's chunks from its section summaries."""
+        todo = [p for p in pending if p.context is None]
+        if not todo:
+            return
+        contexts = summary_contexts(
+            [p.node.text for p in todo],
+            [p.node.metadata.get("section_title") for p in todo],
+            [p.prompt_tokens - p.document_tokens for p in todo],
+            max_section_tokens=max_document_tokens,
+            cache=context_cache,
+            engine=contextualize,
+            max_concurrency=max_concurrency,
+            limiter=limiter,
+            usage=usage,
+            on_latency=_observe_llm,
+        )
+        for p, context in zip(todo, contexts):
+            p.context = context
+
+    # Files that yielded no elements (parser error, crash, timeout); they are
+    # kept out of the manifest so the next sync tries them again
+    failed: set[str] = set()
+
+    def _pending_documents() -> Iterator[list[_PendingChunk]]:
+        documents = metrics.timed_iter(
+            iter_documents(
+                paths,
+                workers=extract_workers,
+                timeout=extract_timeout,
+                cache=element_cache,
+            ),
+            "extract",
+        )
+        for doc_id, (_, path, elements) in enumerate(documents, start=len(done)):
+            if not elements:
+                # Not checkpointed either: a resumed run extracts the file again
+                failed.add(path)
+                continue
+            start = time.monotonic()
+            pending = _prepare_document(
+                elements,
+                doc_id=doc_id,
+                encoding=encoding,
+                chunk_size=chunk_size,
+                max_document_tokens=max_document_tokens,
+                context_window=context_window,
+                heuristic_types=heuristic_types,
+                build_prompts=context_mode == "document",
+            )
+            if deduplicator is not None:
+                pending = [
+                    p for p in pending
+                    if deduplicator.check(p.node.node_id, p.node.text, path) is None
+                ]
+            metrics.add_time("chunk", time.monotonic() - start, len(pending))
+            record = diff.records.get(path)
+            checkpoint.expect(path, record.sha256 if record else None, len(pending))
+            yield pending
+
+    def _pending_chunks() -> Iterator[_PendingChunk]:
+        # Summaries are only made here for the Batch API, which writes its
+        # request files from a single thread; the pipeline summarizes in the
+        # contextualize stage (see ``_batches``)
+        for pending in _pending_documents():
+            if context_mode == "summary":
+                with metrics.time("summarize", len(pending)):
+                    _add_summary_contexts(pending)
+            yield from pending
 
     # ---------------------------
-    # Contextual Retrieval: add succinct context before each chunk
+    # ... contextualize -> embed -> write, batch by batch
     # ---------------------------
-    idx = 0
-    for node in nodes:
-        content_body = node.text
+    # One budget shared by every contextualization batch in flight
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    usage = TokenUsage()
 
-        metadata = dict(node.metadata or {})
-        metadata["raw_chunk"] = content_body
+    def _observe_llm(seconds: float) -> None:
+        metrics.observe("llm_request", seconds)
 
-        chunk_tokens = encoding.encode(content_body)
-        allowed_doc_tokens = max(
-            0, min(max_document_tokens, context_window - len(chunk_tokens))
-        )
-        truncated_document = _truncate_tokens(
-            original_document_content,
-            allowed_doc_tokens,
-        )
+    def _batches() -> Iterator[tuple[int, list[_PendingChunk]]]:
+        section = checkpoint.chunks
+        if context_mode == "summary":
+            # Whole documents per batch, summarized by the contextualize stage
+            batches: Iterable[list[_PendingChunk]] = _document_batches(
+                _pending_documents(), batch_size
+            )
+        else:
+            batches = _batched(_pending_chunks(), batch_size)
+        for batch in batches:
+            yield section, batch
+            section += len(batch)
 
-        prompt = template.format(
-            WHOLE_DOCUMENT=truncated_document,
-            CHUNK_CONTENT=content_body,
-        )
+    def _contextualize_stage(item: tuple[int, list[_PendingChunk]]) -> list[TextNode]:
+        section, batch = item
+        if context_mode == "summary":
+            for document in _split_documents(batch):
+                with metrics.time("summarize", len(document)):
+                    _add_summary_contexts(document)
+        with metrics.time("contextualize", len(batch)):
+            return _contextualize_batch(
+                batch,
+                first_section=section,
+                context_cache=context_cache,
+                chunks_per_request=chunks_per_request,
+                metrics=metrics,
+                max_concurrency=max_concurrency,
+                limiter=limiter,
+                usage=usage,
+                on_latency=_observe_llm,
+            )
 
-        response_text = chat_completion(prompt)
-        contextual_text = response_text + content_body
-        nodes[idx].text = contextual_text
+    def _embed_stage(nodes: list[TextNode]) -> list[TextNode]:
+        start = time.monotonic()
+        nodes = chroma_writer.embed(nodes)
+        elapsed = time.monotonic() - start
+        metrics.add_time("embed", elapsed, len(nodes))
+        metrics.observe("embedding_batch", elapsed)
+        return nodes
 
-        # Keep these keys flat/primitive
-        metadata["file_name"] = metadata.get("file_name") or ""
-        metadata["section"] = idx
-        metadata["doc_id"] = metadata.get("doc_id")
+    def _write_stage(nodes: list[TextNode]) -> None:
+        _write_nodes(nodes, chroma_writer, bm25_writer, metrics)
+        for path, count in Counter(n.metadata.get("file_path") for n in nodes).items():
+            checkpoint.written(path, count)
 
-        anchor = (
-            metadata.get("page_number")
-            or metadata.get("slide_number")
-            or metadata.get("slide_id")
+    print("-:-:-:- ChromaDB [Vector Database] creating ... -:-:-:-")
+    if batch_api:
+        runner = BatchRunner(
+            os.path.join(SAVE_DIR, db_name + "_batch"),
+            poll_interval=batch_poll_interval,
         )
-        if anchor is not None:
-            metadata["anchor"] = anchor
 
-        # Re-flatten in case anything non-scalar snuck in
-        nodes[idx].metadata = _flat(metadata)
+        def _batch_pending_chunks() -> Iterator[_PendingChunk]:
+            yield from _pending_chunks()
+            # Saved with the job's request files; a resumed run does not extract again
+            runner.state["failed_paths"] = sorted(failed)
+            if deduplicator is not None:
+                runner.state["source_files"] = {
+                    node_id: sorted(files) for node_id, files in deduplicator.sources.items()
+                }
 
-        idx += 1
+        _batch_ingest(
+            _batch_pending_chunks,
+            runner,
+            chroma_writer,
+            bm25_writer,
+            context_cache,
+            batch_size,
+            metrics,
+            max_concurrency=max_concurrency,
+            limiter=limiter,
+            usage=usage,
+            on_latency=_observe_llm,
+        )
+        failed.update(runner.state.get("failed_paths", ()))
+        if deduplicator is not None:
+            for node_id, files in runner.state.get("source_files", {}).items():
+                deduplicator.sources.setdefault(node_id, set()).update(files)
+    else:
+        ingest = StagedPipeline(
+            _batches(),
+            [
+                Stage("contextualize", _contextualize_stage, contextualize_workers, queue_size),
+                Stage("embed", _embed_stage, embed_workers, queue_size),
+                Stage("write", _write_stage, 1, queue_size),
+            ],
+            source_name="extract",
+            report_interval=report_interval,
+        )
+        ingest.run()
+        print(ingest.format_stats())
+    if deduplicator is not None:
+        # Point every kept chunk at all files it was found in
+        source_updates = {
+            node_id: {"source_files": ",".join(sorted(files))}
+            for node_id, files in deduplicator.sources.items()
+            if len(files) > 1
+        }
+        chroma_writer.update_metadata(source_updates)
+        bm25_writer.update_metadata(source_updates)
+        print(f"Dedup: {deduplicator.report()}")
+    if not sync:
+        # A full rebuild replaces the BM25 index, so Chroma keeps exactly the
+        # nodes written now (plus those of files checkpointed by the resumed run)
+        keep = chroma_writer.written_ids
+        if resume and not batch_api:
+            keep = keep | chroma_writer.ids_of_files(done)
+        chroma_writer.retain(keep)
+    print(f"-:-:-:- ChromaDB [Vector Database] saved {chroma_writer.count} nodes -:-:-:-")
 
-        print(f'Context response from LLM => {response_text}\n For given text chunk => {content_body}')
+    with metrics.time("bm25_build", bm25_writer.count):
+        bm25_writer.close()
 
-    # ---------------------------
-    # Persist indices
-    # ---------------------------
-    vectordb_name = db_name + "_vectordb"
-    bm25db_name = db_name + "_bm25"
+    if element_cache is not None:
+        print(
+            f"Extraction cache: {element_cache.hits} hits, {element_cache.misses} misses"
+        )
+    print(f"Contextualization usage: {usage}")
+    if context_cache is not None:
+        print(
+            f"Context cache: {context_cache.hits} hits, {context_cache.misses} misses"
+        )
+        context_cache.close()
 
-    # Vector DB (Chroma via LlamaIndex). save_chromadb itself should also sanitize.
-    save_chromadb(
-        nodes=nodes,
-        save_dir=SAVE_DIR,
-        db_name=vectordb_name,
-        collection_name=collection_name
+    report_path = report_path or os.path.join(SAVE_DIR, db_name + "_ingest_report.json")
+    caches = {}
+    for name, cache in (("extraction", element_cache), ("context", context_cache)):
+        if cache is not None:
+            caches[name] = {"hits": cache.hits, "misses": cache.misses}
+    metrics.write(
+        report_path,
+        db_name=db_name,
+        files=len(paths),
+        nodes=chroma_writer.count,
+        pipeline=[] if batch_api else [s.as_dict() for s in ingest.stats],
+        tokens={
+            "requests": usage.requests,
+            "prompt_tokens": usage.prompt_tokens,
+            "cached_tokens": usage.cached_tokens,
+            "completion_tokens": usage.completion_tokens,
+        },
+        retries=metrics.counters.get("retries", 0),
+        http_retries={
+            name: {
+                "retries": policy.retries - retries_before[name][0],
+                "rate_limited": policy.rate_limited - retries_before[name][1],
+                "concurrency_limit": int(policy.concurrency.limit),
+            }
+            for name, policy in policies.items()
+        },
+        caches=caches,
+        dedup=(
+            {
+                "seen": deduplicator.seen,
+                "exact_duplicates": deduplicator.exact_duplicates,
+                "near_duplicates": deduplicator.near_duplicates,
+            }
+            if deduplicator is not None
+            else None
+        ),
     )
+    print(f"-:-:-:- Ingestion report written to {report_path} -:-:-:-")
 
-    # BM25
-    save_BM25(
-        nodes=nodes,
-        save_dir=SAVE_DIR,
-        db_name=bm25db_name
-    )
+    # Only record the new file state once both indices are written
+    if failed:
+        print(f"-:-:-:- {len(failed)} files yielded no text and are retried on the next sync -:-:-:-")
+    manifest.apply(diff, failed=failed)
+    manifest.save()
+    checkpoint.clear()
+
+    if batch_api:
+        # The batch jobs are fully ingested; the next run starts fresh
+        shutil.rmtree(runner.work_dir, ignore_errors=True)
 
 
 # import os
@@ -1,36 +1,181 @@
 from llama_index.vector_stores.chroma import ChromaVectorStore
-from llama_index.core import StorageContext
-from llama_index.core import VectorStoreIndex
+from llama_index.core.indices.utils import embed_nodes
+from llama_index.core.schema import MetadataMode
+from llama_index.core.vector_stores.utils import metadata_dict_to_node, node_to_metadata_dict
 import chromadb
+import hashlib
 import os
+import uuid
 
 from src.openai_client import OpenAIEmbedding as EmbeddingModel
 
-def save_chromadb(nodes: list, 
-                  db_name: str, 
-                  collection_name: str = "default", 
-                  save_dir: str = "./") -> None:
-    
-    print("-:-:-:- ChromaDB [Vector Database] creating ... -:-:-:-")
 
-    # Embedding Model
-    embed_model = EmbeddingModel()
+class ChromaWriter:
+    """Incrementally embeds nodes and writes them to a persistent Chroma collection.
 
-    # Path to save the database file
-    save_pth = os.path.join(save_dir, db_name)
+    Nodes are upserted by id, so writing a node again replaces it instead of
+    adding a duplicate.
+    """
 
-    # Initializing Vector Database
-    db = chromadb.PersistentClient(path=save_pth)
+    def __init__(self,
+                 db_name: str,
+                 collection_name: str = "default",
+                 save_dir: str = "./",
+                 embed_model=None) -> None:
 
-    # Creating Collection
-    chroma_collection = db.get_or_create_collection(collection_name)
-    
-    vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+        # Embedding Model
+        self.embed_model = embed_model or EmbeddingModel()
+
+        # Path to save the database file
+        save_pth = os.path.join(save_dir, db_name)
+
+        # Initializing Vector Database
+        db = chromadb.PersistentClient(path=save_pth)
+
+        # Creating Collection
+        chroma_collection = db.get_or_create_collection(collection_name)
+
+        self.collection = chroma_collection
+        self.vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+        self.count = 0
+        self.written_ids: set = set()
+
+    def embed(self, nodes: list) -> list:
+        """Attach embeddings to ``nodes`` (same text as ``VectorStoreIndex`` embeds)."""
+        embeddings = embed_nodes(nodes, self.embed_model)
+        for node in nodes:
+            node.embedding = embeddings[node.node_id]
+        return nodes
+
+    def add(self, nodes: list) -> None:
+        """Embed ``nodes`` that have no embedding yet and upsert them into the collection."""
+        if not nodes:
+            return
+        self.embed(nodes)
+        # Same record layout as ``ChromaVectorStore.add``, but idempotent
+        for start in range(0, len(nodes), 1000):
+            part = nodes[start:start + 1000]
+            metadatas = []
+            for node in part:
+                metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=True)
+                metadatas.append({k: ("" if v is None else v) for k, v in metadata.items()})
+            self.collection.upsert(
+                ids=[node.node_id for node in part],
+                embeddings=[node.get_embedding() for node in part],
+                metadatas=metadatas,
+                documents=[node.get_content(metadata_mode=MetadataMode.NONE) for node in part],
+            )
+        self.count += len(nodes)
+        self.written_ids.update(node.node_id for node in nodes)
+
+    def ids_of_files(self, file_paths) -> set:
+        """Return the ids of the stored nodes whose ``file_path`` is in ``file_paths``."""
+        file_paths = list(file_paths)
+        ids: set = set()
+        for start in range(0, len(file_paths), 500):
+            stored = self.collection.get(
+                where={"file_path": {"$in": file_paths[start:start + 500]}}, include=[]
+            )
+            ids.update(stored["ids"])
+        return ids
+
+    def release_files(self, file_paths, move_duplicates: bool = False) -> list:
+        """Delete the nodes of ``file_paths``.
+
+        With ``move_duplicates`` a node kept once for several files (listed in
+        its ``source_files``) is moved to the first of its files that is not
+        released, under a new id and with its embedding, instead of being
+        deleted. Returns the moved nodes.
+        """
+        released = set(file_paths)
+        if not released:
+            return []
+        paths = list(released)
+        moved = []
+        for start in range(0, len(paths), 500):
+            part = paths[start:start + 500]
+            if move_duplicates:
+                stored = self.collection.get(
+                    where={"file_path": {"$in": part}},
+                    include=["metadatas", "documents", "embeddings"],
+                )
+                for node_id, metadata, text, embedding in zip(
+                    stored["ids"], stored["metadatas"], stored["documents"], stored["embeddings"]
+                ):
+                    sources = [
+                        f for f in str(metadata.get("source_files") or "").split(",")
+                        if f and f not in released
+                    ]
+                    if not sources:
+                        continue
+                    node = metadata_dict_to_node(metadata, text=text)
+                    node.id_ = str(uuid.UUID(
+                        bytes=hashlib.sha256(f"{sources[0]}\0{node_id}".encode("utf-8")).digest()[:16]
+                    ))
+                    node.embedding = [float(v) for v in embedding]
+                    node.metadata.update(
+                        file_path=sources[0],
+                        file_name=os.path.basename(sources[0]),
+                        source_files=",".join(sources) if len(sources) > 1 else "",
+                    )
+                    moved.append(node)
+            self.collection.delete(where={"file_path": {"$in": part}})
+        self.add(moved)
+        print(f"-:-:-:- ChromaDB [Vector Database] removed nodes of {len(released)} files -:-:-:-")
+        return moved
 
-    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    def retain(self, ids: set) -> int:
+        """Delete every stored node whose id is not in ``ids``; return how many."""
+        stale = [node_id for node_id in self.collection.get(include=[])["ids"] if node_id not in ids]
+        for start in range(0, len(stale), 1000):
+            self.collection.delete(ids=stale[start:start + 1000])
+        if stale:
+            print(f"-:-:-:- ChromaDB [Vector Database] removed {len(stale)} stale nodes -:-:-:-")
+        return len(stale)
 
-    index = VectorStoreIndex(
-        nodes=nodes, storage_context=storage_context, embed_model=embed_model
+    def update_metadata(self, updates: dict) -> None:
+        """Merge ``updates`` (node id -> metadata) into already written nodes."""
+        ids = list(updates)
+        for start in range(0, len(ids), 500):
+            stored = self.collection.get(ids=ids[start:start + 500], include=["metadatas"])
+            if not stored["ids"]:
+                continue
+            self.collection.update(
+                ids=stored["ids"],
+                metadatas=[
+                    {**(metadata or {}), **updates[node_id]}
+                    for node_id, metadata in zip(stored["ids"], stored["metadatas"])
+                ],
+            )
+
+
+def save_chromadb(nodes: list,
+                  db_name: str,
+                  collection_name: str = "default",
+                  save_dir: str = "./") -> None:
+
+    print("-:-:-:- ChromaDB [Vector Database] creating ... -:-:-:-")
+
+    writer = ChromaWriter(
+        db_name=db_name, collection_name=collection_name, save_dir=save_dir
     )
+    writer.add(nodes)
 
     print("-:-:-:- ChromaDB [Vector Database] saved -:-:-:-")
+
+
+def delete_chromadb_files(file_paths: list,
+                          db_name: str,
+                          collection_name: str = "default",
+                          save_dir: str = "./") -> None:
+    """Delete every node whose ``file_path`` metadata is in ``file_paths``."""
+
+    if not file_paths:
+        return
+
+    save_pth = os.path.join(save_dir, db_name)
+    db = chromadb.PersistentClient(path=save_pth)
+    chroma_collection = db.get_or_create_collection(collection_name)
+    chroma_collection.delete(where={"file_path": {"$in": list(file_paths)}})
+
+    print(f"-:-:-:- ChromaDB [Vector Database] removed nodes of {len(file_paths)} files -:-:-:-")
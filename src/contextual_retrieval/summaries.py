@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+"""Hierarchical section and document summaries used as chunk contexts.
+
+Instead of sending the (truncated) document with every chunk, each section of
+a document is summarized once and the document summary is built from the
+section summaries. A chunk's context is then assembled from the summaries
+without another LLM call, so input tokens grow with the number of sections
+rather than with the number of chunks.
+"""
+
+from typing import Callable, List, Optional, Sequence
+
+from src.openai_client import OPENAI_MODEL
+
+from .context_cache import ContextCache, context_cache_key
+from .contextualize import contextualize
+
+section_template = (
+    "<section>{SECTION}</section> "
+    "Please give a short succinct summary of this part of a document for the "
+    "purposes of improving search retrieval of its chunks. "
+    "Answer only with the succinct summary and nothing else."
+)
+
+document_template = (
+    "<sections>{SECTIONS}</sections> "
+    "Here are summaries of the consecutive sections of one document. Please give a "
+    "short succinct summary of the whole document for the purposes of improving "
+    "search retrieval of its chunks. "
+    "Answer only with the succinct summary and nothing else."
+)
+
+
+def split_sections(
+    titles: Sequence[Optional[str]],
+    token_counts: Sequence[int],
+    max_tokens: int,
+) -> List[List[int]]:
+    """Group consecutive chunk indices into sections.
+
+    A section ends where ``section_title`` changes or when adding the next
+    chunk would exceed ``max_tokens``, so every section fits one prompt.
+    """
+    sections: List[List[int]] = []
+    current_title: Optional[str] = None
+    size = 0
+    for i, (title, tokens) in enumerate(zip(titles, token_counts)):
+        if not sections or title != current_title or size + tokens > max_tokens:
+            sections.append([])
+            current_title = title
+            size = 0
+        sections[-1].append(i)
+        size += tokens
+    return sections
+
+
+def summary_contexts(
+    texts: Sequence[str],
+    titles: Sequence[Optional[str]],
+    token_counts: Sequence[int],
+    max_section_tokens: int,
+    cache: Optional[ContextCache] = None,
+    engine: Callable[..., List[str]] = contextualize,
+    **engine_kwargs,
+) -> List[str]:
+    """Return one context per chunk of a document built from summaries.
+
+    ``texts``, ``titles`` and ``token_counts`` describe the document's chunks
+    in order. Summaries go through ``engine`` (:func:`contextualize` by
+    default) and ``cache``; ``engine_kwargs`` are passed on to it.
+    """
+    if not texts:
+        return []
+    sections = split_sections(titles, token_counts, max_section_tokens)
+
+    section_texts = ["\n".join(texts[i] for i in section) for section in sections]
+    prompts = [section_template.format(SECTION=text) for text in section_texts]
+    section_summaries = engine(
+        prompts,
+        token_counts=[sum(token_counts[i] for i in section) for section in sections],
+        cache=cache,
+        cache_keys=[
+            context_cache_key(text, "", OPENAI_MODEL, section_template)
+            for text in section_texts
+        ],
+        **engine_kwargs,
+    )
+
+    document_summary = ""
+    if len(sections) > 1:
+        listing = " ".join(
+            f"<section title={titles[section[0]] or ''!r}>{summary.strip()}</section>"
+            for section, summary in zip(sections, section_summaries)
+        )
+        document_summary = engine(
+            [document_template.format(SECTIONS=listing)],
+            cache=cache,
+            cache_keys=[context_cache_key(listing, "", OPENAI_MODEL, document_template)],
+            **engine_kwargs,
+        )[0].strip()
+
+    contexts: List[str] = [""] * len(texts)
+    for section, summary in zip(sections, section_summaries):
+        title = titles[section[0]]
+        parts = [document_summary] if document_summary else []
+        label = f"Section '{title}'" if title else "This part of the document"
+        parts.append(f"{label}: {summary.strip()}")
+        context = " ".join(parts) + "\n"
+        for i in section:
+            contexts[i] = context
+    return contexts
@@ -0,0 +1,291 @@
+from __future__ import annotations
+
+"""Persistent cache of embedding vectors shared by ingestion and queries.
+
+Vectors are keyed by model name and text hash. On disk every model has one
+memory-mapped float32 matrix (one row per text) and a SQLite index maps keys
+to rows, so ingestion runs and the API process can share a cache directory.
+An in-memory LRU tier in front of it serves repeated queries without any I/O.
+"""
+
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+Vector = List[float]
+
+
+def embedding_cache_key(model: str, text: str) -> str:
+    """Return the content address of ``text`` embedded with ``model``."""
+    digest = hashlib.sha256()
+    for part in (model, text):
+        data = part.encode("utf-8")
+        # Length-prefix each part so different splits cannot collide
+        digest.update(len(data).to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Embedding vectors keyed by :func:`embedding_cache_key`.
+
+    With ``path`` set, vectors are stored under that directory and survive
+    restarts; without it only the in-memory tier of ``memory_items`` recently
+    used vectors is kept. ``hits`` and ``misses`` count lookups made through
+    :meth:`get_many` since the cache was opened.
+    """
+
+    def __init__(self, path: Optional[str] = None, memory_items: int = 4096) -> None:
+        self.path = path
+        self.memory_items = memory_items
+        self.hits = 0
+        self.misses = 0
+        self._memory: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        # model -> (matrix file, dim, mapped matrix)
+        self._matrices: Dict[str, Tuple[str, int, Optional[np.memmap]]] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            os.makedirs(path, exist_ok=True)
+            # Autocommit mode; writes use explicit transactions so concurrent
+            # processes append rows one at a time
+            self._conn = sqlite3.connect(
+                os.path.join(path, "index.sqlite"),
+                check_same_thread=False,
+                isolation_level=None,
+                timeout=30,
+            )
+            # Readers (e.g. the API process) do not wait for an ingestion write
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS matrices ("
+                "model TEXT PRIMARY KEY, file TEXT NOT NULL, "
+                "dim INTEGER NOT NULL, rows INTEGER NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, model TEXT NOT NULL, row INTEGER NOT NULL)"
+            )
+
+    def __len__(self) -> int:
+        with self._lock:
+            if self._conn is None:
+                return len(self._memory)
+            return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _matrix(self, model: str, rows: int) -> Optional[np.memmap]:
+        """Return ``model``'s matrix mapped with at least ``rows`` rows."""
+        entry = self._matrices.get(model)
+        if entry is None or entry[2] is None or entry[2].shape[0] < rows:
+            found = self._conn.execute(
+                "SELECT file, dim FROM matrices WHERE model = ?", (model,)
+            ).fetchone()
+            if found is None:
+                return None
+            file, dim = found
+            path = os.path.join(self.path, file)
+            available = os.path.getsize(path) // (dim * 4) if os.path.exists(path) else 0
+            matrix = (
+                np.memmap(path, dtype=np.float32, mode="r", shape=(available, dim))
+                if available
+                else None
+            )
+            entry = (file, dim, matrix)
+            self._matrices[model] = entry
+        return entry[2]
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[Vector]]:
+        """Return the cached vector of each text, ``None`` where missing."""
+        keys = [embedding_cache_key(model, text) for text in texts]
+        found: List[Optional[np.ndarray]] = [None] * len(keys)
+        with self._lock:
+            missing: Dict[str, List[int]] = {}
+            for i, key in enumerate(keys):
+                vector = self._memory.get(key)
+                if vector is None:
+                    missing.setdefault(key, []).append(i)
+                else:
+                    self._memory.move_to_end(key)
+                    found[i] = vector
+
+            if missing and self._conn is not None:
+                rows: Dict[str, int] = {}
+                pending = list(missing)
+                for start in range(0, len(pending), 500):
+                    part = pending[start:start + 500]
+                    rows.update(self._conn.execute(
+                        "SELECT key, row FROM embeddings WHERE model = ? AND key IN "
+                        f"({','.join('?' * len(part))})",
+                        [model, *part],
+                    ).fetchall())
+                matrix = self._matrix(model, max(rows.values(), default=-1) + 1) if rows else None
+                for key, row in rows.items():
+                    if matrix is None or row >= matrix.shape[0]:
+                        continue
+                    vector = np.array(matrix[row])
+                    self._remember(key, vector)
+                    for i in missing[key]:
+                        found[i] = vector
+
+            hits = sum(1 for vector in found if vector is not None)
+            self.hits += hits
+            self.misses += len(found) - hits
+        return [vector.tolist() if vector is not None else None for vector in found]
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: Sequence[Vector]) -> None:
+        """Store the vector of each text (texts already cached are skipped on disk)."""
+        if not texts:
+            return
+        matrix = np.asarray(vectors, dtype=np.float32)
+        keys = [embedding_cache_key(model, text) for text in texts]
+        with self._lock:
+            for key, vector in zip(keys, matrix):
+                self._remember(key, vector)
+            if self._conn is None:
+                return
+
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                found = self._conn.execute(
+                    "SELECT file, dim, rows FROM matrices WHERE model = ?", (model,)
+                ).fetchone()
+                if found is None:
+                    file = hashlib.sha256(model.encode("utf-8")).hexdigest()[:16] + ".f32"
+                    dim, rows = matrix.shape[1], 0
+                    self._conn.execute(
+                        "INSERT INTO matrices (model, file, dim, rows) VALUES (?, ?, ?, 0)",
+                        (model, file, dim),
+                    )
+                else:
+                    file, dim, rows = found
+                if matrix.shape[1] != dim:
+                    raise ValueError(
+                        f"Embeddings of {model!r} have {dim} dimensions, got {matrix.shape[1]}"
+                    )
+
+                stored = set()
+                for start in range(0, len(keys), 500):
+                    part = keys[start:start + 500]
+                    stored.update(key for (key,) in self._conn.execute(
+                        f"SELECT key FROM embeddings WHERE key IN ({','.join('?' * len(part))})",
+                        part,
+                    ))
+                new: Dict[str, int] = {}
+                for i, key in enumerate(keys):
+                    if key not in stored and key not in new:
+                        new[key] = i
+                if new:
+                    # Vectors are written before the index rows that point at them
+                    path = os.path.join(self.path, file)
+                    with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                        f.seek(rows * dim * 4)
+                        f.write(matrix[list(new.values())].tobytes())
+                    self._conn.executemany(
+                        "INSERT INTO embeddings (key, model, row) VALUES (?, ?, ?)",
+                        [(key, model, rows + n) for n, key in enumerate(new)],
+                    )
+                    self._conn.execute(
+                        "UPDATE matrices SET rows = ? WHERE model = ?", (rows + len(new), model)
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def clear(self) -> None:
+        """Remove every cached vector."""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is None:
+                return
+            files = [file for (file,) in self._conn.execute("SELECT file FROM matrices")]
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.execute("DELETE FROM matrices")
+            self._matrices.clear()
+            for file in files:
+                path = os.path.join(self.path, file)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def close(self) -> None:
+        with self._lock:
+            self._matrices.clear()
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+_shared: Dict[Optional[str], EmbeddingCache] = {}
+_shared_lock = threading.Lock()
+
+
+def shared_embedding_cache(path: Optional[str] = None) -> EmbeddingCache:
+    """Return the process-wide :class:`EmbeddingCache` for ``path``."""
+    with _shared_lock:
+        cache = _shared.get(path)
+        if cache is None:
+            cache = _shared[path] = EmbeddingCache(path)
+        return cache
+
+
+def _split(
+    cache: EmbeddingCache, model: str, texts: Sequence[str]
+) -> Tuple[List[Optional[Vector]], List[str]]:
+    found = cache.get_many(model, texts)
+    # Each distinct uncached text is embedded once
+    missing = list(dict.fromkeys(t for t, v in zip(texts, found) if v is None))
+    return found, missing
+
+
+def _merge(found: List[Optional[Vector]], texts: Sequence[str], computed: Dict[str, Vector]) -> List[Vector]:
+    return [v if v is not None else computed[t] for t, v in zip(texts, found)]
+
+
+def cached_embeddings(
+    cache: Optional[EmbeddingCache],
+    model: str,
+    texts: Sequence[str],
+    embed: Callable[[List[str]], List[Vector]],
+) -> List[Vector]:
+    """Return the vectors of ``texts``, calling ``embed`` only for uncached ones."""
+    if cache is None:
+        return embed(list(texts))
+    found, missing = _split(cache, model, texts)
+    if not missing:
+        return found  # type: ignore[return-value]
+    vectors = embed(missing)
+    cache.put_many(model, missing, vectors)
+    return _merge(found, texts, dict(zip(missing, vectors)))
+
+
+async def acached_embeddings(
+    cache: Optional[EmbeddingCache],
+    model: str,
+    texts: Sequence[str],
+    embed: Callable[[List[str]], Awaitable[List[Vector]]],
+) -> List[Vector]:
+    """Async :func:`cached_embeddings`.
+
+    Cache reads and writes (SQLite and file I/O, possibly waiting for another
+    process's write lock) run in a worker thread, not on the event loop.
+    """
+    if cache is None:
+        return await embed(list(texts))
+    found, missing = await asyncio.to_thread(_split, cache, model, texts)
+    if not missing:
+        return found  # type: ignore[return-value]
+    vectors = await embed(missing)
+    await asyncio.to_thread(cache.put_many, model, missing, vectors)
+    return _merge(found, texts, dict(zip(missing, vectors)))
@@ -3,12 +3,23 @@ from __future__ import annotations
 """High level document ingestion utilities."""
 
 import mimetypes
+import os
+from typing import Iterator
 
 from unstructured.documents.elements import Element
 
+from src.logging_config import get_logger
+
+from src.ingest.manifest import file_sha256
+
+from .cache import ExtractionCache
+from .pdf_ocr import extract_pdf_pages
+from .pool import imap_isolated
 from .tika_adapter import TikaAdapter
 from .unstructured_extractor import extract_unstructured
 
+logger = get_logger(__name__)
+
 
 def ingest_file(
     path: str,
@@ -28,12 +39,17 @@ def ingest_file(
             if extractor == "unstructured":
                 elements = extract_unstructured(path, mime)
             else:
-                elements = tika.extract(path, mime)
-                if (
-                    mime == "application/pdf"
-                    and _text_len(elements) < 10
-                ):
-                    elements = tika.extract(path, mime, ocr="ocr_and_text")
+                # PDFs with text-less pages: OCR only those pages
+                pages = extract_pdf_pages(path, tika) if mime == "application/pdf" else None
+                if pages is not None:
+                    elements = pages
+                else:
+                    elements = tika.extract(path, mime)
+                    if (
+                        mime == "application/pdf"
+                        and _text_len(elements) < 10
+                    ):
+                        elements = tika.extract(path, mime, ocr="ocr_and_text")
         except Exception:
             elements = []
         if elements:
@@ -41,20 +57,131 @@ def ingest_file(
     return [el for el in elements if getattr(el, "text", "").strip()]
 
 
-def load_documents(paths: list[str]) -> list[Element]:
-    """Load and normalize documents from a list of file paths."""
-    tika = TikaAdapter()
+def _tag_source(el: Element, path: str) -> None:
+    """Record the source file on ``el`` so its chunks can be traced back."""
+    md = getattr(el, "metadata", None)
+    if md is None:
+        return
+    md.file_path = path  # type: ignore[attr-defined]
+    # Cached elements may come from an identical file elsewhere
+    md.filename = os.path.basename(path)
+    md.file_directory = os.path.dirname(path)
+
+
+def _normalize(elements: list[Element], path: str) -> list[Element]:
+    for el in elements:
+        if hasattr(el, "text") and isinstance(el.text, str):
+            el.text = el.text.strip()
+        _tag_source(el, path)
+    return elements
+
+
+def load_documents(
+    paths: list[str],
+    workers: int = 1,
+    timeout: float | None = None,
+    cache: ExtractionCache | None = None,
+) -> list[Element]:
+    """Load and normalize documents from a list of file paths.
+
+    Elements are returned in the order of ``paths`` regardless of the order
+    in which parallel workers finish; see :func:`iter_documents`.
+    """
+    by_index: dict[int, list[Element]] = {}
+    documents = iter_documents(paths, workers=workers, timeout=timeout, cache=cache)
+    for index, _, elements in documents:
+        by_index[index] = elements
     all_elements: list[Element] = []
-    for path in paths:
+    for index in sorted(by_index):
+        all_elements.extend(by_index[index])
+    return all_elements
+
+
+def iter_documents(
+    paths: list[str],
+    workers: int = 1,
+    timeout: float | None = None,
+    cache: ExtractionCache | None = None,
+) -> Iterator[tuple[int, str, list[Element]]]:
+    """Yield ``(index, path, elements)`` for each of ``paths`` as it is extracted.
+
+    With ``workers > 1`` (or a ``timeout``) files are extracted in separate
+    processes and yielded in completion order. A file whose parser raises,
+    crashes its worker or exceeds ``timeout`` seconds yields no elements and
+    does not affect the other files. ``index`` is the position in ``paths``.
+
+    Files found in ``cache`` are yielded first without being parsed; newly
+    extracted non-empty results are stored in it.
+    """
+    tika = TikaAdapter()
+    tasks: list[tuple[int, str, str]] = []
+    file_hashes: dict[str, str] = {}
+    for index, path in enumerate(paths):
         mime, _ = mimetypes.guess_type(path)
         if not mime:
             continue
-        elements = ingest_file(path, mime, tika=tika)
-        for el in elements:
-            if hasattr(el, "text") and isinstance(el.text, str):
-                el.text = el.text.strip()
-            all_elements.append(el)
-    return all_elements
+        if cache is not None:
+            file_hashes[path] = file_sha256(path)
+            cached = cache.get(path, file_hashes[path])
+            if cached is not None:
+                yield index, path, _normalize(cached, path)
+                continue
+        tasks.append((index, path, mime))
+
+    def _store(path: str, elements: list[Element]) -> None:
+        if cache is not None and elements:
+            cache.put(path, elements, file_hashes[path])
+
+    if workers <= 1 and timeout is None:
+        for index, path, mime in tasks:
+            elements = ingest_file(path, mime, tika=tika)
+            _store(path, elements)
+            yield index, path, _normalize(elements, path)
+        return
+
+    results = imap_isolated(
+        ingest_file,
+        [(path, mime) for _, path, mime in tasks],
+        workers=workers,
+        timeout=timeout,
+        tika=tika,
+    )
+    for task_index, elements, error in results:
+        index, path, _ = tasks[task_index]
+        if error is not None:
+            logger.error("Failed to extract %s: %s", path, error)
+        _store(path, elements or [])
+        yield index, path, _normalize(elements or [], path)
+
+
+def extraction_cache(directory: str, max_bytes: int = 2 * 1024 * 1024 * 1024) -> ExtractionCache:
+    """Return the :class:`ExtractionCache` matching the current extractor setup.
+
+    The cache namespace covers the Unstructured version and the Tika settings
+    read from the environment, so changing either invalidates old entries.
+    """
+    from unstructured.__version__ import __version__ as unstructured_version
+
+    tika = TikaAdapter()
+    return ExtractionCache(
+        directory,
+        extractor="unstructured+tika",
+        version=unstructured_version,
+        config={
+            "tika_url": tika.url,
+            "tika_write_limit": tika.write_limit,
+            "tika_max_embedded_resources": tika.max_embedded_resources,
+        },
+        max_bytes=max_bytes,
+    )
 
 
-__all__ = ["TikaAdapter", "extract_unstructured", "ingest_file", "load_documents"]
+__all__ = [
+    "ExtractionCache",
+    "TikaAdapter",
+    "extraction_cache",
+    "extract_unstructured",
+    "ingest_file",
+    "iter_documents",
+    "load_documents",
+]
@@ -0,0 +1,151 @@
+from __future__ import annotations
+
+"""On-disk cache of extracted document elements."""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Any
+
+from unstructured.documents import elements as unstructured_elements
+from unstructured.documents.elements import Element, ElementMetadata, Text
+
+from src.ingest.manifest import file_sha256
+
+# Bump to invalidate every cache entry after a change to the extraction code.
+CACHE_FORMAT_VERSION = 2
+
+# Entries are keyed by content, so metadata naming the file they were extracted
+# from is dropped; ``iter_documents`` tags elements with their actual path.
+_PATH_METADATA = ("filename", "file_directory", "file_path")
+
+
+def _encode(elements: list[Element]) -> bytes:
+    rows = [
+        {
+            "class": type(el).__name__,
+            "category": el.category,
+            "id": el.id,
+            "text": el.text,
+            "metadata": {
+                k: v for k, v in el.metadata.to_dict().items() if k not in _PATH_METADATA
+            },
+        }
+        for el in elements
+    ]
+    return gzip.compress(
+        json.dumps(rows, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    )
+
+
+def _decode(data: bytes) -> list[Element]:
+    elements: list[Element] = []
+    for row in json.loads(gzip.decompress(data)):
+        cls = getattr(unstructured_elements, row["class"], Text)
+        el = cls(
+            text=row["text"],
+            element_id=row["id"],
+            metadata=ElementMetadata.from_dict(row["metadata"]),
+        )
+        # Categories such as "SlideNote" are set by our extractors, not the class
+        el.category = row["category"]
+        elements.append(el)
+    return elements
+
+
+class ExtractionCache:
+    """Directory of gzip-compressed element lists keyed by file content.
+
+    Keys combine the SHA-256 of the file with the extractor name, the
+    extractor version and a fingerprint of ``config``. Changing any of these
+    (for example the Tika OCR strategy or the Unstructured release) makes old
+    entries unreachable; they then age out under the ``max_bytes`` LRU cap.
+    :meth:`clear` drops everything at once.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        extractor: str,
+        version: str,
+        config: dict[str, Any] | None = None,
+        max_bytes: int = 2 * 1024 * 1024 * 1024,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        fingerprint = json.dumps(
+            [CACHE_FORMAT_VERSION, extractor, version, config or {}],
+            sort_keys=True,
+            default=str,
+        )
+        self._namespace = hashlib.sha256(fingerprint.encode("utf-8")).hexdigest()[:16]
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._entries())
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _entries(self) -> list[tuple[str, int, float]]:
+        entries = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json.gz"):
+                    path = os.path.join(root, name)
+                    st = os.stat(path)
+                    entries.append((path, st.st_size, st.st_mtime))
+        return entries
+
+    def _path(self, file_hash: str) -> str:
+        key = f"{self._namespace}-{file_hash}"
+        return os.path.join(self.directory, key[:2], key + ".json.gz")
+
+    def get(self, path: str, file_hash: str | None = None) -> list[Element] | None:
+        """Return the cached elements for the file at ``path`` or ``None``."""
+        entry = self._path(file_hash or file_sha256(path))
+        try:
+            with open(entry, "rb") as f:
+                data = f.read()
+            os.utime(entry)  # mark as recently used
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return _decode(data)
+
+    def put(self, path: str, elements: list[Element], file_hash: str | None = None) -> None:
+        """Store ``elements`` extracted from the file at ``path``."""
+        entry = self._path(file_hash or file_sha256(path))
+        data = _encode(elements)
+        os.makedirs(os.path.dirname(entry), exist_ok=True)
+        tmp_path = f"{entry}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        with self._lock:
+            old_size = os.path.getsize(entry) if os.path.exists(entry) else 0
+            os.replace(tmp_path, entry)
+            self._size += len(data) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        for path, size, _ in sorted(self._entries(), key=lambda e: e[2]):
+            if self._size <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            self._size -= size
+
+    def clear(self) -> None:
+        """Remove every cached entry, including other configurations."""
+        with self._lock:
+            for path, _, _ in self._entries():
+                os.remove(path)
+            self._size = 0
@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+"""Page-level OCR fallback for PDFs that mix text and scanned pages."""
+
+import os
+import tempfile
+
+from unstructured.documents.elements import Element, Text
+
+from .tika_adapter import TikaAdapter
+
+
+def textless_pages(path: str, min_chars: int = 10) -> tuple[list[str], list[int]] | None:
+    """Return the text layer of every page and the indices of text-less pages.
+
+    Returns ``None`` when PyMuPDF is not installed or cannot open the file.
+    """
+    try:
+        import fitz  # PyMuPDF
+    except ImportError:
+        return None
+    try:
+        with fitz.open(path) as doc:
+            texts = [page.get_text().strip() for page in doc]
+    except Exception:
+        return None
+    return texts, [i for i, text in enumerate(texts) if len(text) < min_chars]
+
+
+def ocr_pages(path: str, pages: list[int], tika: TikaAdapter) -> list[str]:
+    """OCR only ``pages`` of the PDF at ``path``; returns one text per page.
+
+    Each page is copied into a single-page PDF and sent to Tika with the
+    ``ocr_only`` strategy, keeping up to ``tika.max_in_flight`` pages in flight.
+    """
+    import fitz  # PyMuPDF
+
+    with tempfile.TemporaryDirectory() as tmp, fitz.open(path) as doc:
+        files = []
+        for page in pages:
+            single = fitz.open()
+            single.insert_pdf(doc, from_page=page, to_page=page)
+            page_path = os.path.join(tmp, f"page-{page + 1}.pdf")
+            single.save(page_path)
+            single.close()
+            files.append((page_path, "application/pdf"))
+        results = tika.extract_many(files, ocr="ocr_only")
+    return ["\n".join(el.text for el in els).strip() for els in results]
+
+
+def extract_pdf_pages(
+    path: str,
+    tika: TikaAdapter,
+    min_chars: int = 10,
+) -> list[Element] | None:
+    """Extract a PDF page by page, OCR-ing only the pages without a text layer.
+
+    Returns one element per non-empty page, in page order, with
+    ``page_number`` metadata. Returns ``None`` when the PDF has no text-less
+    pages (the regular extractors suffice) or cannot be inspected.
+    """
+    inspected = textless_pages(path, min_chars)
+    if inspected is None:
+        return None
+    texts, missing = inspected
+    if not missing:
+        return None
+    for page, text in zip(missing, ocr_pages(path, missing, tika)):
+        if len(text) > len(texts[page]):
+            texts[page] = text
+    elements: list[Element] = []
+    for page, text in enumerate(texts):
+        if text:
+            el = Text(text)
+            el.metadata.page_number = page + 1
+            elements.append(el)
+    return elements
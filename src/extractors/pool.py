@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+"""Crash-isolated process pool for CPU-heavy document extraction."""
+
+import multiprocessing as mp
+import time
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from typing import Any, Callable, Iterator, Sequence
+
+from src.logging_config import get_logger
+
+logger = get_logger(__name__)
+
+
+def _worker_main(conn: Connection, func: Callable[..., Any], kwargs: dict) -> None:
+    """Run ``func`` for every task received on ``conn`` until ``None`` arrives."""
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message is None:
+            return
+        index, args = message
+        try:
+            conn.send((index, func(*args, **kwargs), None))
+        except Exception as exc:  # also covers results that cannot be pickled
+            conn.send((index, None, repr(exc)))
+
+
+class _Worker:
+    def __init__(self, ctx: Any, func: Callable[..., Any], kwargs: dict) -> None:
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child, func, kwargs), daemon=True
+        )
+        self.process.start()
+        child.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(timeout=1)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+def imap_isolated(
+    func: Callable[..., Any],
+    tasks: Sequence[tuple],
+    workers: int,
+    timeout: float | None = None,
+    **kwargs: Any,
+) -> Iterator[tuple[int, Any, str | None]]:
+    """Run ``func(*task, **kwargs)`` for each task in worker processes.
+
+    Yields ``(index, result, error)`` as each task finishes, in completion
+    order. A task that raises, crashes its worker or runs longer than
+    ``timeout`` seconds yields ``result=None`` with an error message; the
+    affected worker is replaced so the remaining tasks keep running.
+    """
+    # Forking copies the locks held by the caller's other threads (pipeline
+    # stages, the client event loop), which can deadlock the child
+    methods = mp.get_all_start_methods()
+    ctx = mp.get_context("forkserver" if "forkserver" in methods else "spawn")
+    pending = deque(enumerate(tasks))
+    idle = [_Worker(ctx, func, kwargs) for _ in range(max(1, min(workers, len(tasks))))]
+    busy: dict[Connection, tuple[_Worker, int, float | None]] = {}
+
+    def _replace(worker: _Worker) -> None:
+        worker.kill()
+        if pending:
+            idle.append(_Worker(ctx, func, kwargs))
+
+    try:
+        while pending or busy:
+            while idle and pending:
+                worker = idle.pop()
+                index, args = pending.popleft()
+                worker.conn.send((index, tuple(args)))
+                deadline = time.monotonic() + timeout if timeout else None
+                busy[worker.conn] = (worker, index, deadline)
+
+            wait_for = None
+            if timeout:
+                wait_for = max(0.0, min(d for _, _, d in busy.values()) - time.monotonic())
+            for conn in wait(list(busy), timeout=wait_for):
+                worker, index, _ = busy.pop(conn)
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    worker.process.join(timeout=1)
+                    exitcode = worker.process.exitcode
+                    logger.error("Extraction worker crashed on task %s (exit code %s)", index, exitcode)
+                    _replace(worker)
+                    yield index, None, f"worker crashed with exit code {exitcode}"
+                    continue
+                idle.append(worker)
+                yield message
+
+            now = time.monotonic()
+            for conn, (worker, index, deadline) in list(busy.items()):
+                if deadline is not None and now >= deadline:
+                    del busy[conn]
+                    logger.error("Extraction task %s timed out after %ss", index, timeout)
+                    _replace(worker)
+                    yield index, None, f"timed out after {timeout}s"
+    finally:
+        for worker, _, _ in busy.values():
+            worker.kill()
+        for worker in idle:
+            worker.stop()
@@ -2,15 +2,27 @@ from __future__ import annotations
 
 """Adapter for interacting with an Apache Tika server."""
 
+import asyncio
+import logging
 import os
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable, List
 
 import requests
+from requests.adapters import HTTPAdapter
 from unstructured.documents.elements import Element, Text
 
+logger = logging.getLogger(__name__)
+
 
 class TikaAdapter:
-    """Client for Apache Tika's ``/rmeta/text`` endpoint."""
+    """Client for Apache Tika's ``/rmeta/text`` endpoint.
+
+    File bodies are streamed from disk over a keep-alive session that is
+    shared by all calls on the adapter. :meth:`extract_many` and
+    :meth:`aextract_many` keep up to ``max_in_flight`` requests running
+    against the server at once.
+    """
 
     def __init__(
         self,
@@ -19,6 +31,7 @@ class TikaAdapter:
         timeout: int | None = None,
         write_limit: str | None = None,
         max_embedded_resources: str | None = None,
+        max_in_flight: int | None = None,
     ) -> None:
         self.url = url or os.environ.get("TIKA_URL", "http://localhost:9998")
         self.timeout = timeout or int(os.environ.get("TIKA_TIMEOUT", "60"))
@@ -28,6 +41,32 @@ class TikaAdapter:
         self.max_embedded_resources = max_embedded_resources or os.environ.get(
             "X_TIKA_MAX_EMBEDDED_RESOURCES", "1000"
         )
+        self.max_in_flight = max_in_flight or int(
+            os.environ.get("TIKA_MAX_IN_FLIGHT", "4")
+        )
+        self._session: requests.Session | None = None
+
+    def __getstate__(self) -> dict:
+        # Sessions hold open sockets; each process builds its own.
+        state = self.__dict__.copy()
+        state["_session"] = None
+        return state
+
+    @property
+    def session(self) -> requests.Session:
+        """Keep-alive session sized for ``max_in_flight`` connections."""
+        if self._session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_in_flight)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            self._session = session
+        return self._session
+
+    def close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+            self._session = None
 
     def extract(self, path: str, mime: str, ocr: str | None = None) -> list[Element]:
         """Extract elements from ``path`` using Apache Tika."""
@@ -40,10 +79,11 @@ class TikaAdapter:
             "Content-Type": mime,
         }
         with open(path, "rb") as f:
-            response = requests.put(
+            # Passing the file object streams it instead of loading it into memory
+            response = self.session.put(
                 f"{self.url}/rmeta/text",
                 headers=headers,
-                data=f.read(),
+                data=f,
                 timeout=self.timeout,
             )
         response.raise_for_status()
@@ -54,3 +94,47 @@ class TikaAdapter:
             if content:
                 elements.append(Text(content.strip()))
         return elements
+
+    def _extract_or_empty(self, path: str, mime: str, ocr: str | None) -> list[Element]:
+        try:
+            return self.extract(path, mime, ocr=ocr)
+        except Exception:
+            logger.exception("Tika extraction failed for %s", path)
+            return []
+
+    def extract_many(
+        self,
+        files: Iterable[tuple[str, str]],
+        ocr: str | None = None,
+    ) -> list[list[Element]]:
+        """Extract ``(path, mime)`` pairs with up to ``max_in_flight`` concurrent requests.
+
+        Results are returned in input order; a file that fails yields ``[]``.
+        """
+        files = list(files)
+        if not files:
+            return []
+        self.session  # create the shared session before fanning out
+        with ThreadPoolExecutor(max_workers=min(self.max_in_flight, len(files))) as pool:
+            return list(
+                pool.map(lambda f: self._extract_or_empty(f[0], f[1], ocr), files)
+            )
+
+    async def aextract(self, path: str, mime: str, ocr: str | None = None) -> list[Element]:
+        """Async variant of :meth:`extract` that does not block the event loop."""
+        return await asyncio.to_thread(self.extract, path, mime, ocr)
+
+    async def aextract_many(
+        self,
+        files: Iterable[tuple[str, str]],
+        ocr: str | None = None,
+    ) -> list[list[Element]]:
+        """Async variant of :meth:`extract_many`."""
+        self.session  # create the shared session before fanning out
+        semaphore = asyncio.Semaphore(self.max_in_flight)
+
+        async def _one(path: str, mime: str) -> list[Element]:
+            async with semaphore:
+                return await asyncio.to_thread(self._extract_or_empty, path, mime, ocr)
+
+        return list(await asyncio.gather(*(_one(p, m) for p, m in files)))
@@ -0,0 +1,96 @@
+"""Progress checkpoints for resumable ingestion runs.
+
+Every file whose chunks have all been written to the indices is appended to
+a JSON-lines checkpoint together with its content hash and chunk count. A
+resumed run skips those files; files that were only partly written are
+re-processed from scratch.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+from typing import Dict, Mapping, Optional, Set
+
+from .manifest import FileRecord
+
+__all__ = ["IngestCheckpoint"]
+
+
+class IngestCheckpoint:
+    """Track per-file progress of an ingestion run in ``path``."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.done: Dict[str, Dict[str, object]] = {}
+        self._expected: Dict[str, int] = {}
+        self._written: Dict[str, int] = {}
+        self._hashes: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._file = None
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # The last line may be torn if the run was killed mid-write
+                        continue
+                    self.done[entry["path"]] = entry
+
+    def completed(self, records: Mapping[str, FileRecord]) -> Set[str]:
+        """Return the checkpointed files whose content still matches ``records``.
+
+        Entries of files that changed or disappeared since they were written
+        are dropped.
+        """
+        self.done = {
+            path: entry
+            for path, entry in self.done.items()
+            if path in records and records[path].sha256 == entry.get("sha256")
+        }
+        return set(self.done)
+
+    @property
+    def chunks(self) -> int:
+        """Number of chunks written by the completed files."""
+        return sum(int(entry.get("chunks", 0)) for entry in self.done.values())
+
+    def expect(self, path: str, sha256: Optional[str], chunks: int) -> None:
+        """Register that ``path`` produced ``chunks`` chunks still to be written."""
+        with self._lock:
+            self._expected[path] = chunks
+            self._hashes[path] = sha256 or ""
+            self._written.setdefault(path, 0)
+            if self._written[path] >= chunks:
+                self._complete(path)
+
+    def written(self, path: str, count: int) -> None:
+        """Record that ``count`` chunks of ``path`` reached the indices."""
+        with self._lock:
+            self._written[path] = self._written.get(path, 0) + count
+            if path in self._expected and self._written[path] >= self._expected[path]:
+                self._complete(path)
+
+    def _complete(self, path: str) -> None:
+        entry = {"path": path, "sha256": self._hashes[path], "chunks": self._expected[path]}
+        if self._file is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        self.done[path] = entry
+        del self._expected[path]
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def clear(self) -> None:
+        """Forget all progress and delete the checkpoint file."""
+        self.close()
+        self.done = {}
+        if os.path.exists(self.path):
+            os.remove(self.path)
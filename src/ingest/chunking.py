@@ -12,16 +12,53 @@ Features
 * Table headers are preserved and large tables are split by row groups.
 * One chunk is created per PPTX slide and slide notes are emitted as
   separate chunks.
+
+Every element, table row and slide line is tokenized exactly once (in
+batches where the encoding supports it) and each returned chunk carries its
+``token_count`` so downstream stages do not need to tokenize it again, and
+its ``chunk_type`` (``"text"``, ``"table"``, ``"slide"`` or ``"slide_note"``).
 """
 
 from __future__ import annotations
 
-from typing import Any, Dict, Iterable, List, MutableMapping
+from typing import Any, Callable, Dict, Iterable, List, MutableMapping, Tuple
 
 import tiktoken
 
 __all__ = ["chunk_elements"]
 
+# Metadata identifying the source file, kept on every chunk
+_SOURCE_KEYS = ("file_path", "filename", "file_name", "doc_id")
+
+_encoding: Any = None
+
+
+def _default_encoding() -> Any:
+    """Return the shared ``cl100k_base`` encoding, or ``None`` if unavailable."""
+    global _encoding
+    if _encoding is None:
+        try:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            return None
+    return _encoding
+
+
+def _token_counter(encoding: Any) -> Callable[[List[str]], List[int]]:
+    """Return a function counting the tokens of a batch of texts."""
+    if encoding is None:
+        # Fallback simple tokenizer when encoding files cannot be downloaded
+        return lambda texts: [len(t.split()) for t in texts]
+    encode_batch = getattr(encoding, "encode_ordinary_batch", None)
+    if encode_batch is not None:
+        return lambda texts: [len(tks) for tks in encode_batch(texts)] if texts else []
+    return lambda texts: [len(encoding.encode(t)) for t in texts]
+
+
+def _joined_tokens(counts: List[int]) -> int:
+    """Approximate the tokens of pieces joined by newlines from their counts."""
+    return sum(counts) + max(0, len(counts) - 1)
+
 
 def _get_type(el: Any) -> str:
     if isinstance(el, MutableMapping):
@@ -51,6 +88,7 @@ def chunk_elements(
     elements: Iterable[Any],
     target_tokens: int = 500,
     max_tokens: int = 1200,
+    encoding: Any = None,
 ) -> List[Dict[str, Any]]:
     """Chunk document ``elements`` into text blocks with metadata.
 
@@ -68,25 +106,22 @@ def chunk_elements(
     max_tokens:
         Hard limit for chunk size. Very long tables or slides are split
         so that no chunk exceeds this limit. Defaults to ``1200``.
+    encoding:
+        Tokenizer exposing ``encode`` (and ideally ``encode_ordinary_batch``).
+        Defaults to a shared ``cl100k_base`` encoding.
 
     Returns
     -------
     list of dict
-        A list where each item contains ``{"text": str, "metadata": dict}``.
+        A list where each item contains ``{"text": str, "metadata": dict,
+        "token_count": int, "chunk_type": str}``. Token counts are summed from
+        the counts of the pieces making up the chunk.
     """
 
-    try:
-        encoding = tiktoken.get_encoding("cl100k_base")
+    count_batch = _token_counter(encoding if encoding is not None else _default_encoding())
 
-        def count_tokens(text: str) -> int:
-            return len(encoding.encode(text))
-
-    except Exception:
-        # Fallback simple tokenizer when encoding files cannot be downloaded
-        def count_tokens(text: str) -> int:  # type: ignore[no-redef]
-            return len(text.split())
-
-    # First separate PPTX slide content and notes from other elements
+    # First separate PPTX slide content and notes from other elements.
+    # Slides are keyed per source file so decks never merge into each other.
     slides: Dict[Any, List[Any]] = {}
     notes: Dict[Any, List[Any]] = {}
     others: List[Any] = []
@@ -95,10 +130,11 @@ def chunk_elements(
         typ = _get_type(el).lower()
         slide_id = md.get("slide_number") or md.get("slide_id") or md.get("slide")
         if slide_id is not None:
+            key = (str(md.get("file_path") or ""), slide_id)
             if "note" in typ:
-                notes.setdefault(slide_id, []).append(el)
+                notes.setdefault(key, []).append(el)
             else:
-                slides.setdefault(slide_id, []).append(el)
+                slides.setdefault(key, []).append(el)
         else:
             others.append(el)
 
@@ -112,7 +148,7 @@ def chunk_elements(
     buffer_tokens = 0
     current_md: Dict[str, Any] = {}
     current_sheet: str | None = None
-    list_buffer: List[str] = []
+    list_buffer: List[Tuple[str, int]] = []
 
     def flush_buffer() -> None:
         nonlocal buffer, buffer_tokens, current_md, current_sheet
@@ -122,7 +158,12 @@ def chunk_elements(
         md = dict(current_md)
         if current_heading:
             md.setdefault("section_title", current_heading)
-        chunks.append({"text": text, "metadata": md})
+        chunks.append({
+            "text": text,
+            "metadata": md,
+            "token_count": buffer_tokens + len(buffer) - 1,
+            "chunk_type": "text",
+        })
         buffer = []
         buffer_tokens = 0
         current_md = {}
@@ -132,13 +173,14 @@ def chunk_elements(
         nonlocal list_buffer
         if not list_buffer:
             return
-        list_text = "\n".join(f"- {li}" for li in list_buffer)
+        list_text = "\n".join(f"- {li}" for li, _ in list_buffer)
+        # One extra token per item for the "- " bullet
+        list_tokens = _joined_tokens([tks + 1 for _, tks in list_buffer])
         list_buffer = []
-        add_text(list_text, md)
+        add_text(list_text, md, list_tokens)
 
-    def add_text(text: str, md: Dict[str, Any]) -> None:
+    def add_text(text: str, md: Dict[str, Any], tks: int) -> None:
         nonlocal buffer_tokens, buffer, current_md, current_sheet
-        tks = count_tokens(text)
         if buffer and buffer_tokens + tks > target_tokens:
             flush_buffer()
         if not buffer:
@@ -157,42 +199,46 @@ def chunk_elements(
         rows = [r for r in _get_text(el).splitlines() if r.strip()]
         if not rows:
             return
-        header = rows[0]
-        data_rows = rows[1:]
+        row_counts = count_batch(rows)
+        header, header_tokens = rows[0], row_counts[0]
+        table_md = md.copy()
+        if current_heading:
+            table_md.setdefault("section_title", current_heading)
+
+        def emit(group_rows: List[str], group_tokens: int) -> None:
+            chunks.append({
+                "text": "\n".join([header] + group_rows),
+                "metadata": table_md.copy(),
+                "token_count": group_tokens + len(group_rows),
+                "chunk_type": "table",
+            })
+
         group: List[str] = []
-        tokens = count_tokens(header)
-        for row in data_rows:
-            row_tokens = count_tokens(row)
+        tokens = header_tokens
+        for row, row_tokens in zip(rows[1:], row_counts[1:]):
             if group and tokens + row_tokens > target_tokens:
-                chunk_text = "\n".join([header] + group)
-                table_md = md.copy()
-                if current_heading:
-                    table_md.setdefault("section_title", current_heading)
-                chunks.append({"text": chunk_text, "metadata": table_md})
+                emit(group, tokens)
                 group = [row]
-                tokens = count_tokens(header) + row_tokens
+                tokens = header_tokens + row_tokens
             else:
                 group.append(row)
                 tokens += row_tokens
             if tokens >= target_tokens:
-                chunk_text = "\n".join([header] + group)
-                table_md = md.copy()
-                if current_heading:
-                    table_md.setdefault("section_title", current_heading)
-                chunks.append({"text": chunk_text, "metadata": table_md})
+                emit(group, tokens)
                 group = []
-                tokens = count_tokens(header)
+                tokens = header_tokens
         if group:
-            chunk_text = "\n".join([header] + group)
-            table_md = md.copy()
-            if current_heading:
-                table_md.setdefault("section_title", current_heading)
-            chunks.append({"text": chunk_text, "metadata": table_md})
+            emit(group, tokens)
+
+    # Tokenize every non-table element in one batch up front
+    texts = [_get_text(el).strip() for el in others]
+    is_table = [_get_type(el).lower() == "table" for el in others]
+    counts = iter(count_batch([t for t, tbl in zip(texts, is_table) if not tbl]))
 
     # Process non-slide elements respecting structure
-    for el in others:
+    for el, text, table in zip(others, texts, is_table):
         typ = _get_type(el).lower()
-        text = _get_text(el).strip()
+        tks = 0 if table else next(counts)
         md = _get_metadata(el)
         sheet_name = md.get("sheet") or md.get("sheet_name") or md.get("page_name")
         if sheet_name:
@@ -209,22 +255,22 @@ def chunk_elements(
             current_md = md.copy()
             current_sheet = md.get("sheet")
             buffer.append(text)
-            buffer_tokens = count_tokens(text)
+            buffer_tokens = tks
             continue
 
         if typ in list_types:
-            list_buffer.append(text)
+            list_buffer.append((text, tks))
             current_md = md.copy()
             current_sheet = md.get("sheet")
             continue
 
-        if typ == "table":
+        if table:
             handle_table(el, md)
             current_sheet = md.get("sheet")
             continue
 
         flush_list(md)
-        add_text(text, md)
+        add_text(text, md, tks)
 
     flush_list(current_md)
     flush_buffer()
@@ -234,32 +280,53 @@ def chunk_elements(
         text = "\n".join(_get_text(e).strip() for e in elems if _get_text(e).strip())
         if not text:
             return
-        md: Dict[str, Any] = {"slide_id": slide_id}
+        md: Dict[str, Any] = {
+            k: v for k, v in _get_metadata(elems[0]).items() if k in _SOURCE_KEYS
+        }
+        md["slide_id"] = slide_id
+        chunk_type = "slide_note" if note else "slide"
         if note:
             md["section_title"] = "slide_note"
-        tokens = count_tokens(text)
+        lines = text.splitlines()
+        line_counts = count_batch(lines)
+        tokens = _joined_tokens(line_counts)
         if tokens <= max_tokens:
-            chunks.append({"text": text, "metadata": md})
+            chunks.append({
+                "text": text,
+                "metadata": md,
+                "token_count": tokens,
+                "chunk_type": chunk_type,
+            })
             return
         # Split oversized slide by lines
-        lines = text.splitlines()
         group: List[str] = []
+        group_counts: List[int] = []
         tks = 0
-        for line in lines:
-            line_tokens = count_tokens(line)
+        for line, line_tokens in zip(lines, line_counts):
             if group and tks + line_tokens > target_tokens:
-                chunks.append({"text": "\n".join(group).strip(), "metadata": md})
-                group = [line]
+                chunks.append({
+                    "text": "\n".join(group).strip(),
+                    "metadata": md,
+                    "token_count": _joined_tokens(group_counts),
+                    "chunk_type": chunk_type,
+                })
+                group, group_counts = [line], [line_tokens]
                 tks = line_tokens
             else:
                 group.append(line)
+                group_counts.append(line_tokens)
                 tks += line_tokens
         if group:
-            chunks.append({"text": "\n".join(group).strip(), "metadata": md})
-
-    for slide_id, elems in sorted(slides.items()):
+            chunks.append({
+                "text": "\n".join(group).strip(),
+                "metadata": md,
+                "token_count": _joined_tokens(group_counts),
+                "chunk_type": chunk_type,
+            })
+
+    for (_, slide_id), elems in sorted(slides.items()):
         _process_slide(slide_id, elems, note=False)
-    for slide_id, elems in sorted(notes.items()):
+    for (_, slide_id), elems in sorted(notes.items()):
         _process_slide(slide_id, elems, note=True)
 
     return chunks
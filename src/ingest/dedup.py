@@ -0,0 +1,132 @@
+"""Detection of duplicate and near-duplicate chunks.
+
+Repeated headers, disclaimers, boilerplate slides and multiple versions of a
+document produce chunks that differ only slightly. :class:`ChunkDeduplicator`
+recognises them before they are contextualized and embedded: exact copies by
+a hash of their normalized text, near copies by MinHash signatures bucketed
+with locality-sensitive hashing (LSH) and verified against the estimated
+Jaccard similarity of their word shingles.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+import zlib
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+__all__ = ["ChunkDeduplicator"]
+
+_PRIME = (1 << 31) - 1
+_WORD = re.compile(r"\w+")
+
+
+class ChunkDeduplicator:
+    """Remember chunks and report the ones duplicating an earlier chunk.
+
+    Parameters
+    ----------
+    threshold:
+        Minimum estimated Jaccard similarity of word shingles for two chunks
+        to count as near-duplicates.
+    num_perm:
+        Number of MinHash permutations per signature.
+    bands:
+        Number of LSH bands; ``num_perm`` must be divisible by it.
+    shingle_size:
+        Words per shingle. Chunks with fewer words are only matched exactly.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 5,
+        seed: int = 1,
+    ) -> None:
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, num_perm, dtype=np.uint64)
+
+        self._exact: Dict[str, str] = {}
+        self._buckets: Dict[Tuple[int, bytes], List[str]] = {}
+        self._signatures: Dict[str, np.ndarray] = {}
+        self._source: Dict[str, str] = {}
+        # Representative chunk id -> every file it occurs in (only once duplicated)
+        self.sources: Dict[str, Set[str]] = {}
+
+        self.seen = 0
+        self.exact_duplicates = 0
+        self.near_duplicates = 0
+
+    @property
+    def removed(self) -> int:
+        return self.exact_duplicates + self.near_duplicates
+
+    def _signature(self, words: List[str]) -> Optional[np.ndarray]:
+        n = self.shingle_size
+        if len(words) < n:
+            return None
+        shingles = {" ".join(words[i:i + n]) for i in range(len(words) - n + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        permuted = (self._a[:, None] * hashes[None, :] + self._b[:, None]) % _PRIME
+        return permuted.min(axis=1).astype(np.uint32)
+
+    def _bands(self, signature: np.ndarray) -> List[Tuple[int, bytes]]:
+        return [
+            (band, signature[band * self.rows:(band + 1) * self.rows].tobytes())
+            for band in range(self.bands)
+        ]
+
+    def _duplicate_of(self, representative: str, source: str) -> str:
+        self.sources.setdefault(representative, {self._source[representative]}).add(source)
+        return representative
+
+    def check(self, chunk_id: str, text: str, source: str = "") -> Optional[str]:
+        """Return the id of the earlier chunk ``text`` duplicates.
+
+        Returns ``None`` for a new chunk, which is remembered as the
+        representative of later copies. ``source`` is the chunk's file.
+        """
+        self.seen += 1
+        words = _WORD.findall(text.lower())
+        digest = hashlib.sha1(" ".join(words).encode("utf-8")).hexdigest()
+        representative = self._exact.get(digest)
+        if representative is not None:
+            self.exact_duplicates += 1
+            return self._duplicate_of(representative, source)
+
+        signature = self._signature(words)
+        if signature is not None:
+            bands = self._bands(signature)
+            candidates = {c for key in bands for c in self._buckets.get(key, ())}
+            for candidate in candidates:
+                similarity = float(np.mean(self._signatures[candidate] == signature))
+                if similarity >= self.threshold:
+                    self.near_duplicates += 1
+                    return self._duplicate_of(candidate, source)
+            for key in bands:
+                self._buckets.setdefault(key, []).append(chunk_id)
+            self._signatures[chunk_id] = signature
+
+        self._exact[digest] = chunk_id
+        self._source[chunk_id] = source
+        return None
+
+    def report(self) -> str:
+        share = self.removed / self.seen if self.seen else 0.0
+        return (
+            f"{self.removed} of {self.seen} chunks removed as duplicates ({share:.0%}): "
+            f"{self.exact_duplicates} exact, {self.near_duplicates} near-duplicates"
+        )
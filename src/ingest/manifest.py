@@ -0,0 +1,110 @@
+"""Persisted record of the files that make up an index.
+
+The :class:`Manifest` remembers ``(path, size, mtime, sha256)`` for every
+ingested file so that a later run can tell which files were added, changed
+or removed and only re-index those.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from dataclasses import asdict, dataclass, field
+from typing import Dict, Iterable, List
+
+__all__ = ["FileRecord", "Manifest", "ManifestDiff", "file_sha256"]
+
+
+def file_sha256(path: str, block_size: int = 1024 * 1024) -> str:
+    """Return the SHA-256 hex digest of the file at ``path``."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class FileRecord:
+    path: str
+    size: int
+    mtime: float
+    sha256: str
+
+
+@dataclass
+class ManifestDiff:
+    """Result of comparing files on disk against a :class:`Manifest`."""
+
+    added: List[str] = field(default_factory=list)
+    changed: List[str] = field(default_factory=list)
+    removed: List[str] = field(default_factory=list)
+    unchanged: List[str] = field(default_factory=list)
+    records: Dict[str, FileRecord] = field(default_factory=dict)
+
+    @property
+    def has_changes(self) -> bool:
+        return bool(self.added or self.changed or self.removed)
+
+
+class Manifest:
+    """JSON file mapping each indexed path to its :class:`FileRecord`."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.records: Dict[str, FileRecord] = {}
+        if os.path.isfile(path):
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+            self.records = {p: FileRecord(**r) for p, r in data.get("files", {}).items()}
+
+    def scan(self, paths: Iterable[str]) -> ManifestDiff:
+        """Compare ``paths`` on disk with the recorded state.
+
+        Size and mtime are checked first; the content hash is only computed
+        when they differ, so touched-but-identical files count as unchanged.
+        """
+        diff = ManifestDiff()
+        seen = set()
+        for path in paths:
+            seen.add(path)
+            st = os.stat(path)
+            old = self.records.get(path)
+            if old is not None and old.size == st.st_size and old.mtime == st.st_mtime:
+                diff.unchanged.append(path)
+                diff.records[path] = old
+                continue
+            record = FileRecord(path, st.st_size, st.st_mtime, file_sha256(path))
+            diff.records[path] = record
+            if old is None:
+                diff.added.append(path)
+            elif old.sha256 != record.sha256:
+                diff.changed.append(path)
+            else:
+                diff.unchanged.append(path)
+        diff.removed = [p for p in self.records if p not in seen]
+        return diff
+
+    def apply(self, diff: ManifestDiff, failed: Iterable[str] = ()) -> None:
+        """Replace the recorded state with the files described by ``diff``.
+
+        ``failed`` paths (e.g. files whose extraction failed) are left out, so
+        the next scan reports them as added and they are ingested again.
+        """
+        self.records = dict(diff.records)
+        for path in failed:
+            self.records.pop(path, None)
+
+    def save(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"files": {p: asdict(r) for p, r in sorted(self.records.items())}},
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, self.path)
@@ -0,0 +1,135 @@
+"""Instrumentation of ingestion runs.
+
+:class:`IngestMetrics` collects per-stage busy time and item counts, latency
+histograms (e.g. of LLM and embedding requests) and plain counters from any
+thread, and renders them as a JSON report at the end of a run.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+__all__ = ["Histogram", "IngestMetrics"]
+
+
+class Histogram:
+    """Latency histogram with fixed bucket bounds in seconds."""
+
+    BOUNDS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+    def __init__(self) -> None:
+        self.counts: List[int] = [0] * (len(self.BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        index = next((i for i, b in enumerate(self.BOUNDS) if seconds <= b), len(self.BOUNDS))
+        self.counts[index] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the ``q`` quantile (``max`` for the last)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self) -> Dict[str, Any]:
+        labels = [f"<={b:g}s" for b in self.BOUNDS] + [f">{self.BOUNDS[-1]:g}s"]
+        return {
+            "count": self.count,
+            "mean_seconds": round(self.total / self.count, 4) if self.count else 0.0,
+            "p50_seconds": round(self.quantile(0.5), 4),
+            "p95_seconds": round(self.quantile(0.95), 4),
+            "max_seconds": round(self.max, 4),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+class IngestMetrics:
+    """Thread-safe collection of stage timings, latencies and counters."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self._start = time.monotonic()
+        self.stages: Dict[str, List[float]] = {}
+        self.histograms: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+
+    def add_time(self, stage: str, seconds: float, items: int = 1) -> None:
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0.0, 0])
+            entry[0] += seconds
+            entry[1] += items
+
+    @contextmanager
+    def time(self, stage: str, items: int = 1) -> Iterator[None]:
+        """Add the time spent in the ``with`` block to ``stage``."""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.monotonic() - start, items)
+
+    def timed_iter(self, iterable: Iterable[Any], stage: str) -> Iterator[Any]:
+        """Yield from ``iterable``, adding the time spent producing each item to ``stage``."""
+        iterator = iter(iterable)
+        while True:
+            start = time.monotonic()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            self.add_time(stage, time.monotonic() - start)
+            yield item
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            self.histograms.setdefault(name, Histogram()).observe(seconds)
+
+    def incr(self, name: str, count: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + count
+
+    def report(self, **sections: Any) -> Dict[str, Any]:
+        """Return the collected metrics plus ``sections`` as a JSON-able dict."""
+        with self._lock:
+            stages = {
+                name: {
+                    "seconds": round(seconds, 3),
+                    "items": items,
+                    "items_per_second": round(items / seconds, 3) if seconds > 0 else None,
+                }
+                for name, (seconds, items) in self.stages.items()
+            }
+            report = {
+                "started_at": self.started_at,
+                "wall_seconds": round(time.monotonic() - self._start, 3),
+                "stages": stages,
+                "latency": {name: h.as_dict() for name, h in self.histograms.items()},
+                "counters": dict(self.counters),
+            }
+        report.update(sections)
+        return report
+
+    def write(self, path: str, **sections: Any) -> Dict[str, Any]:
+        """Write :meth:`report` to ``path`` as JSON and return it."""
+        report = self.report(**sections)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        return report
@@ -0,0 +1,220 @@
+"""Overlapped execution of ingestion stages.
+
+A :class:`StagedPipeline` feeds items from a source iterable through a chain
+of :class:`Stage` objects. Every stage runs in its own worker threads and
+stages are connected by bounded queues, so CPU-bound extraction, network-bound
+LLM/embedding calls and index writes proceed at the same time while the
+queues cap how much work is buffered between them.
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+__all__ = ["Stage", "StageStats", "StagedPipeline"]
+
+_DONE = object()
+
+
+@dataclass
+class StageStats:
+    """Counters collected for one stage (or the source) of a pipeline."""
+
+    name: str
+    workers: int = 1
+    items: int = 0
+    busy_seconds: float = 0.0
+    wall_seconds: float = 0.0
+    queue_depth: int = 0
+    max_queue_depth: int = 0
+    _started: Optional[float] = field(default=None, repr=False)
+
+    @property
+    def items_per_second(self) -> float:
+        return self.items / self.wall_seconds if self.wall_seconds > 0 else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "wall_seconds": round(self.wall_seconds, 3),
+            "items_per_second": round(self.items_per_second, 3),
+            "queue_depth": self.queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+        }
+
+
+@dataclass
+class Stage:
+    """One step of a :class:`StagedPipeline`.
+
+    ``func`` receives one item and returns the item passed downstream; a
+    ``None`` result is dropped. ``queue_size`` bounds the input queue.
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 4
+
+
+class StagedPipeline:
+    """Run ``stages`` over ``source`` with all stages working concurrently."""
+
+    def __init__(
+        self,
+        source: Iterable[Any],
+        stages: List[Stage],
+        source_name: str = "source",
+        report_interval: Optional[float] = None,
+        report: Callable[[str], None] = print,
+    ) -> None:
+        self.source = source
+        self.stages = stages
+        self.report_interval = report_interval
+        self._report = report
+        self._queues = [queue.Queue(maxsize=s.queue_size) for s in stages]
+        self._stats = [StageStats(source_name)] + [
+            StageStats(s.name, workers=s.workers) for s in stages
+        ]
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._error: Optional[BaseException] = None
+
+    @property
+    def stats(self) -> List[StageStats]:
+        with self._lock:
+            for stats, q in zip(self._stats[1:], self._queues):
+                stats.queue_depth = q.qsize()
+            return list(self._stats)
+
+    def _put(self, index: int, item: Any) -> bool:
+        """Put ``item`` on the input queue of stage ``index`` unless stopping."""
+        q = self._queues[index]
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            with self._lock:
+                stats = self._stats[index + 1]
+                stats.max_queue_depth = max(stats.max_queue_depth, q.qsize())
+            return True
+        return False
+
+    def _fail(self, exc: BaseException) -> None:
+        with self._lock:
+            if self._error is None:
+                self._error = exc
+        self._stop.set()
+
+    def _finish(self, stats: StageStats) -> None:
+        with self._lock:
+            stats.wall_seconds = time.monotonic() - (stats._started or time.monotonic())
+
+    def _run_source(self) -> None:
+        stats = self._stats[0]
+        stats._started = time.monotonic()
+        try:
+            iterator = iter(self.source)
+            while not self._stop.is_set():
+                start = time.monotonic()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    break
+                with self._lock:
+                    stats.busy_seconds += time.monotonic() - start
+                    stats.items += 1
+                if not self._put(0, item):
+                    break
+        except BaseException as exc:
+            self._fail(exc)
+        finally:
+            self._finish(stats)
+            for _ in range(self.stages[0].workers):
+                self._put(0, _DONE)
+
+    def _run_stage(self, index: int, remaining: List[int]) -> None:
+        stage = self.stages[index]
+        stats = self._stats[index + 1]
+        q = self._queues[index]
+        last = index == len(self.stages) - 1
+        try:
+            while not self._stop.is_set():
+                try:
+                    item = q.get(timeout=0.1)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                start = time.monotonic()
+                result = stage.func(item)
+                with self._lock:
+                    stats.busy_seconds += time.monotonic() - start
+                    stats.items += 1
+                if result is not None and not last:
+                    if not self._put(index + 1, result):
+                        break
+        except BaseException as exc:
+            self._fail(exc)
+        finally:
+            with self._lock:
+                remaining[index] -= 1
+                finished = remaining[index] == 0
+            if finished:
+                self._finish(stats)
+                if not last:
+                    for _ in range(self.stages[index + 1].workers):
+                        self._put(index + 1, _DONE)
+
+    def format_stats(self) -> str:
+        lines = [f"{'stage':<16}{'items':>8}{'items/s':>10}{'busy s':>10}{'queue':>7}{'max q':>7}"]
+        for s in self.stats:
+            lines.append(
+                f"{s.name:<16}{s.items:>8}{s.items_per_second:>10.2f}"
+                f"{s.busy_seconds:>10.1f}{s.queue_depth:>7}{s.max_queue_depth:>7}"
+            )
+        return "\n".join(lines)
+
+    def run(self) -> List[StageStats]:
+        """Process every source item through all stages and return the stats.
+
+        The first exception raised by the source or any stage stops the
+        pipeline and is re-raised here.
+        """
+        now = time.monotonic()
+        for stats in self._stats[1:]:
+            stats._started = now
+        remaining = [s.workers for s in self.stages]
+        threads = [threading.Thread(target=self._run_source, name="ingest-source", daemon=True)]
+        for index, stage in enumerate(self.stages):
+            for n in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._run_stage,
+                        args=(index, remaining),
+                        name=f"ingest-{stage.name}-{n}",
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+
+        next_report = time.monotonic() + (self.report_interval or 0)
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+                if self.report_interval and time.monotonic() >= next_report:
+                    self._report(self.format_stats())
+                    next_report = time.monotonic() + self.report_interval
+
+        if self._error is not None:
+            raise self._error
+        return self.stats
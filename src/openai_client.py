@@ -1,79 +1,277 @@
 import os
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Sequence, Tuple
 from openai import OpenAI, AsyncOpenAI
 import asyncio
+import tiktoken
+
+from src.client_pool import AdaptiveConcurrency, RetryPolicy, shared_async_client, shared_client
+from src.embedding_cache import (
+    EmbeddingCache,
+    acached_embeddings,
+    cached_embeddings,
+    shared_embedding_cache,
+)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 # The model used for chat completions.
 # This variable was previously named ``OPENAI_CHAT_MODEL``.
 OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
 OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-ada-002")
+# Retries of rate-limited/failed requests and ceiling of the adaptive concurrency
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "6"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+# Per-request limits of the embeddings endpoint and batches sent at once
+EMBEDDING_MAX_BATCH_ITEMS = 2048
+EMBEDDING_MAX_BATCH_TOKENS = int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "250000"))
+EMBEDDING_MAX_CONCURRENCY = int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4"))
+# Directory of the persistent embedding cache (unset keeps an in-memory cache only)
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR") or None
+
+# One policy per quota: chat and embedding models are rate limited separately
+chat_policy = RetryPolicy(
+    LLM_MAX_RETRIES, concurrency=AdaptiveConcurrency(LLM_MAX_CONCURRENCY)
+)
+embedding_policy = RetryPolicy(
+    LLM_MAX_RETRIES, concurrency=AdaptiveConcurrency(LLM_MAX_CONCURRENCY)
+)
 
 
-def _get_client() -> OpenAI:
-    return OpenAI(api_key=OPENAI_API_KEY)
+def _get_client(api_key: str | None = None) -> OpenAI:
+    """Process-wide client; retries are left to :data:`chat_policy` and friends."""
+    api_key = api_key or OPENAI_API_KEY
+    return shared_client(
+        ("openai", api_key), lambda: OpenAI(api_key=api_key, max_retries=0)
+    )
 
 
-def _get_async_client() -> AsyncOpenAI:
-    return AsyncOpenAI(api_key=OPENAI_API_KEY)
+def _get_async_client(api_key: str | None = None) -> AsyncOpenAI:
+    """Async client shared by every call on the running event loop."""
+    api_key = api_key or OPENAI_API_KEY
+    return shared_async_client(
+        ("openai", api_key), lambda: AsyncOpenAI(api_key=api_key, max_retries=0)
+    )
 
 
 def chat_completion(prompt: str) -> str:
     client = _get_client()
-    response = client.chat.completions.create(
+    response = chat_policy.call(
+        client.chat.completions.create,
         model=OPENAI_MODEL,
         messages=[{"role": "user", "content": prompt}],
     )
     return response.choices[0].message.content
 
 
+async def achat_completion(
+    prompt: str,
+    client: AsyncOpenAI | None = None,
+    on_usage: Callable[[Any], None] | None = None,
+) -> str:
+    client = client or _get_async_client()
+    response = await chat_policy.acall(
+        client.chat.completions.create,
+        model=OPENAI_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+    )
+    if on_usage is not None and response.usage is not None:
+        on_usage(response.usage)
+    return response.choices[0].message.content
+
+
 class OpenAIChatClient:
     """Wrapper around :class:`openai.OpenAI` chat completions."""
 
     def __init__(self, api_key: str | None = None, model: str | None = None) -> None:
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         self.model = model or os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
-        self._client = OpenAI(api_key=self.api_key)
+        self._client = _get_client(self.api_key)
 
     def chat(self, messages: List[dict]) -> str:
         """Return the assistant reply for the given messages."""
-        response = self._client.chat.completions.create(
+        response = chat_policy.call(
+            self._client.chat.completions.create,
+            model=self.model,
+            messages=messages,
+        )
+        return response.choices[0].message.content
+
+    async def achat(self, messages: List[dict]) -> str:
+        """Async :meth:`chat` on the event loop's shared :class:`AsyncOpenAI` client."""
+        response = await chat_policy.acall(
+            _get_async_client(self.api_key).chat.completions.create,
             model=self.model,
             messages=messages,
         )
         return response.choices[0].message.content
 
+    async def astream_chat(self, messages: List[dict]) -> AsyncIterator[str]:
+        """Yield the assistant reply for the given messages piece by piece."""
+        # The request keeps its concurrency slot until the reply is read
+        stream = chat_policy.astream(
+            _get_async_client(self.api_key).chat.completions.create,
+            model=self.model,
+            messages=messages,
+            stream=True,
+        )
+        try:
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.aclose()
+
 
 def get_embeddings(texts: List[str]) -> List[List[float]]:
     client = _get_client()
-    response = client.embeddings.create(model=OPENAI_EMBEDDING_MODEL, input=texts)
+    response = embedding_policy.call(
+        client.embeddings.create, model=OPENAI_EMBEDDING_MODEL, input=texts
+    )
     return [d.embedding for d in response.data]
 
 
 async def get_embeddings_async(texts: List[str]) -> List[List[float]]:
     client = _get_async_client()
-    response = await client.embeddings.create(model=OPENAI_EMBEDDING_MODEL, input=texts)
+    response = await embedding_policy.acall(
+        client.embeddings.create, model=OPENAI_EMBEDDING_MODEL, input=texts
+    )
     return [d.embedding for d in response.data]
 
 
+_embedding_encoding = None
+
+
+def _get_embedding_encoding():
+    global _embedding_encoding
+    if _embedding_encoding is None:
+        try:
+            _embedding_encoding = tiktoken.encoding_for_model(OPENAI_EMBEDDING_MODEL)
+        except KeyError:
+            _embedding_encoding = tiktoken.get_encoding("cl100k_base")
+    return _embedding_encoding
+
+
+def pack_embedding_batches(
+    token_counts: Sequence[int],
+    max_items: int = EMBEDDING_MAX_BATCH_ITEMS,
+    max_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+) -> List[Tuple[int, int]]:
+    """Split consecutive texts into ``(start, end)`` spans fitting one request.
+
+    A span holds at most ``max_items`` texts and ``max_tokens`` tokens; a
+    single text above ``max_tokens`` gets a span of its own.
+    """
+    spans: List[Tuple[int, int]] = []
+    start, tokens = 0, 0
+    for i, count in enumerate(token_counts):
+        if i > start and (i - start >= max_items or tokens + count > max_tokens):
+            spans.append((start, i))
+            start, tokens = i, 0
+        tokens += count
+    if len(token_counts) > start:
+        spans.append((start, len(token_counts)))
+    return spans
+
+
+def _embedding_spans(texts: Sequence[str], max_items: int, max_tokens: int) -> List[Tuple[int, int]]:
+    counts = [len(t) for t in _get_embedding_encoding().encode_ordinary_batch(list(texts))]
+    return pack_embedding_batches(counts, max_items, max_tokens)
+
+
+def embed_texts(
+    texts: Sequence[str],
+    max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+    max_items: int = EMBEDDING_MAX_BATCH_ITEMS,
+    max_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+    embed: Callable[[List[str]], List[List[float]]] | None = None,
+) -> List[List[float]]:
+    """Embed ``texts`` in token-packed batches sent concurrently, in order.
+
+    Batches run on a thread pool sharing the process-wide client, so worker
+    threads reuse its connections instead of opening a pool per call.
+    ``embed`` sends one batch (default :func:`get_embeddings`).
+    """
+    embed = embed or get_embeddings
+    spans = _embedding_spans(texts, max_items, max_tokens)
+    if len(spans) <= 1 or max_concurrency <= 1:
+        return [v for start, end in spans for v in embed(list(texts[start:end]))]
+    with ThreadPoolExecutor(min(max_concurrency, len(spans))) as pool:
+        parts = pool.map(lambda span: embed(list(texts[span[0]:span[1]])), spans)
+        return [v for part in parts for v in part]
+
+
+async def aembed_texts(
+    texts: Sequence[str],
+    max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+    max_items: int = EMBEDDING_MAX_BATCH_ITEMS,
+    max_tokens: int = EMBEDDING_MAX_BATCH_TOKENS,
+    embed: Callable[[List[str]], Awaitable[List[List[float]]]] | None = None,
+) -> List[List[float]]:
+    """Async :func:`embed_texts` sending the batches through the async client.
+
+    ``embed`` sends one batch (default :func:`get_embeddings_async`).
+    """
+    embed = embed or get_embeddings_async
+    spans = _embedding_spans(texts, max_items, max_tokens)
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def _run(start: int, end: int) -> List[List[float]]:
+        async with semaphore:
+            return await embed(list(texts[start:end]))
+
+    parts = await asyncio.gather(*(_run(start, end) for start, end in spans))
+    return [v for part in parts for v in part]
+
+
 from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from pydantic import Field
 
 
 class OpenAIEmbedding(BaseEmbedding):
+    # LlamaIndex splits inputs into ``embed_batch_size`` slices before calling
+    # ``_get_text_embeddings``; large slices let ``embed_texts`` pack by tokens.
+    embed_batch_size: int = Field(default=EMBEDDING_MAX_BATCH_ITEMS, gt=0, le=2048)
+    max_concurrency: int = Field(default=EMBEDDING_MAX_CONCURRENCY, gt=0)
+    max_batch_tokens: int = Field(default=EMBEDDING_MAX_BATCH_TOKENS, gt=0)
+    # Vectors are looked up by model and text hash before any request is made
+    cache: Optional[EmbeddingCache] = Field(
+        default_factory=lambda: shared_embedding_cache(EMBEDDING_CACHE_DIR), exclude=True
+    )
+
+    def _embed(self, texts: List[str]) -> List[Embedding]:
+        return cached_embeddings(
+            self.cache,
+            OPENAI_EMBEDDING_MODEL,
+            texts,
+            lambda missing: embed_texts(
+                missing, max_concurrency=self.max_concurrency, max_tokens=self.max_batch_tokens
+            ),
+        )
+
+    async def _aembed(self, texts: List[str]) -> List[Embedding]:
+        return await acached_embeddings(
+            self.cache,
+            OPENAI_EMBEDDING_MODEL,
+            texts,
+            lambda missing: aembed_texts(
+                missing, max_concurrency=self.max_concurrency, max_tokens=self.max_batch_tokens
+            ),
+        )
+
     def _get_text_embedding(self, text: str) -> Embedding:
-        return get_embeddings([text])[0]
+        return self._embed([text])[0]
 
     def _get_query_embedding(self, query: str) -> Embedding:
-        return get_embeddings([query])[0]
+        return self._embed([query])[0]
 
     def _get_text_embeddings(self, texts: List[str]) -> List[Embedding]:
-        return get_embeddings(texts)
+        return self._embed(texts)
 
     async def _aget_text_embedding(self, text: str) -> Embedding:
-        return (await get_embeddings_async([text]))[0]
+        return (await self._aembed([text]))[0]
 
     async def _aget_query_embedding(self, query: str) -> Embedding:
-        return (await get_embeddings_async([query]))[0]
+        return (await self._aembed([query]))[0]
 
     async def _aget_text_embeddings(self, texts: List[str]) -> List[Embedding]:
-        return await get_embeddings_async(texts)
+        return await self._aembed(texts)
@@ -13,13 +13,19 @@ from llama_index.core.schema import NodeWithScore
 from src.db.read_db import SemanticBM25Retriever
 from src.openai_client import OpenAIChatClient
 from llama_index.core.llms.custom import CustomLLM
+from llama_index.core.llms.callbacks import llm_chat_callback, llm_completion_callback
 from llama_index.core.callbacks import CallbackManager
-from typing import Any, Optional
+from typing import Any, Optional, Sequence
 from pydantic import Field
 from llama_index.core.base.llms.types import (
+    ChatMessage,
+    ChatResponse,
+    ChatResponseAsyncGen,
     CompletionResponse,
+    CompletionResponseAsyncGen,
     CompletionResponseGen,
     LLMMetadata,
+    MessageRole,
 )
 
 class RetrieverEvent(Event):
@@ -80,6 +86,52 @@ class OpenAIChatLLM(CustomLLM):
 
         return gen()
 
+    # Async variants await the async client instead of blocking the event loop,
+    # so concurrent /rag-chat requests are synthesized side by side. The chat
+    # variants are what response synthesizers call for a chat model.
+    @staticmethod
+    def _messages(messages: Sequence[ChatMessage]) -> list[dict]:
+        return [{"role": m.role.value, "content": m.content or ""} for m in messages]
+
+    @llm_completion_callback()
+    async def acomplete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        text = await self.client.achat([{"role": "user", "content": prompt}])
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        async def gen() -> CompletionResponseAsyncGen:
+            text = ""
+            async for delta in self.client.astream_chat([{"role": "user", "content": prompt}]):
+                text += delta
+                yield CompletionResponse(text=text, delta=delta)
+
+        return gen()
+
+    @llm_chat_callback()
+    async def achat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> ChatResponse:
+        text = await self.client.achat(self._messages(messages))
+        return ChatResponse(message=ChatMessage(role=MessageRole.ASSISTANT, content=text))
+
+    @llm_chat_callback()
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        async def gen() -> ChatResponseAsyncGen:
+            text = ""
+            async for delta in self.client.astream_chat(self._messages(messages)):
+                text += delta
+                yield ChatResponse(
+                    message=ChatMessage(role=MessageRole.ASSISTANT, content=text),
+                    delta=delta,
+                )
+
+        return gen()
+
 # RAG using workflow
 class RAGWorkflow(Workflow):
     
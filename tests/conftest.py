@@ -0,0 +1,19 @@
+import pytest
+
+
+class WordEncoding:
+    """Whitespace tokenizer standing in for tiktoken's downloadable encodings."""
+
+    def encode(self, text):
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        return [t.split() for t in texts]
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+@pytest.fixture
+def word_encoding():
+    return WordEncoding()
@@ -0,0 +1,53 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.abspath("."))
+
+import src.azure_client as azure_client
+import src.openai_client as openai_client
+from src.azure_client import AzureEmbedding
+
+
+class _AsyncAzureStandIn:
+    """Async embeddings endpoint recording how many requests overlap."""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.requests = []
+        self.embeddings = SimpleNamespace(create=self.create)
+
+    async def create(self, model, input):
+        self.requests.append(list(input))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[float(len(t))]) for t in input])
+
+
+def test_async_embeddings_use_the_async_client_concurrently(monkeypatch, word_encoding):
+    stand_in = _AsyncAzureStandIn()
+
+    def blocking_call(texts):
+        raise AssertionError("the sync client must not be used from the event loop")
+
+    monkeypatch.setattr(azure_client, "_get_async_client", lambda: stand_in)
+    monkeypatch.setattr(azure_client, "get_embeddings", blocking_call)
+    monkeypatch.setattr(openai_client, "_embedding_encoding", word_encoding)
+    model = AzureEmbedding(cache=None, max_batch_tokens=2, max_concurrency=4)
+
+    async def run():
+        queries = [model.aget_query_embedding(q) for q in ("a", "bb", "ccc")]
+        return await asyncio.gather(*queries), await model.aget_text_embedding_batch(
+            ["x y", "z", "w", "v u"]
+        )
+
+    queries, texts = asyncio.run(run())
+    assert queries == [[1.0], [2.0], [3.0]]
+    assert texts == [[3.0], [1.0], [1.0], [3.0]]
+    # Token-packed batches: "z" and "w" share a request
+    assert ["z", "w"] in stand_in.requests
+    assert stand_in.max_in_flight > 1
@@ -0,0 +1,251 @@
+import functools
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import chromadb
+import pytest
+from openai import OpenAI
+
+sys.path.insert(0, os.path.abspath("."))
+
+import src.contextual_retrieval.batch_api as batch_api
+import src.contextual_retrieval.save_contextual_retrieval as pipeline
+from src.contextual_retrieval.batch_api import BatchRunner
+
+from test_create_and_save_db import _stored, ingest_env  # noqa: F401
+
+
+class _BatchStandIn(BaseHTTPRequestHandler):
+    """Local stand-in for the OpenAI files and batches endpoints."""
+
+    files = {}
+    batches = {}
+    fail_ids = set()
+    # Final statuses of the next submitted batches; later ones complete
+    outcomes = []
+
+    def _reply(self, payload, raw=False):
+        data = payload if raw else json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/octet-stream" if raw else "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _store(self, content):
+        file_id = f"file-{len(self.files)}"
+        self.files[file_id] = content
+        return file_id
+
+    def do_POST(self):  # noqa: N802
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        if self.path == "/v1/files":
+            boundary = self.headers["Content-Type"].split("boundary=")[1].encode()
+            part = next(p for p in body.split(b"--" + boundary) if b'name="file"' in p)
+            file_id = self._store(part.split(b"\r\n\r\n", 1)[1].rstrip(b"\r\n"))
+            self._reply({
+                "id": file_id, "object": "file", "bytes": len(body), "created_at": 0,
+                "filename": "requests.jsonl", "purpose": "batch", "status": "processed",
+            })
+        elif self.path == "/v1/batches":
+            request = json.loads(body)
+            batch_id = f"batch-{len(self.batches)}"
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"],
+                "status": "validating", "created_at": 0, "polls": 0,
+                "outcome": self.outcomes.pop(0) if self.outcomes else "completed",
+            }
+            self._reply(self._public(self.batches[batch_id]))
+
+    @staticmethod
+    def _public(batch):
+        return {k: v for k, v in batch.items() if k not in ("polls", "outcome")}
+
+    def _complete(self, batch):
+        if batch["outcome"] == "failed":
+            batch["status"] = "failed"
+            return
+        output, errors = [], []
+        for n, line in enumerate(self.files[batch["input_file_id"]].decode().splitlines()):
+            request = json.loads(line)
+            custom_id = request["custom_id"]
+            # An expired batch only got through its first request
+            if custom_id in self.fail_ids or (batch["outcome"] == "expired" and n > 0):
+                errors.append({"id": custom_id, "custom_id": custom_id, "response": None,
+                               "error": {"code": "server_error", "message": "failed"}})
+                continue
+            if request["url"] == "/v1/chat/completions":
+                result = {
+                    "object": "chat.completion", "created": 0, "model": "m",
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": f"BATCHCTX {custom_id} "}}],
+                    "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+                }
+            else:
+                size = float(len(request["body"]["input"]))
+                result = {
+                    "object": "list", "model": "m",
+                    "data": [{"object": "embedding", "index": 0, "embedding": [size] * 8}],
+                    "usage": {"prompt_tokens": 1, "total_tokens": 1},
+                }
+            output.append({"id": custom_id, "custom_id": custom_id, "error": None,
+                           "response": {"status_code": 200, "request_id": "r", "body": result}})
+        batch["output_file_id"] = self._store("".join(json.dumps(o) + "\n" for o in output).encode())
+        if errors:
+            batch["error_file_id"] = self._store("".join(json.dumps(e) + "\n" for e in errors).encode())
+        batch["status"] = batch["outcome"]
+
+    def do_GET(self):  # noqa: N802
+        parts = self.path.strip("/").split("/")
+        if parts[1] == "batches":
+            batch = self.batches[parts[2]]
+            batch["polls"] += 1
+            if batch["polls"] == 1:
+                batch["status"] = "in_progress"
+            elif batch["status"] == "in_progress":
+                self._complete(batch)
+            self._reply(self._public(batch))
+        else:
+            self._reply(self.files[parts[2]], raw=True)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stand_in():
+    _BatchStandIn.files, _BatchStandIn.batches, _BatchStandIn.fail_ids = {}, {}, set()
+    _BatchStandIn.outcomes = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _BatchStandIn)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="test")
+    server.shutdown()
+
+
+def _embedding_requests(count):
+    return [(f"r-{i}", {"model": "m", "input": "x" * i}) for i in range(count)]
+
+
+def test_runner_shards_requests_and_collects_results(tmp_path, stand_in):
+    runner = BatchRunner(str(tmp_path), client=stand_in, poll_interval=0, max_requests_per_file=2)
+    runner.run("emb", "/v1/embeddings", lambda: _embedding_requests(5))
+
+    shards = runner.shards("emb")
+    assert [s["requests"] for s in shards] == [2, 2, 1]
+    results = dict(r for shard in shards for r in runner.read_results(shard))
+    assert results["r-3"]["data"][0]["embedding"] == [3.0] * 8
+    assert len(_BatchStandIn.batches) == 3
+
+
+def test_interrupted_runner_resumes_without_resubmitting(tmp_path, stand_in, monkeypatch):
+    def interrupt(seconds):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(batch_api.time, "sleep", interrupt)
+    runner = BatchRunner(str(tmp_path), client=stand_in, poll_interval=0)
+    with pytest.raises(KeyboardInterrupt):
+        runner.run("emb", "/v1/embeddings", lambda: _embedding_requests(3))
+    monkeypatch.undo()
+
+    def not_again():
+        raise AssertionError("requests must not be written again")
+
+    resumed = BatchRunner(str(tmp_path), client=stand_in, poll_interval=0)
+    resumed.run("emb", "/v1/embeddings", not_again)
+
+    assert len(_BatchStandIn.batches) == 1
+    assert len(list(resumed.read_results(resumed.shards("emb")[0]))) == 3
+
+
+def test_failed_batch_is_submitted_again_on_the_next_run(tmp_path, stand_in):
+    _BatchStandIn.outcomes = ["failed"]
+    runner = BatchRunner(str(tmp_path), client=stand_in, poll_interval=0)
+    with pytest.raises(batch_api.BatchError):
+        runner.run("emb", "/v1/embeddings", lambda: _embedding_requests(3))
+
+    rerun = BatchRunner(str(tmp_path), client=stand_in, poll_interval=0)
+    rerun.run("emb", "/v1/embeddings", lambda: _embedding_requests(3))
+
+    assert len(_BatchStandIn.batches) == 2
+    assert rerun.shards("emb")[0]["status"] == "completed"
+    assert len(list(rerun.read_results(rerun.shards("emb")[0]))) == 3
+
+
+def test_expired_batch_keeps_its_partial_results(tmp_path, stand_in):
+    _BatchStandIn.outcomes = ["expired"]
+    runner = BatchRunner(str(tmp_path), client=stand_in, poll_interval=0)
+    runner.run("emb", "/v1/embeddings", lambda: _embedding_requests(3))
+
+    results = dict(runner.read_results(runner.shards("emb")[0]))
+    assert results["r-0"]["data"][0]["embedding"] == [0.0] * 8
+    assert results["r-1"] is None and results["r-2"] is None
+    assert len(_BatchStandIn.batches) == 1
+
+
+def test_create_and_save_db_through_batch_api(ingest_env, stand_in, monkeypatch):
+    data_dir, save_dir, run, prompts = ingest_env
+    (data_dir / "a.txt").write_text("alpha one two three four five\nalpha six seven")
+    (data_dir / "b.txt").write_text("beta one two three")
+    monkeypatch.setattr(batch_api, "_get_client", lambda: stand_in)
+    _BatchStandIn.fail_ids = {"chunk-1"}
+
+    run(batch_api=True, batch_poll_interval=0)
+
+    chroma, bm25_count = _stored(save_dir)
+    assert chroma == ["alpha one two three four five", "alpha six seven", "beta one two three"]
+    assert bm25_count == 3
+    # The request that failed inside the batch was answered online
+    assert len(prompts) == 1
+    assert not (save_dir / "test_batch").exists()
+
+
+def test_batch_contexts_are_matched_across_result_files(ingest_env, stand_in, monkeypatch):
+    data_dir, save_dir, run, prompts = ingest_env
+    (data_dir / "a.txt").write_text("alpha one two three four five\nalpha six seven")
+    (data_dir / "b.txt").write_text("beta one two three")
+    monkeypatch.setattr(batch_api, "_get_client", lambda: stand_in)
+    monkeypatch.setattr(
+        pipeline, "BatchRunner", functools.partial(BatchRunner, max_requests_per_file=1)
+    )
+    _BatchStandIn.fail_ids = {"chunk-1"}
+
+    run(batch_api=True, batch_poll_interval=0)
+
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    stored = collection.get()
+    for text, metadata in zip(stored["documents"], stored["metadatas"]):
+        section = metadata["section"]
+        expected = "CTX " if section == 1 else f"BATCHCTX chunk-{section} "
+        assert text == expected + metadata["raw_chunk"]
+    assert len(prompts) == 1
+
+
+def test_resumed_batch_run_keeps_deduplicated_sources(ingest_env, stand_in, monkeypatch):
+    data_dir, save_dir, run, _ = ingest_env
+    disclaimer = "this document is confidential and intended only for the named recipients"
+    (data_dir / "a.txt").write_text(f"alpha report\n{disclaimer}")
+    (data_dir / "b.txt").write_text(f"beta report\n{disclaimer}")
+    monkeypatch.setattr(batch_api, "_get_client", lambda: stand_in)
+
+    def interrupt(seconds):
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(batch_api.time, "sleep", interrupt)
+    with pytest.raises(KeyboardInterrupt):
+        run(batch_api=True, batch_poll_interval=0, dedup_threshold=0.9)
+    monkeypatch.setattr(batch_api.time, "sleep", lambda seconds: None)
+    run(batch_api=True, batch_poll_interval=0, dedup_threshold=0.9)
+
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    kept = next(m for m in collection.get()["metadatas"] if m["raw_chunk"] == disclaimer)
+    assert kept["source_files"] == ",".join(sorted([str(data_dir / "a.txt"), str(data_dir / "b.txt")]))
@@ -29,6 +29,7 @@ def test_slide_and_notes():
     assert any(c["metadata"].get("slide_id") == 1 for c in chunks)
     note_chunks = [c for c in chunks if c["metadata"].get("section_title") == "slide_note"]
     assert note_chunks and "Note content" in note_chunks[0]["text"]
+    assert sorted(c["chunk_type"] for c in chunks) == ["slide", "slide_note"]
 
 
 def test_xlsx_sheet_metadata():
@@ -40,3 +41,38 @@ def test_xlsx_sheet_metadata():
     chunks = chunk_elements(elements, target_tokens=50, max_tokens=100)
     assert chunks[0]["metadata"].get("sheet") == "Sheet1"
     assert chunks[1]["metadata"].get("sheet") == "Sheet2"
+
+
+class _CountingEncoding:
+    """Whitespace tokenizer recording every text it is asked to encode."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, text):
+        self.encoded.append(text)
+        return text.split()
+
+    def encode_ordinary_batch(self, texts):
+        self.encoded.extend(texts)
+        return [t.split() for t in texts]
+
+
+def test_each_piece_is_tokenized_once_and_counts_are_returned():
+    rows = ["name qty"] + [f"item{i} {i}" for i in range(20)]
+    elements = [
+        {"type": "Title", "text": "Inventory", "metadata": {}},
+        {"type": "NarrativeText", "text": "Stock levels per item", "metadata": {}},
+        {"type": "Table", "text": "\n".join(rows), "metadata": {}},
+        {"type": "Slide", "text": "one two\nthree four", "metadata": {"slide_number": 1}},
+    ]
+    encoding = _CountingEncoding()
+    chunks = chunk_elements(elements, target_tokens=10, max_tokens=20, encoding=encoding)
+
+    assert sorted(encoding.encoded) == sorted(
+        ["Inventory", "Stock levels per item"] + rows + ["one two", "three four"]
+    )
+    table_chunks = [c for c in chunks if c["text"].startswith("name qty")]
+    assert len(table_chunks) > 1
+    for c in chunks:
+        assert c["token_count"] >= len(c["text"].split())
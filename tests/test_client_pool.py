@@ -0,0 +1,139 @@
+import asyncio
+import os
+import sys
+
+import httpx
+import openai
+import pytest
+
+sys.path.insert(0, os.path.abspath("."))
+
+from src.client_pool import AdaptiveConcurrency, RetryPolicy, shared_async_client, shared_client
+
+
+def _error(cls, status, headers=None):
+    response = httpx.Response(
+        status, headers=headers or {}, request=httpx.Request("POST", "https://api.test/v1")
+    )
+    return cls("failed", response=response, body=None)
+
+
+def test_retries_transient_errors_and_honours_retry_after(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr("src.client_pool.time.sleep", sleeps.append)
+    failures = [
+        _error(openai.RateLimitError, 429, {"retry-after-ms": "250"}),
+        _error(openai.InternalServerError, 503),
+    ]
+
+    def flaky():
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    policy = RetryPolicy(max_retries=3, base_delay=0.01)
+    assert policy.call(flaky) == "ok"
+    assert policy.retries == 2 and policy.rate_limited == 1
+    assert sleeps[0] >= 0.25 and sleeps[1] <= 0.02
+
+    def bad_request():
+        raise _error(openai.BadRequestError, 400)
+
+    with pytest.raises(openai.BadRequestError):
+        policy.call(bad_request)
+    assert policy.retries == 2
+
+
+def test_adaptive_concurrency_backs_off_and_recovers():
+    gate = AdaptiveConcurrency(maximum=8, cooldown=0)
+    policy = RetryPolicy(max_retries=1, base_delay=0, concurrency=gate)
+    calls = []
+
+    async def rate_limited_once():
+        calls.append(gate.in_flight)
+        if len(calls) == 1:
+            raise _error(openai.RateLimitError, 429)
+        return "ok"
+
+    assert asyncio.run(policy.acall(rate_limited_once)) == "ok"
+    assert calls == [1, 1] and gate.in_flight == 0
+    # Halved by the 429, then grown again by the success
+    assert 4 < gate.limit < 5
+
+    for _ in range(40):
+        gate.acquire()
+        gate.release()
+    assert gate.limit == 8
+
+
+def test_clients_are_shared_per_process_and_event_loop():
+    made = []
+
+    def factory():
+        made.append(object())
+        return made[-1]
+
+    assert shared_client("test", factory) is shared_client("test", factory)
+    assert len(made) == 1
+
+    async def client_pair():
+        return shared_async_client("test", factory), shared_async_client("test", factory)
+
+    first, second = asyncio.run(client_pair()), asyncio.run(client_pair())
+    assert first[0] is first[1]
+    assert first[0] is not second[0]
+
+
+def test_async_waiters_are_woken_by_release_without_polling():
+    gate = AdaptiveConcurrency(maximum=1)
+    order = []
+
+    async def run():
+        await gate.aacquire()
+        waiter = asyncio.ensure_future(gate.aacquire())
+        await asyncio.sleep(0)
+        assert not waiter.done() and len(gate._waiters) == 1
+        order.append("release")
+        gate.release()
+        await waiter
+        order.append("acquired")
+        gate.release()
+
+    asyncio.run(run())
+    assert order == ["release", "acquired"]
+    assert gate.in_flight == 0 and gate._waiters == []
+
+
+def test_streams_hold_their_slot_until_consumed():
+    gate = AdaptiveConcurrency(maximum=1)
+    policy = RetryPolicy(concurrency=gate)
+
+    class Stream:
+        closed = False
+
+        def __init__(self):
+            self.items = iter(["a", "b"])
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            try:
+                return next(self.items)
+            except StopIteration:
+                raise StopAsyncIteration
+
+        async def close(self):
+            Stream.closed = True
+
+    async def open_stream():
+        return Stream()
+
+    async def run():
+        seen = []
+        async for item in policy.astream(open_stream):
+            seen.append((item, gate.in_flight))
+        return seen
+
+    assert asyncio.run(run()) == [("a", 1), ("b", 1)]
+    assert gate.in_flight == 0 and Stream.closed
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+import threading
+
+sys.path.insert(0, os.path.abspath("."))
+
+from src.contextual_retrieval.context_cache import ContextCache, context_cache_key
+from src.contextual_retrieval.contextualize import acontextualize
+
+
+def test_context_cache_hits_and_misses(tmp_path):
+    cache = ContextCache(str(tmp_path / "cache.sqlite"))
+    key = context_cache_key("doc", "chunk", "model", "template")
+
+    assert cache.get(key) is None
+    cache.put(key, "context")
+    assert cache.get(key) == "context"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    # Every component takes part in the key
+    assert key != context_cache_key("doc", "chunk", "other-model", "template")
+    assert key != context_cache_key("do", "cchunk", "model", "template")
+
+
+def test_context_cache_evicts_least_recently_used(tmp_path):
+    cache = ContextCache(str(tmp_path / "cache.sqlite"), max_bytes=10)
+    cache.put("a", "xxxx")
+    cache.put("b", "yyyy")
+    cache.get("a")
+    cache.put("c", "zzzz")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == "xxxx" and cache.get("c") == "zzzz"
+    assert cache.size <= 10
+
+
+def test_context_cache_hits_do_not_commit(tmp_path, monkeypatch):
+    import src.contextual_retrieval.context_cache as context_cache
+
+    path = str(tmp_path / "cache.sqlite")
+    monkeypatch.setattr(context_cache.time, "time", lambda: 100.0)
+    cache = ContextCache(path)
+    cache.put("a", "xxxx")
+    changes = cache._conn.total_changes
+
+    monkeypatch.setattr(context_cache.time, "time", lambda: 200.0)
+    assert cache.get("a") == "xxxx"
+    assert cache._conn.total_changes == changes
+    cache.close()
+
+    # The buffered last use is written on close
+    reopened = ContextCache(path)
+    assert reopened._conn.execute("SELECT last_used FROM contexts").fetchone()[0] == 200.0
+
+
+def test_contextualize_skips_cached_prompts(tmp_path):
+    cache = ContextCache(str(tmp_path / "cache.sqlite"))
+    cache.put("k0", "cached context")
+    calls = []
+
+    async def complete(prompt):
+        calls.append(prompt)
+        return f"fresh {prompt}"
+
+    results = asyncio.run(
+        acontextualize(["p0", "p1"], complete=complete, cache=cache, cache_keys=["k0", "k1"])
+    )
+
+    assert results == ["cached context", "fresh p1"]
+    assert calls == ["p1"]
+    assert cache.get("k1") == "fresh p1"
+
+
+def test_contextualize_keeps_cache_calls_off_the_event_loop(tmp_path):
+    threads = []
+
+    class RecordingCache(ContextCache):
+        def get(self, key):
+            threads.append(threading.get_ident())
+            return super().get(key)
+
+        def put(self, key, context):
+            threads.append(threading.get_ident())
+            super().put(key, context)
+
+    cache = RecordingCache(str(tmp_path / "cache.sqlite"))
+    cache.put("k0", "cached context")
+    threads.clear()
+
+    async def complete(prompt):
+        return f"fresh {prompt}"
+
+    async def run():
+        await acontextualize(["p0", "p1"], complete=complete, cache=cache, cache_keys=["k0", "k1"])
+        return threading.get_ident()
+
+    loop_thread = asyncio.run(run())
+
+    assert len(threads) == 3 and loop_thread not in threads
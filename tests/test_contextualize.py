@@ -0,0 +1,154 @@
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from openai import AsyncOpenAI
+
+sys.path.insert(0, os.path.abspath("."))
+
+import src.contextual_retrieval.contextualize as contextualize_module
+from src.contextual_retrieval.contextualize import RateLimiter, TokenUsage, acontextualize
+from src.openai_client import achat_completion
+
+
+class _FakeChatHandler(BaseHTTPRequestHandler):
+    """Minimal ``/v1/chat/completions`` endpoint echoing the prompt back."""
+
+    in_flight = 0
+    max_in_flight = 0
+    lock = threading.Lock()
+
+    def do_POST(self):  # noqa: N802
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        prompt = body["messages"][0]["content"]
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+        # Later prompts finish first so ordering must be restored by the engine
+        time.sleep(0.05 * (5 - int(prompt[-1]) % 5))
+        with cls.lock:
+            cls.in_flight -= 1
+        payload = json.dumps(
+            {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": f"ctx:{prompt}"},
+                    }
+                ],
+                "usage": {
+                    "prompt_tokens": 10,
+                    "completion_tokens": 2,
+                    "total_tokens": 12,
+                    "prompt_tokens_details": {"cached_tokens": 8},
+                },
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def fake_server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _FakeChatHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def test_contextualize_preserves_order_and_limits_concurrency(fake_server):
+    client = AsyncOpenAI(base_url=fake_server, api_key="test", max_retries=0)
+    prompts = [f"prompt {i}" for i in range(10)]
+
+    async def complete(prompt):
+        return await achat_completion(prompt, client=client)
+
+    results = asyncio.run(acontextualize(prompts, complete=complete, max_concurrency=3))
+
+    assert results == [f"ctx:{p}" for p in prompts]
+    assert 1 < _FakeChatHandler.max_in_flight <= 3
+
+
+def test_rate_limiter_waits_for_token_budget():
+    async def run():
+        limiter = RateLimiter(tokens_per_minute=600)
+        await limiter.acquire(600)
+        start = time.monotonic()
+        await limiter.acquire(5)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) >= 0.4
+
+
+def test_groups_send_one_warming_request_first_and_record_usage(fake_server, monkeypatch):
+    client = AsyncOpenAI(base_url=fake_server, api_key="test", max_retries=0)
+    monkeypatch.setattr(contextualize_module, "_get_async_client", lambda: client)
+    prompts = [f"doc a {i}" for i in range(3)] + [f"doc b {i}" for i in range(3, 5)]
+    usage = TokenUsage()
+
+    results = asyncio.run(
+        acontextualize(prompts, groups=["a", "a", "a", "b", "b"], usage=usage)
+    )
+
+    assert results == [f"ctx:{p}" for p in prompts]
+    assert (usage.requests, usage.prompt_tokens, usage.cached_tokens) == (5, 50, 40)
+    assert usage.cached_ratio == 0.8
+
+
+def test_group_members_wait_for_their_leader():
+    events = []
+
+    async def complete(prompt):
+        events.append(("start", prompt))
+        await asyncio.sleep(0.02)
+        events.append(("end", prompt))
+        return prompt
+
+    asyncio.run(acontextualize(["a0", "a1", "a2", "b0"], complete=complete, groups=[0, 0, 0, 1]))
+
+    leader_done = events.index(("end", "a0"))
+    assert events.index(("start", "a1")) > leader_done
+    assert events.index(("start", "a2")) > leader_done
+    # Other documents are not held back by the warming request
+    assert events.index(("start", "b0")) < leader_done
+
+
+def test_contextualize_calls_reuse_one_client(fake_server, monkeypatch):
+    import src.openai_client as openai_client
+
+    made = []
+
+    def client_factory(api_key, max_retries):
+        made.append(AsyncOpenAI(base_url=fake_server, api_key=api_key, max_retries=max_retries))
+        return made[-1]
+
+    monkeypatch.setattr(openai_client, "OPENAI_API_KEY", "reuse-test")
+    monkeypatch.setattr(openai_client, "AsyncOpenAI", client_factory)
+
+    results = [contextualize_module.contextualize([f"call {i}"]) for i in range(3)]
+    worker = threading.Thread(
+        target=lambda: results.append(contextualize_module.contextualize(["call 3"]))
+    )
+    worker.start()
+    worker.join()
+
+    assert results == [[f"ctx:call {i}"] for i in range(4)]
+    assert len(made) == 1
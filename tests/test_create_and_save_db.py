@@ -0,0 +1,456 @@
+import json
+import os
+import sys
+import threading
+
+import chromadb
+import pytest
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.retrievers.bm25 import BM25Retriever
+
+sys.path.insert(0, os.path.abspath("."))
+
+import src.contextual_retrieval.save_contextual_retrieval as pipeline
+import src.contextual_retrieval.save_vectordb as save_vectordb
+
+
+@pytest.fixture
+def ingest_env(tmp_path, monkeypatch, word_encoding):
+    """Run ``create_and_save_db`` against fake extraction, LLM and embeddings."""
+    data_dir = tmp_path / "data"
+    save_dir = tmp_path / "db"
+    data_dir.mkdir()
+    monkeypatch.setenv("DATA_DIR", str(data_dir))
+    monkeypatch.setenv("SAVE_DIR", str(save_dir))
+
+    def fake_iter_documents(paths, **kwargs):
+        for index, path in enumerate(paths):
+            lines = open(path, encoding="utf-8").read().splitlines()
+            elements = [
+                {"type": "NarrativeText", "text": line, "metadata": {"file_path": path, "filename": os.path.basename(path)}}
+                for line in lines
+            ]
+            yield index, path, [_Element(**e) for e in elements]
+
+    prompts = []
+
+    def fake_contextualize(batch_prompts, **kwargs):
+        prompts.extend(batch_prompts)
+        return ["CTX " for _ in batch_prompts]
+
+    monkeypatch.setattr(pipeline.tiktoken, "get_encoding", lambda name: word_encoding)
+    monkeypatch.setattr(pipeline, "iter_documents", fake_iter_documents)
+    monkeypatch.setattr(pipeline, "contextualize", fake_contextualize)
+    monkeypatch.setattr(save_vectordb, "EmbeddingModel", lambda: MockEmbedding(embed_dim=8))
+
+    def run(**kwargs):
+        pipeline.create_and_save_db(
+            data_dir="", collection_name="test-collection", save_dir="",
+            db_name="test", chunk_size=5, use_extraction_cache=False, **kwargs
+        )
+
+    return data_dir, save_dir, run, prompts
+
+
+class _Element:
+    def __init__(self, type, text, metadata):
+        self.category = type
+        self.text = text
+        self.metadata = metadata
+
+
+def _stored(save_dir):
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    chroma = sorted(m["raw_chunk"] for m in collection.get()["metadatas"])
+    bm25 = BM25Retriever.from_persist_dir(str(save_dir / "test_bm25"))
+    return chroma, len(bm25.corpus)
+
+
+def test_pipeline_streams_documents_into_both_indices(ingest_env):
+    data_dir, save_dir, run, prompts = ingest_env
+    (data_dir / "a.txt").write_text("alpha one two three four five\nalpha six seven")
+    (data_dir / "b.txt").write_text("beta one two three")
+
+    run(batch_size=2)
+
+    chroma, bm25_count = _stored(save_dir)
+    assert chroma == ["alpha one two three four five", "alpha six seven", "beta one two three"]
+    assert bm25_count == 3
+    # Each chunk is situated within its own document only
+    beta_prompt = next(p for p in prompts if "<chunk>beta" in p)
+    assert "alpha" not in beta_prompt
+
+
+def test_sync_only_reindexes_changed_files(ingest_env):
+    data_dir, save_dir, run, prompts = ingest_env
+    (data_dir / "a.txt").write_text("alpha text")
+    (data_dir / "b.txt").write_text("beta text")
+    (data_dir / "c.txt").write_text("gamma text")
+    run()
+
+    (data_dir / "a.txt").unlink()
+    (data_dir / "b.txt").write_text("beta changed")
+    prompts.clear()
+    run(sync=True)
+
+    chroma, bm25_count = _stored(save_dir)
+    assert chroma == ["beta changed", "gamma text"]
+    assert bm25_count == 2
+    assert len(prompts) == 1 and "beta changed" in prompts[0]
+
+
+def test_sync_retries_a_changed_file_whose_extraction_failed(ingest_env, monkeypatch):
+    data_dir, save_dir, run, _ = ingest_env
+    (data_dir / "a.txt").write_text("alpha text")
+    (data_dir / "b.txt").write_text("beta text")
+    run()
+
+    (data_dir / "b.txt").write_text("beta changed")
+    iter_documents = pipeline.iter_documents
+
+    def failing_iter_documents(paths, **kwargs):
+        for index, path, elements in iter_documents(paths, **kwargs):
+            yield index, path, [] if path.endswith("b.txt") else elements
+
+    monkeypatch.setattr(pipeline, "iter_documents", failing_iter_documents)
+    run(sync=True)
+    assert _stored(save_dir) == (["alpha text"], 1)
+
+    monkeypatch.setattr(pipeline, "iter_documents", iter_documents)
+    run(sync=True)
+    assert _stored(save_dir) == (["alpha text", "beta changed"], 2)
+
+
+def test_document_is_tokenized_once_and_sliced_per_chunk(word_encoding, monkeypatch):
+    calls = []
+
+    def counting_encode(text):
+        calls.append(text)
+        return text.split()
+
+    lines = [f"line {i} of the document" for i in range(10)]
+    elements = [_Element("NarrativeText", line + " ", {"filename": "doc.txt"}) for line in lines]
+    monkeypatch.setattr(word_encoding, "encode", counting_encode)
+
+    pending = pipeline._prepare_document(
+        elements, doc_id=0, encoding=word_encoding, chunk_size=5,
+        max_document_tokens=8, context_window=100,
+    )
+
+    assert len(pending) == 10
+    # Only the whole document is encoded; chunk counts come from the chunker
+    assert calls == ["".join(line + " " for line in lines)]
+    assert all("<document>line 0 of the document line 1 of</document>" in p.prompt for p in pending)
+    assert all(p.prompt_tokens == 8 + 5 for p in pending)
+
+
+def test_chunks_per_request_sends_document_once_per_group(ingest_env, monkeypatch):
+    data_dir, save_dir, run, _ = ingest_env
+    (data_dir / "a.txt").write_text("\n".join(f"alpha {i} one two three" for i in range(5)))
+    prompts = []
+
+    def fake_contextualize(batch_prompts, **kwargs):
+        prompts.extend(batch_prompts)
+        return [
+            json.dumps({str(n): f"CTX{n} " for n in range(1, p.count("<chunk id=") + 1)})
+            for p in batch_prompts
+        ]
+
+    monkeypatch.setattr(pipeline, "contextualize", fake_contextualize)
+    run(chunks_per_request=3)
+
+    assert len(prompts) == 2
+    assert prompts[0].count("<document>") == 1 and prompts[0].count("<chunk id=") == 3
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    assert sorted(collection.get()["documents"]) == sorted(
+        f"CTX{i % 3 + 1} alpha {i} one two three" for i in range(5)
+    )
+
+
+def test_unparseable_group_response_falls_back_to_single_chunks(ingest_env, monkeypatch):
+    data_dir, save_dir, run, _ = ingest_env
+    (data_dir / "a.txt").write_text("alpha one two three four\nalpha five six seven")
+    prompts = []
+
+    def fake_contextualize(batch_prompts, **kwargs):
+        prompts.extend(batch_prompts)
+        return ["not json" if "<chunk id=" in p else "CTX " for p in batch_prompts]
+
+    monkeypatch.setattr(pipeline, "contextualize", fake_contextualize)
+    run(chunks_per_request=4)
+
+    assert len(prompts) == 3
+    chroma, _ = _stored(save_dir)
+    assert chroma == ["alpha five six seven", "alpha one two three four"]
+
+
+def test_resume_skips_written_files_and_redoes_partial_ones(ingest_env, monkeypatch):
+    data_dir, save_dir, run, prompts = ingest_env
+    (data_dir / "a.txt").write_text("alpha text")
+    (data_dir / "b.txt").write_text("beta text")
+    (data_dir / "c.txt").write_text("gamma one two three four five\ngamma six seven")
+    # Files in name order, one chunk per batch, one worker per stage: every
+    # batch is written in order, so a.txt, b.txt and the first chunk of c.txt
+    # are in the indices when the second chunk of c.txt fails
+    iter_documents = pipeline.iter_documents
+    monkeypatch.setattr(
+        pipeline, "iter_documents", lambda paths, **kw: iter_documents(sorted(paths), **kw)
+    )
+    real_write_nodes = pipeline._write_nodes
+
+    def crashing_write_nodes(nodes, *args):
+        if any(n.metadata["raw_chunk"] == "gamma six seven" for n in nodes):
+            raise RuntimeError("disk full")
+        real_write_nodes(nodes, *args)
+
+    monkeypatch.setattr(pipeline, "_write_nodes", crashing_write_nodes)
+    pipeline_kwargs = dict(batch_size=1, contextualize_workers=1, embed_workers=1, queue_size=1)
+    with pytest.raises(RuntimeError):
+        run(**pipeline_kwargs)
+    checkpointed = [
+        json.loads(line)["path"] for line in open(save_dir / "test_checkpoint.jsonl")
+    ]
+    assert checkpointed == [str(data_dir / "a.txt"), str(data_dir / "b.txt")]
+
+    monkeypatch.setattr(pipeline, "_write_nodes", real_write_nodes)
+    prompts.clear()
+    run(resume=True, **pipeline_kwargs)
+
+    chroma, bm25_count = _stored(save_dir)
+    assert chroma == ["alpha text", "beta text", "gamma one two three four five", "gamma six seven"]
+    assert bm25_count == 4
+    # Only the partly written c.txt is contextualized again
+    assert len(prompts) == 2 and all("<chunk>gamma" in p for p in prompts)
+    assert not (save_dir / "test_checkpoint.jsonl").exists()
+
+
+def test_resume_extracts_a_failed_file_again(ingest_env, monkeypatch):
+    data_dir, save_dir, run, _ = ingest_env
+    (data_dir / "a.txt").write_text("alpha text")
+    (data_dir / "b.txt").write_text("beta text")
+    (data_dir / "c.txt").write_text("gamma text")
+    iter_documents = pipeline.iter_documents
+
+    def failing_iter_documents(paths, **kwargs):
+        for index, path, elements in iter_documents(sorted(paths), **kwargs):
+            yield index, path, [] if path.endswith("b.txt") else elements
+
+    def crashing_write_nodes(nodes, *args):
+        if any(n.metadata["raw_chunk"] == "gamma text" for n in nodes):
+            raise RuntimeError("disk full")
+        real_write_nodes(nodes, *args)
+
+    real_write_nodes = pipeline._write_nodes
+    monkeypatch.setattr(pipeline, "iter_documents", failing_iter_documents)
+    monkeypatch.setattr(pipeline, "_write_nodes", crashing_write_nodes)
+    pipeline_kwargs = dict(batch_size=1, contextualize_workers=1, embed_workers=1, queue_size=1)
+    with pytest.raises(RuntimeError):
+        run(**pipeline_kwargs)
+    checkpointed = [
+        json.loads(line)["path"] for line in open(save_dir / "test_checkpoint.jsonl")
+    ]
+    assert checkpointed == [str(data_dir / "a.txt")]
+
+    monkeypatch.setattr(pipeline, "iter_documents", iter_documents)
+    monkeypatch.setattr(pipeline, "_write_nodes", real_write_nodes)
+    run(resume=True, **pipeline_kwargs)
+
+    assert _stored(save_dir) == (["alpha text", "beta text", "gamma text"], 3)
+
+
+def test_heuristic_chunk_types_skip_the_llm(ingest_env, monkeypatch):
+    data_dir, save_dir, run, prompts = ingest_env
+    (data_dir / "sales.xlsx").write_text("name qty\napples 3\npears 4")
+    (data_dir / "notes.txt").write_text("plain narrative text")
+
+    def fake_iter_documents(paths, **kwargs):
+        for index, path in enumerate(paths):
+            md = {"file_path": path, "filename": os.path.basename(path)}
+            if path.endswith(".xlsx"):
+                elements = [_Element("Table", open(path).read(), dict(md, page_name="Q3"))]
+            else:
+                elements = [_Element("NarrativeText", open(path).read(), md)]
+            yield index, path, elements
+
+    monkeypatch.setattr(pipeline, "iter_documents", fake_iter_documents)
+    run(heuristic_chunk_types=("table",))
+
+    assert len(prompts) == 1 and "plain narrative text" in prompts[0]
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    table_text = next(d for d in collection.get()["documents"] if "apples" in d)
+    assert table_text.startswith("Table rows from sheet 'Q3' of sales.xlsx. Columns: name qty.\n")
+
+
+def test_unknown_heuristic_chunk_types_are_rejected(ingest_env):
+    _, save_dir, run, _ = ingest_env
+
+    with pytest.raises(ValueError, match="'text'"):
+        run(heuristic_chunk_types=("table", "text"))
+    assert not save_dir.exists()
+
+
+def test_summary_mode_calls_the_llm_per_section(ingest_env, monkeypatch):
+    data_dir, save_dir, run, _ = ingest_env
+    (data_dir / "guide.txt").write_text("unused")
+    prompts = []
+
+    def fake_iter_documents(paths, **kwargs):
+        md = {"file_path": paths[0], "filename": "guide.txt"}
+        elements = []
+        for title in ("Setup", "Usage"):
+            elements.append(_Element("Title", title, md))
+            elements.extend(
+                _Element("NarrativeText", f"{title.lower()} step {i} one two", md) for i in range(3)
+            )
+        yield 0, paths[0], elements
+
+    threads = set()
+
+    def fake_contextualize(batch_prompts, **kwargs):
+        prompts.extend(batch_prompts)
+        threads.add(threading.current_thread().name)
+        return [
+            "DOC SUMMARY" if p.startswith("<sections>") else p.split()[0].split(">")[1].upper()
+            for p in batch_prompts
+        ]
+
+    monkeypatch.setattr(pipeline, "iter_documents", fake_iter_documents)
+    def no_document_prompts(*args):
+        raise AssertionError("summary mode must not tokenize the document for prompts")
+
+    monkeypatch.setattr(pipeline, "contextualize", fake_contextualize)
+    monkeypatch.setattr(pipeline, "_DocumentContext", no_document_prompts)
+    run(context_mode="summary", max_document_tokens=100)
+
+    # Two section summaries and one document summary, none per chunk
+    assert len(prompts) == 3
+    assert not any("<document>" in p for p in prompts)
+    # Summaries are requested by the contextualize stage, not the extraction thread
+    assert threads and all(t.startswith("ingest-contextualize-") for t in threads)
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    documents = collection.get()["documents"]
+    assert len(documents) == 8
+    usage_chunk = next(d for d in documents if "usage step 2" in d)
+    assert usage_chunk.startswith("DOC SUMMARY Section 'Usage': USAGE\n")
+
+
+def test_dedup_stores_repeated_chunks_once_with_all_sources(ingest_env):
+    data_dir, save_dir, run, prompts = ingest_env
+    disclaimer = "this document is confidential and intended only for the named recipients"
+    (data_dir / "a.txt").write_text(f"alpha report\n{disclaimer}")
+    (data_dir / "b.txt").write_text(f"beta report\n{disclaimer}")
+
+    run(dedup_threshold=0.9)
+
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    metadatas = collection.get()["metadatas"]
+    assert sorted(m["raw_chunk"] for m in metadatas) == ["alpha report", "beta report", disclaimer]
+    kept = next(m for m in metadatas if m["raw_chunk"] == disclaimer)
+    assert kept["source_files"] == ",".join(sorted([str(data_dir / "a.txt"), str(data_dir / "b.txt")]))
+    assert len(prompts) == 3
+    bm25 = BM25Retriever.from_persist_dir(str(save_dir / "test_bm25"))
+    assert sum(1 for node in bm25.corpus if node.get("source_files")) == 1
+
+
+def test_sync_moves_deduplicated_chunk_when_its_owner_is_removed(ingest_env):
+    data_dir, save_dir, run, _ = ingest_env
+    disclaimer = "this document is confidential and intended only for the named recipients"
+    (data_dir / "a.txt").write_text(f"alpha report\n{disclaimer}")
+    (data_dir / "b.txt").write_text(f"beta report\n{disclaimer}")
+    run(dedup_threshold=0.9)
+
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    owner = next(
+        m["file_path"] for m in collection.get()["metadatas"] if m["raw_chunk"] == disclaimer
+    )
+    other = str(data_dir / ("b.txt" if owner.endswith("a.txt") else "a.txt"))
+    os.remove(owner)
+    run(sync=True, dedup_threshold=0.9)
+
+    chroma, bm25_count = _stored(save_dir)
+    reports = {"a.txt": "alpha report", "b.txt": "beta report"}
+    assert chroma == sorted([reports[os.path.basename(other)], disclaimer])
+    assert bm25_count == 2
+    collection = chromadb.PersistentClient(path=str(save_dir / "test_vectordb")).get_collection(
+        "test-collection"
+    )
+    kept = next(m for m in collection.get()["metadatas"] if m["raw_chunk"] == disclaimer)
+    assert kept["file_path"] == other and not kept["source_files"]
+
+
+def test_repeated_ingestion_is_idempotent(ingest_env):
+    data_dir, save_dir, run, _ = ingest_env
+    (data_dir / "a.txt").write_text("alpha one two three four five\nalpha text")
+    (data_dir / "b.txt").write_text("alpha text")
+
+    def ids():
+        collection = chromadb.PersistentClient(
+            path=str(save_dir / "test_vectordb")
+        ).get_collection("test-collection")
+        return sorted(collection.get()["ids"])
+
+    run()
+    first = ids()
+    run()
+
+    assert ids() == first and len(first) == 3
+    _, bm25_count = _stored(save_dir)
+    assert bm25_count == 3
+
+
+def test_run_writes_ingestion_report(ingest_env, monkeypatch):
+    data_dir, save_dir, run, _ = ingest_env
+    (data_dir / "a.txt").write_text("alpha one two three four\nalpha five six seven")
+
+    def fake_contextualize(batch_prompts, on_latency=None, **kwargs):
+        for _ in batch_prompts:
+            on_latency(0.2)
+        return ["not json" if "<chunk id=" in p else "CTX " for p in batch_prompts]
+
+    monkeypatch.setattr(pipeline, "contextualize", fake_contextualize)
+    run(chunks_per_request=4)
+
+    report = json.loads((save_dir / "test_ingest_report.json").read_text())
+    assert report["files"] == 1 and report["nodes"] == 2
+    assert {"extract", "chunk", "contextualize", "embed", "chroma_write", "bm25_write",
+            "bm25_build"} <= set(report["stages"])
+    assert report["stages"]["embed"]["items"] == 2
+    assert report["latency"]["llm_request"]["count"] == 3
+    assert report["latency"]["embedding_batch"]["count"] == 1
+    assert report["retries"] == 2
+    assert [s["name"] for s in report["pipeline"]] == ["extract", "contextualize", "embed", "write"]
+    assert report["caches"]["context"]["misses"] >= 2
+
+
+def test_rebuild_after_edit_and_deletion_keeps_indices_in_step(ingest_env):
+    data_dir, save_dir, run, _ = ingest_env
+    (data_dir / "a.txt").write_text("alpha text")
+    (data_dir / "b.txt").write_text("beta text")
+    run()
+
+    (data_dir / "a.txt").unlink()
+    (data_dir / "b.txt").write_text("beta changed")
+    run()
+
+    chroma, bm25_count = _stored(save_dir)
+    bm25 = BM25Retriever.from_persist_dir(str(save_dir / "test_bm25"))
+    assert chroma == ["beta changed"]
+    assert sorted(node["raw_chunk"] for node in bm25.corpus) == chroma
+
+    # The removed file cannot linger for a later sync either
+    (data_dir / "c.txt").write_text("gamma text")
+    run(sync=True)
+    chroma, bm25_count = _stored(save_dir)
+    assert chroma == ["beta changed", "gamma text"] and bm25_count == 2
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+
+from src.ingest.dedup import ChunkDeduplicator
+
+REPORT = (
+    "Quarterly revenue grew by twelve percent driven by strong demand in the "
+    "northern region while operating costs stayed flat compared with last year "
+    "and the board approved a new dividend policy for the coming fiscal year"
+)
+
+
+def test_exact_and_near_duplicates_collapse_onto_first_chunk():
+    dedup = ChunkDeduplicator(threshold=0.6)
+
+    assert dedup.check("a", REPORT, "v1.docx") is None
+    # Whitespace and case differences are exact duplicates
+    assert dedup.check("b", REPORT.upper().replace(" ", "  "), "v2.docx") == "a"
+    # One changed word is a near-duplicate
+    assert dedup.check("c", REPORT.replace("twelve", "eleven"), "v3.docx") == "a"
+    assert dedup.check("d", "An unrelated paragraph about the office move next spring", "x.docx") is None
+
+    assert (dedup.exact_duplicates, dedup.near_duplicates, dedup.seen) == (1, 1, 4)
+    assert dedup.sources == {"a": {"v1.docx", "v2.docx", "v3.docx"}}
+    assert "2 of 4 chunks removed" in dedup.report()
+
+
+def test_short_chunks_only_match_exactly():
+    dedup = ChunkDeduplicator()
+
+    assert dedup.check("a", "Confidential", "1.pdf") is None
+    assert dedup.check("b", "Confidential draft", "2.pdf") is None
+    assert dedup.check("c", "confidential", "3.pdf") == "a"
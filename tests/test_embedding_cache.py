@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.abspath("."))
+
+import src.openai_client as openai_client
+from src.embedding_cache import EmbeddingCache, acached_embeddings
+from src.openai_client import OpenAIEmbedding
+
+
+def test_vectors_persist_across_instances(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), memory_items=1)
+    cache.put_many("m", ["a", "b", "a"], [[1.0, 2.0], [3.0, 4.0], [1.0, 2.0]])
+    cache.put_many("m", ["b", "c"], [[3.0, 4.0], [5.0, 6.0]])
+    assert len(cache) == 3
+    with pytest.raises(ValueError):
+        cache.put_many("m", ["d"], [[1.0, 2.0, 3.0]])
+    cache.close()
+
+    reopened = EmbeddingCache(str(tmp_path))
+    assert reopened.get_many("m", ["c", "x", "a", "b"]) == [[5.0, 6.0], None, [1.0, 2.0], [3.0, 4.0]]
+    # Vectors are keyed by model as well as text
+    assert reopened.get_many("other", ["a"]) == [None]
+    assert (reopened.hits, reopened.misses) == (3, 2)
+
+    reopened.clear()
+    assert len(reopened) == 0
+    assert reopened.get_many("m", ["a"]) == [None]
+
+
+def test_repeated_queries_skip_the_network(tmp_path, monkeypatch, word_encoding):
+    requests = []
+
+    def fake_get_embeddings(texts):
+        requests.append(list(texts))
+        return [[float(len(t)), 1.0] for t in texts]
+
+    monkeypatch.setattr(openai_client, "get_embeddings", fake_get_embeddings)
+    monkeypatch.setattr(openai_client, "_embedding_encoding", word_encoding)
+    model = OpenAIEmbedding(cache=EmbeddingCache(str(tmp_path)))
+
+    assert model.get_query_embedding("what is new") == [11.0, 1.0]
+    assert model.get_query_embedding("what is new") == [11.0, 1.0]
+    assert model.get_text_embedding_batch(["what is new", "pasta", "pasta"]) == [
+        [11.0, 1.0], [5.0, 1.0], [5.0, 1.0]
+    ]
+    assert requests == [["what is new"], ["pasta"]]
+
+    # A later process (e.g. the next rebuild) reads the vectors from disk
+    fresh = OpenAIEmbedding(cache=EmbeddingCache(str(tmp_path)))
+    assert fresh.get_text_embedding_batch(["pasta", "what is new"]) == [[5.0, 1.0], [11.0, 1.0]]
+    assert len(requests) == 2
+
+
+def test_async_lookups_leave_the_event_loop_free(tmp_path):
+    threads = []
+
+    class RecordingCache(EmbeddingCache):
+        def get_many(self, model, texts):
+            threads.append(threading.get_ident())
+            return super().get_many(model, texts)
+
+        def put_many(self, model, texts, vectors):
+            threads.append(threading.get_ident())
+            super().put_many(model, texts, vectors)
+
+    cache = RecordingCache(str(tmp_path))
+    assert cache._conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+    async def embed(texts):
+        return [[float(len(t))] for t in texts]
+
+    async def run():
+        vectors = await acached_embeddings(cache, "m", ["a", "bb"], embed)
+        return vectors, threading.get_ident()
+
+    vectors, loop_thread = asyncio.run(run())
+
+    assert vectors == [[1.0], [2.0]]
+    assert len(threads) == 2 and loop_thread not in threads
@@ -0,0 +1,97 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+
+from unstructured.documents.elements import NarrativeText, Table
+
+from src.extractors.cache import ExtractionCache
+from src.ingest.manifest import file_sha256
+
+
+def _elements():
+    note = NarrativeText("Speaker note", element_id="note-1")
+    note.category = "SlideNote"
+    note.metadata.slide_number = 3
+    table = Table("H1 H2\nA B", element_id="table-1")
+    table.metadata.sheet = "Sheet1"
+    return [note, table]
+
+
+def test_extraction_cache_round_trip(tmp_path):
+    doc = tmp_path / "doc.pptx"
+    doc.write_bytes(b"content")
+    cache = ExtractionCache(str(tmp_path / "cache"), "unstructured", "1.0")
+
+    assert cache.get(str(doc)) is None
+    cache.put(str(doc), _elements())
+    restored = cache.get(str(doc))
+
+    assert [(type(e).__name__, e.category, e.text) for e in restored] == [
+        ("NarrativeText", "SlideNote", "Speaker note"),
+        ("Table", "Table", "H1 H2\nA B"),
+    ]
+    assert restored[0].metadata.slide_number == 3
+    assert restored[1].metadata.sheet == "Sheet1"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_extraction_cache_invalidated_by_config_and_content(tmp_path):
+    doc = tmp_path / "doc.txt"
+    doc.write_bytes(b"v1")
+    directory = str(tmp_path / "cache")
+    ExtractionCache(directory, "tika", "1.0", {"ocr": "auto"}).put(str(doc), _elements())
+
+    assert ExtractionCache(directory, "tika", "1.0", {"ocr": "auto"}).get(str(doc))
+    assert ExtractionCache(directory, "tika", "1.0", {"ocr": "ocr_only"}).get(str(doc)) is None
+    assert ExtractionCache(directory, "tika", "2.0", {"ocr": "auto"}).get(str(doc)) is None
+    doc.write_bytes(b"v2")
+    assert ExtractionCache(directory, "tika", "1.0", {"ocr": "auto"}).get(str(doc)) is None
+
+
+def test_extraction_cache_evicts_least_recently_used(tmp_path):
+    files = []
+    for name in ("a", "b", "c"):
+        path = tmp_path / name
+        path.write_bytes(name.encode())
+        files.append(str(path))
+    probe = ExtractionCache(str(tmp_path / "probe"), "x", "1")
+    probe.put(files[0], _elements())
+    entry_size = probe.size
+
+    cache = ExtractionCache(str(tmp_path / "cache"), "x", "1", max_bytes=entry_size * 2)
+    cache.put(files[0], _elements())
+    cache.put(files[1], _elements())
+    os.utime(cache._path(file_sha256(files[0])), (1, 1))
+    cache.put(files[2], _elements())
+
+    assert cache.get(files[0]) is None
+    assert cache.get(files[1]) and cache.get(files[2])
+    assert cache.size <= entry_size * 2
+
+
+def test_cached_elements_report_the_path_they_are_read_for(tmp_path, monkeypatch):
+    import src.extractors as extractors
+
+    first = tmp_path / "v1" / "report_v1.txt"
+    copy = tmp_path / "copies" / "copy_of_report.txt"
+    for path in (first, copy):
+        path.parent.mkdir()
+        path.write_text("Quarterly report")
+
+    def fake_ingest(path, mime, tika=None):
+        el = NarrativeText("Quarterly report")
+        el.metadata.filename = os.path.basename(path)
+        el.metadata.file_directory = os.path.dirname(path)
+        return [el]
+
+    monkeypatch.setattr(extractors, "ingest_file", fake_ingest)
+    cache = ExtractionCache(str(tmp_path / "cache"), "unstructured", "1.0")
+    list(extractors.iter_documents([str(first)], cache=cache))
+    [(_, _, elements)] = list(extractors.iter_documents([str(copy)], cache=cache))
+
+    assert cache.hits == 1
+    metadata = elements[0].metadata
+    assert metadata.filename == "copy_of_report.txt"
+    assert metadata.file_directory == str(copy.parent)
+    assert metadata.file_path == str(copy)
@@ -0,0 +1,87 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath("."))
+
+from src.extractors.pool import imap_isolated
+
+
+def _work(value):
+    if value == "crash":
+        os._exit(3)
+    if value == "slow":
+        time.sleep(30)
+    if value == "raise":
+        raise ValueError("bad input")
+    time.sleep(0.01 * len(value))
+    return value.upper()
+
+
+def test_pool_isolates_crashes_errors_and_timeouts():
+    tasks = [("aaaa",), ("crash",), ("b",), ("slow",), ("raise",), ("cc",)]
+
+    start = time.monotonic()
+    results = {i: (res, err) for i, res, err in imap_isolated(_work, tasks, workers=3, timeout=2)}
+    assert time.monotonic() - start < 15
+
+    assert results[0] == ("AAAA", None)
+    assert results[2] == ("B", None)
+    assert results[5] == ("CC", None)
+    assert results[1][0] is None and "crashed" in results[1][1]
+    assert results[3][0] is None and "timed out" in results[3][1]
+    assert results[4][0] is None and "bad input" in results[4][1]
+
+
+_held = threading.Lock()
+
+
+def _locked_work(value):
+    with _held:
+        return value.upper()
+
+
+def test_workers_do_not_inherit_locks_held_by_other_threads():
+    held, released = threading.Event(), threading.Event()
+
+    def hold():
+        with _held:
+            held.set()
+            released.wait()
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait()
+    try:
+        results = list(imap_isolated(_locked_work, [("a",), ("b",)], workers=2, timeout=5))
+    finally:
+        released.set()
+        holder.join()
+
+    assert sorted(results) == [(0, "A", None), (1, "B", None)]
+
+
+def test_load_documents_keeps_input_order(tmp_path, monkeypatch):
+    import src.extractors as extractors
+
+    paths = []
+    for name in ("b.txt", "a.txt", "c.txt"):
+        path = tmp_path / name
+        path.write_text(name)
+        paths.append(str(path))
+
+    monkeypatch.setattr(extractors, "ingest_file", _fake_ingest)
+    elements = extractors.load_documents(paths, workers=3, timeout=10)
+
+    assert [el.text for el in elements] == ["b.txt", "a.txt", "c.txt"]
+    assert [el.metadata.file_path for el in elements] == paths
+
+
+def _fake_ingest(path, mime, tika=None):
+    from unstructured.documents.elements import Text
+
+    name = os.path.basename(path)
+    # Earlier inputs finish last
+    time.sleep({"b.txt": 0.3, "a.txt": 0.1, "c.txt": 0.0}[name])
+    return [Text(f"  {name}  ")]
@@ -0,0 +1,82 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath("."))
+
+from src.ingest.pipeline import Stage, StagedPipeline
+
+
+def test_stages_overlap_and_process_every_item():
+    out = []
+    events = []
+    lock = threading.Lock()
+    b_started = threading.Event()
+
+    def record(event):
+        with lock:
+            events.append(event)
+
+    def stage_a(item):
+        record(("a", "start", item))
+        if item == 1:
+            # Only finishes once stage b works on item 0 at the same time
+            assert b_started.wait(5), "stage b did not start while stage a was busy"
+        record(("a", "end", item))
+        return item
+
+    def stage_b(item):
+        record(("b", "start", item))
+        b_started.set()
+        return item
+
+    def sink(item):
+        with lock:
+            out.append(item)
+
+    pipeline = StagedPipeline(
+        range(10),
+        [Stage("a", stage_a), Stage("b", stage_b), Stage("sink", sink)],
+    )
+    stats = pipeline.run()
+
+    assert out == list(range(10))
+    # Stage b started item 0 while stage a was still working on item 1
+    assert events.index(("b", "start", 0)) < events.index(("a", "end", 1))
+    assert [s.name for s in stats] == ["source", "a", "b", "sink"]
+    assert all(s.items == 10 for s in stats)
+    assert stats[1].items_per_second > 0
+
+
+def test_queues_are_bounded_by_slow_consumer():
+    produced = []
+
+    def source():
+        for i in range(20):
+            produced.append(i)
+            yield i
+
+    pipeline = StagedPipeline(
+        source(), [Stage("slow", lambda item: time.sleep(0.01), queue_size=2)]
+    )
+    stats = pipeline.run()
+
+    assert len(produced) == 20
+    assert stats[1].max_queue_depth <= 2
+
+
+def test_stage_error_stops_pipeline_and_is_raised():
+    def boom(item):
+        if item == 3:
+            raise ValueError("bad item")
+        return item
+
+    pipeline = StagedPipeline(
+        iter(range(1000)), [Stage("boom", boom, workers=2), Stage("sink", lambda item: None)]
+    )
+    with pytest.raises(ValueError, match="bad item"):
+        pipeline.run()
+    assert pipeline.stats[0].items < 1000
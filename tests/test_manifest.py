@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+
+from src.ingest.manifest import Manifest
+
+
+def test_manifest_detects_added_changed_and_removed(tmp_path):
+    data = tmp_path / "data"
+    data.mkdir()
+    keep, change, remove = (data / n for n in ("keep.txt", "change.txt", "remove.txt"))
+    keep.write_text("same")
+    change.write_text("before")
+    remove.write_text("gone soon")
+
+    manifest_path = str(tmp_path / "manifest.json")
+    manifest = Manifest(manifest_path)
+    first = manifest.scan([str(keep), str(change), str(remove)])
+    assert sorted(first.added) == sorted([str(keep), str(change), str(remove)])
+    manifest.apply(first)
+    manifest.save()
+
+    change.write_text("after!")
+    remove.unlink()
+    added = data / "new.txt"
+    added.write_text("new")
+    # Touching a file without changing its content is not a change
+    os.utime(keep, (0, 12345))
+
+    reloaded = Manifest(manifest_path)
+    diff = reloaded.scan([str(keep), str(change), str(added)])
+    assert diff.added == [str(added)]
+    assert diff.changed == [str(change)]
+    assert diff.removed == [str(remove)]
+    assert diff.unchanged == [str(keep)]
+    assert diff.has_changes
@@ -0,0 +1,36 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+
+from src.ingest.metrics import Histogram, IngestMetrics
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram()
+    for seconds in [0.01] * 8 + [0.3, 90.0]:
+        histogram.observe(seconds)
+
+    summary = histogram.as_dict()
+    assert summary["count"] == 10
+    assert summary["buckets"]["<=0.05s"] == 8
+    assert summary["buckets"][">60s"] == 1
+    assert summary["p50_seconds"] == 0.05
+    assert summary["p95_seconds"] == 90.0
+    assert summary["max_seconds"] == 90.0
+
+
+def test_report_collects_stages_counters_and_sections(tmp_path):
+    metrics = IngestMetrics()
+    assert list(metrics.timed_iter(range(3), "extract")) == [0, 1, 2]
+    with metrics.time("embed", 4):
+        pass
+    metrics.incr("retries")
+    metrics.incr("retries", 2)
+
+    report = metrics.write(str(tmp_path / "report.json"), nodes=4)
+    assert report["stages"]["extract"]["items"] == 3
+    assert report["stages"]["embed"]["items"] == 4
+    assert report["counters"] == {"retries": 3}
+    assert report["nodes"] == 4
+    assert (tmp_path / "report.json").exists()
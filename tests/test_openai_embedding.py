@@ -0,0 +1,52 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.abspath("."))
+
+import src.openai_client as openai_client
+from src.openai_client import OpenAIEmbedding, pack_embedding_batches
+
+
+def test_batches_respect_item_and_token_limits():
+    assert pack_embedding_batches([3, 3, 3, 3, 3], max_items=2, max_tokens=100) == [
+        (0, 2), (2, 4), (4, 5)
+    ]
+    assert pack_embedding_batches([4, 4, 9, 1], max_items=10, max_tokens=8) == [
+        (0, 2), (2, 3), (3, 4)
+    ]
+    assert pack_embedding_batches([]) == []
+
+
+def test_embeddings_are_batched_concurrently_and_kept_in_order(monkeypatch, word_encoding):
+    monkeypatch.setattr(openai_client, "_embedding_encoding", word_encoding)
+    texts = [" ".join(["w"] * (i % 3 + 1)) + f" {i}" for i in range(20)]
+    requests = []
+    threads = set()
+
+    def fake_get_embeddings(batch):
+        requests.append(batch)
+        threads.add(threading.get_ident())
+        time.sleep(0.05)
+        return [[float(t.split()[-1])] for t in batch]
+
+    async def fake_get_embeddings_async(batch):
+        requests.append(batch)
+        await asyncio.sleep(0)
+        return [[float(t.split()[-1])] for t in batch]
+
+    monkeypatch.setattr(openai_client, "get_embeddings", fake_get_embeddings)
+    monkeypatch.setattr(openai_client, "get_embeddings_async", fake_get_embeddings_async)
+    model = OpenAIEmbedding(max_batch_tokens=12, max_concurrency=3, cache=None)
+    expected = [[float(i)] for i in range(20)]
+
+    assert model.get_text_embedding_batch(texts) == expected
+    assert len(requests) > 1
+    assert all(sum(len(t.split()) for t in batch) <= 12 for batch in requests)
+    assert len(threads) > 1
+
+    requests.clear()
+    assert asyncio.run(model.aget_text_embedding_batch(texts)) == expected
+    assert all(sum(len(t.split()) for t in batch) <= 12 for batch in requests)
@@ -0,0 +1,54 @@
+import asyncio
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath("."))
+
+from llama_index.core.response_synthesizers import CompactAndRefine
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from src.openai_client import OpenAIChatClient
+from src.tools.rag_workflow import OpenAIChatLLM, qa_template
+
+
+class _AsyncChatStandIn(OpenAIChatClient):
+    """Chat client answering asynchronously and tracking overlapping calls."""
+
+    def __init__(self):
+        self.model = "test-model"
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def chat(self, messages):
+        raise AssertionError("the blocking client must not be used from the event loop")
+
+    async def achat(self, messages):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        return "answer"
+
+    async def astream_chat(self, messages):
+        for piece in ("- boil ", "the ", "pasta"):
+            await asyncio.sleep(0)
+            yield piece
+
+
+def test_async_llm_streams_synthesis_without_blocking(monkeypatch):
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    client = _AsyncChatStandIn()
+    llm = OpenAIChatLLM(client=client)
+    synthesizer = CompactAndRefine(llm=llm, streaming=True, text_qa_template=qa_template)
+    nodes = [NodeWithScore(node=TextNode(text="Boil pasta for ten minutes."), score=1.0)]
+
+    async def run():
+        response = await synthesizer.asynthesize("How do I cook pasta?", nodes=nodes)
+        streamed = [token async for token in response.async_response_gen()]
+        completions = await asyncio.gather(*(llm.acomplete("hi") for _ in range(3)))
+        return streamed, completions
+
+    streamed, completions = asyncio.run(run())
+    assert "".join(streamed) == "- boil the pasta"
+    assert [c.text for c in completions] == ["answer"] * 3
+    assert client.max_in_flight == 3
@@ -1,5 +1,10 @@
+import asyncio
 import importlib.util
+import json
 import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
 from unittest.mock import Mock, patch, call
 
@@ -15,6 +20,18 @@ spec.loader.exec_module(_tika_mod)  # type: ignore[misc]
 TikaAdapter = _tika_mod.TikaAdapter
 
 
+def _load_extract_pdf_pages() -> callable:
+    """Load ``extract_pdf_pages`` with the dynamically loaded ``TikaAdapter``."""
+    source = Path("src/extractors/pdf_ocr.py").read_text()
+    source = source.replace("from .tika_adapter import TikaAdapter", "")
+    namespace = {"TikaAdapter": TikaAdapter, "__name__": "pdf_ocr"}
+    exec(source, namespace)
+    return namespace["extract_pdf_pages"]
+
+
+extract_pdf_pages = _load_extract_pdf_pages()
+
+
 def load_ingest_file() -> callable:
     """Load ``ingest_file`` from ``src/extractors/__init__.py`` without importing
     the package and its heavy dependencies."""
@@ -25,6 +42,7 @@ def load_ingest_file() -> callable:
     namespace = {
         "TikaAdapter": TikaAdapter,
         "extract_unstructured": lambda *a, **k: [],
+        "extract_pdf_pages": extract_pdf_pages,
         "Element": Element,
     }
     exec(ingest_source, namespace)
@@ -46,7 +64,7 @@ def test_tika_adapter_uses_env_and_ocr(tmp_path, monkeypatch):
     fake_response.json.return_value = [{"content": "text"}]
     fake_response.raise_for_status.return_value = None
 
-    with patch("requests.put", return_value=fake_response) as mock_put:
+    with patch("requests.Session.put", return_value=fake_response) as mock_put:
         adapter.extract(str(file_path), "text/plain", ocr="ocr_only")
 
     assert mock_put.call_args.kwargs["headers"]["X-Tika-PDFOcrStrategy"] == "ocr_only"
@@ -75,6 +93,37 @@ def test_ingest_file_retries_with_ocr(tmp_path):
         call(str(pdf_path), "application/pdf", ocr="ocr_and_text"),
     ]
 
+
+def test_ingest_file_ocrs_only_textless_pdf_pages(tmp_path):
+    import fitz
+
+    ingest_file = load_ingest_file()
+    pdf_path = tmp_path / "mixed.pdf"
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "First page has a text layer")
+    doc.new_page()  # scanned page without text
+    doc.new_page().insert_text((72, 72), "Third page has a text layer")
+    doc.save(pdf_path)
+    doc.close()
+
+    tika = Mock(spec=TikaAdapter)
+    tika.extract_many.return_value = [[Text("OCR text of page two")]]
+
+    elements = ingest_file(str(pdf_path), "application/pdf", prefer="tika", tika=tika)
+
+    assert [el.text for el in elements] == [
+        "First page has a text layer",
+        "OCR text of page two",
+        "Third page has a text layer",
+    ]
+    assert [el.metadata.page_number for el in elements] == [1, 2, 3]
+    # Only the text-less page was sent for OCR, and the whole file never was
+    (files,), kwargs = tika.extract_many.call_args
+    assert [os.path.basename(p) for p, _ in files] == ["page-2.pdf"]
+    assert kwargs == {"ocr": "ocr_only"}
+    tika.extract.assert_not_called()
+
+
 def test_ingest_file_uses_tika_for_rtf():
     ingest_file = load_ingest_file()
     path = Path("tests/data/sample.rtf")
@@ -84,7 +133,7 @@ def test_ingest_file_uses_tika_for_rtf():
     fake_response.json.return_value = [{"content": expected_text}]
     fake_response.raise_for_status.return_value = None
 
-    with patch("requests.put", return_value=fake_response) as mock_put:
+    with patch("requests.Session.put", return_value=fake_response) as mock_put:
         elements = ingest_file(str(path), "application/rtf", prefer="tika")
 
     assert [el.text for el in elements] == [expected_text]
@@ -104,7 +153,7 @@ def test_ingest_file_prefers_tika_without_unstructured(monkeypatch):
     fake_response.json.return_value = [{"content": expected_text}]
     fake_response.raise_for_status.return_value = None
 
-    with patch("requests.put", return_value=fake_response) as mock_put:
+    with patch("requests.Session.put", return_value=fake_response) as mock_put:
         elements = ingest_file(str(path), "application/rtf", prefer="tika")
 
     assert [el.text for el in elements] == [expected_text]
@@ -112,3 +161,56 @@ def test_ingest_file_prefers_tika_without_unstructured(monkeypatch):
     assert mock_put.called
 
 
+class _StubTikaHandler(BaseHTTPRequestHandler):
+    """Keep-alive stub of ``PUT /rmeta/text`` returning the uploaded body."""
+
+    protocol_version = "HTTP/1.1"
+    in_flight = 0
+    max_in_flight = 0
+    peers = set()
+    lock = threading.Lock()
+
+    def do_PUT(self):  # noqa: N802
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            cls.peers.add(self.client_address)
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+        payload = json.dumps([{"X-TIKA:content": body.decode()}]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_extract_many_streams_over_pooled_connections(tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubTikaHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        files = []
+        for i in range(12):
+            path = tmp_path / f"doc{i}.txt"
+            path.write_text(f"document {i}")
+            files.append((str(path), "text/plain"))
+        files.append((str(tmp_path / "missing.txt"), "text/plain"))
+
+        adapter = TikaAdapter(f"http://127.0.0.1:{server.server_address[1]}", max_in_flight=3)
+        results = adapter.extract_many(files)
+        async_results = asyncio.run(adapter.aextract_many(files[:3]))
+    finally:
+        server.shutdown()
+
+    assert [r[0].text for r in results[:-1]] == [f"document {i}" for i in range(12)]
+    assert results[-1] == []
+    assert [r[0].text for r in async_results] == ["document 0", "document 1", "document 2"]
+    assert 1 < _StubTikaHandler.max_in_flight <= 3
+    # Connections are reused instead of opening one per file
+    assert len(_StubTikaHandler.peers) <= 3